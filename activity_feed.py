@@ -0,0 +1,145 @@
+"""Unified, time-ordered activity timeline across all tracking entry types"""
+from datetime import datetime
+
+import click
+from sqlalchemy import delete, select, update, tuple_, func, cast, literal, String, exists
+
+from app import app, db
+from models import ActivityEvent, Diet, Weight, Water, Exercise, Mood
+from signals import entries_saved, entries_deleted
+
+FEED_TYPES = ('diet', 'water', 'weight', 'exercise', 'mood')
+MAX_PAGE_SIZE = 100
+
+
+def event_title(entry_type, entry):
+    """Short human readable description of an entry"""
+    if entry_type == 'diet':
+        return f"{entry.food_name} ({entry.calories} cal)"
+    if entry_type == 'exercise':
+        return f"{entry.activity} ({entry.duration} min)"
+    if entry_type == 'mood':
+        return f"Mood: {entry.mood_description or 'Level ' + str(entry.mood_level)}"
+    if entry_type == 'water':
+        return f"Water: {entry.amount} ml"
+    if entry_type == 'weight':
+        return f"Weight: {entry.weight} kg"
+    raise ValueError(f'No activity title for {entry_type}')
+
+
+@entries_saved.connect
+def _on_entries_saved(sender, user_id, entry_type, entries, created, **kwargs):
+    if entry_type not in FEED_TYPES:
+        return
+    if not created:
+        for entry in entries:
+            db.session.execute(
+                update(ActivityEvent).where(
+                    ActivityEvent.entry_type == entry_type,
+                    ActivityEvent.entry_id == entry.id
+                ).values(title=event_title(entry_type, entry), entry_date=entry.date),
+                execution_options={'synchronize_session': False}
+            )
+        return
+    # New rows need their primary keys and created_at before they can be referenced
+    if any(entry.id is None for entry in entries):
+        db.session.flush()
+    db.session.add_all([
+        ActivityEvent(
+            user_id=user_id,
+            entry_type=entry_type,
+            entry_id=entry.id,
+            title=event_title(entry_type, entry),
+            entry_date=entry.date,
+            occurred_at=entry.created_at or datetime.utcnow()
+        )
+        for entry in entries
+    ])
+
+
+@entries_deleted.connect
+def _on_entries_deleted(sender, user_id, entry_type, ids, **kwargs):
+    if entry_type not in FEED_TYPES:
+        return
+    db.session.execute(
+        delete(ActivityEvent).where(
+            ActivityEvent.user_id == user_id,
+            ActivityEvent.entry_type == entry_type,
+            ActivityEvent.entry_id.in_(ids)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def encode_cursor(event):
+    return f"{event.occurred_at.isoformat()}_{event.id}"
+
+
+def decode_cursor(cursor):
+    occurred_at, _, event_id = cursor.rpartition('_')
+    return datetime.fromisoformat(occurred_at), int(event_id)
+
+
+def get_feed_page(user_id, limit=20, before=None, entry_types=None):
+    """One page of the timeline, newest first.
+
+    Keyset pagination on (occurred_at, id) walks the user's index range
+    directly, so every page costs the same however deep the history is.
+    Returns (events, cursor for the next page or None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = select(ActivityEvent).where(ActivityEvent.user_id == user_id)
+    if entry_types:
+        query = query.where(ActivityEvent.entry_type.in_(entry_types))
+    if before:
+        query = query.where(tuple_(ActivityEvent.occurred_at, ActivityEvent.id) < tuple_(*decode_cursor(before)))
+    query = query.order_by(ActivityEvent.occurred_at.desc(), ActivityEvent.id.desc()).limit(limit + 1)
+
+    events = db.session.execute(query).scalars().all()
+    next_cursor = encode_cursor(events[limit - 1]) if len(events) > limit else None
+    return events[:limit], next_cursor
+
+
+def _backfill_select(entry_type, model, title):
+    return select(
+        model.user_id,
+        literal(entry_type),
+        model.id,
+        title,
+        model.date,
+        func.coalesce(model.created_at, func.now()),
+    ).where(~exists().where(
+        ActivityEvent.entry_type == entry_type,
+        ActivityEvent.entry_id == model.id
+    ))
+
+
+def backfill_activity_feed():
+    """Create timeline events for entries written before the feed existed"""
+    def text(column):
+        return func.coalesce(cast(column, String), '')
+
+    sources = [
+        ('diet', Diet, Diet.food_name + ' (' + text(Diet.calories) + ' cal)'),
+        ('exercise', Exercise, Exercise.activity + ' (' + text(Exercise.duration) + ' min)'),
+        ('mood', Mood, 'Mood: ' + func.coalesce(Mood.mood_description, 'Level ' + text(Mood.mood_level))),
+        ('water', Water, 'Water: ' + text(Water.amount) + ' ml'),
+        ('weight', Weight, 'Weight: ' + text(Weight.weight) + ' kg'),
+    ]
+    columns = [ActivityEvent.user_id, ActivityEvent.entry_type, ActivityEvent.entry_id,
+               ActivityEvent.title, ActivityEvent.entry_date, ActivityEvent.occurred_at]
+    counts = {}
+    for entry_type, model, title in sources:
+        result = db.session.execute(
+            ActivityEvent.__table__.insert().from_select(columns, _backfill_select(entry_type, model, title))
+        )
+        counts[entry_type] = result.rowcount
+        db.session.commit()
+    return counts
+
+
+@app.cli.command('backfill-activity-feed')
+def backfill_activity_feed_command():
+    """Add timeline events for existing tracking entries"""
+    counts = backfill_activity_feed()
+    click.echo(', '.join(f'{entry_type}: {count}' for entry_type, count in counts.items()))
@@ -12,7 +12,7 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Use PostgreSQL database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
@@ -20,11 +20,110 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# Per-worker connection pool; size it for the worker class (see gunicorn.conf.py)
+for _option, _variable in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"),
+                           ("pool_timeout", "DB_POOL_TIMEOUT")):
+    if os.environ.get(_variable):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"][_option] = int(os.environ[_variable])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Session storage: "cookie" keeps Flask's signed cookie, "sqlite", "memory"
+# or "redis" keep the data server-side and only put a session id in the cookie
+app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND", "cookie")
+app.config["SESSION_SQLITE_PATH"] = os.environ.get("SESSION_SQLITE_PATH")
+app.config["SESSION_REDIS_URL"] = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+app.config["SESSION_REFRESH_INTERVAL"] = int(os.environ.get("SESSION_REFRESH_INTERVAL", 3600))
+
+# Rate limiting: "memory" buckets are per worker, "sqlite" shares them between
+# the workers on a host
+app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
+app.config["RATELIMIT_STORAGE"] = os.environ.get("RATELIMIT_STORAGE", "memory")
+app.config["RATELIMIT_SQLITE_PATH"] = os.environ.get("RATELIMIT_SQLITE_PATH")
+
+# Password hashing parameters; stored hashes are upgraded on the next login
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+app.config["PASSWORD_SALT_LENGTH"] = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+if os.environ.get("PASSWORD_HASH_WORKERS"):
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ["PASSWORD_HASH_WORKERS"])
+
+# Server-Sent Events hold a connection open per client, so only enable them
+# with threaded or async workers. "sqlite" relays events between local workers.
+app.config["LIVE_UPDATES_ENABLED"] = os.environ.get("LIVE_UPDATES", "0") == "1"
+app.config["LIVE_UPDATES_BACKEND"] = os.environ.get("LIVE_UPDATES_BACKEND", "local")
+app.config["LIVE_UPDATES_SQLITE_PATH"] = os.environ.get("LIVE_UPDATES_SQLITE_PATH")
+
+# Background jobs: result files and how long they are kept
+app.config["JOB_RESULTS_DIR"] = os.environ.get("JOB_RESULTS_DIR")
+app.config["JOB_RESULT_TTL"] = int(os.environ.get("JOB_RESULT_TTL", 86400))
+# A job still running after JOB_STALE_AFTER seconds is assumed to have lost
+# its worker; it is re-queued until it has been claimed JOB_MAX_ATTEMPTS times
+app.config["JOB_STALE_AFTER"] = int(os.environ.get("JOB_STALE_AFTER", 3600))
+app.config["JOB_MAX_ATTEMPTS"] = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+
+# Response compression (brotli when installed, otherwise gzip)
+app.config["COMPRESS_ENABLED"] = os.environ.get("COMPRESS_ENABLED", "1") != "0"
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+app.config["COMPRESS_LEVEL"] = int(os.environ.get("COMPRESS_LEVEL", 6))
+
+# Memory cap for rendered template fragments (per worker)
+app.config["FRAGMENT_CACHE_MAX_BYTES"] = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+
+# Diet, water and exercise rows older than this many days are moved to the
+# archive tables by `flask archive-entries`; 0 keeps everything hot
+app.config["ARCHIVE_HORIZON_DAYS"] = int(os.environ.get("ARCHIVE_HORIZON_DAYS", 0))
+
+# Memory cap for the per-user columnar metric histories (per worker)
+app.config["HISTORY_CACHE_MAX_BYTES"] = int(os.environ.get("HISTORY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# Add the user's clearer mood correlations to the chat assistant's context
+app.config["CHAT_MOOD_INSIGHTS"] = os.environ.get("CHAT_MOOD_INSIGHTS", "1") == "1"
+
+# Chat assistant backend: "openai", "local" (deterministic, offline) or
+# "replay" (responses recorded with LLM_RECORD_PATH)
+app.config["LLM_PROVIDER"] = os.environ.get("LLM_PROVIDER", "openai")
+app.config["LLM_MODEL"] = os.environ.get("LLM_MODEL", "gpt-4o")
+app.config["LLM_TIMEOUT"] = float(os.environ.get("LLM_TIMEOUT", 60))
+app.config["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY")
+app.config["LLM_LOCAL_LATENCY_MS"] = int(os.environ.get("LLM_LOCAL_LATENCY_MS", 0))
+app.config["LLM_REPLAY_PATH"] = os.environ.get("LLM_REPLAY_PATH")
+app.config["LLM_RECORD_PATH"] = os.environ.get("LLM_RECORD_PATH")
+
+# Opt-in request profiling (see profiling.py); nothing is hooked in unless PROFILING=1
+app.config["PROFILING_ENABLED"] = os.environ.get("PROFILING", "0") == "1"
+app.config["PROFILING_DIR"] = os.environ.get("PROFILING_DIR")
+app.config["PROFILING_MAX_BYTES"] = int(os.environ.get("PROFILING_MAX_BYTES", 50 * 1024 * 1024))
+app.config["PROFILING_SAMPLE_RATE"] = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+app.config["PROFILING_PATH_PREFIX"] = os.environ.get("PROFILING_PATH_PREFIX", "/")
+app.config["PROFILING_MODE"] = os.environ.get("PROFILING_MODE", "sample")
+app.config["PROFILING_INTERVAL_MS"] = int(os.environ.get("PROFILING_INTERVAL_MS", 5))
+app.config["PROFILING_TOKEN"] = os.environ.get("PROFILING_TOKEN")
+
+# Operators allowed into the admin analytics, as a comma-separated list of emails
+app.config["ADMIN_EMAILS"] = {
+    email.strip().lower() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()
+}
+
 # Initialize the app with the extension
 db.init_app(app)
 
+from session_store import init_session_store
+init_session_store(app)
+
+from rate_limit import init_rate_limiting
+init_rate_limiting(app)
+
+from passwords import init_password_hashing
+init_password_hashing(app)
+
+from compression import init_compression
+init_compression(app)
+
+from llm import init_llm
+init_llm(app)
+
+from profiling import init_profiling
+init_profiling(app)
+
 # Configure login manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -37,9 +136,16 @@ def load_user(user_id):
 
 # Create all tables
 with app.app_context():
-    from models import User, UserProfile, Diet, Weight, Water, Exercise, Mood, Reminder
+    from models import User, UserProfile, Diet, Food, Weight, Water, Exercise, Mood, Reminder, DataVersion, ActivityEvent, TrackingCounters, Job, ReportSnapshot, CohortStat, ReminderSlot, MoodObservation, MoodStat, GoalStreak
     db.create_all()
 
+    # Indexes and columns added to existing tables come from `flask
+    # migrate-schema`; workers must not start without them. CLI commands
+    # (the migration among them) run against the schema as it is.
+    if not os.environ.get("FLASK_RUN_FROM_CLI"):
+        from schema import check_schema
+        check_schema()
+
 @app.context_processor
 def inject_now():
     return {'now': datetime.utcnow()}
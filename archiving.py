@@ -0,0 +1,243 @@
+"""Cold storage for the high-volume tracking tables.
+
+Diet, water and exercise rows older than ARCHIVE_HORIZON_DAYS are moved
+into <table>_archive by `flask archive-entries`, which keeps the hot tables
+and their indexes sized by the horizon instead of by account age. Reads
+that reach back past the archive boundary (old dates, reports, exports)
+go through entry_source(), which unions the archive in. Deletes by id or
+date range (tracking.bulk_delete_entries) remove archived rows as well.
+
+On PostgreSQL `flask partition-tables` additionally range-partitions the
+hot tables by month so that archiving can drop whole emptied partitions.
+SQLite has no partitioning; archive tables alone keep it bounded there.
+"""
+import logging
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import select, insert, delete, func, text, union_all
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+from cache import LRUCache
+from models import Diet, Water, Exercise, ARCHIVE_TABLES
+
+ARCHIVED_MODELS = {'diet': Diet, 'water': Water, 'exercise': Exercise}
+ARCHIVE_CHUNK_SIZE = 1000
+PARTITION_MONTHS_AHEAD = 3
+
+_archived_through = LRUCache(maxsize=len(ARCHIVED_MODELS), ttl=300)
+
+
+def archive_cutoff(today=None):
+    """Rows dated before this are archived; None when archiving is off"""
+    horizon = current_app.config.get('ARCHIVE_HORIZON_DAYS')
+    if not horizon:
+        return None
+    return (today or date.today()) - timedelta(days=horizon)
+
+
+def archived_through(model):
+    """Latest date present in the model's archive table (None if empty)"""
+    name = model.__tablename__
+    latest = _archived_through.get(name)
+    if latest is None:
+        latest = db.session.execute(select(func.max(ARCHIVE_TABLES[name].c.date))).scalar() or date.min
+        _archived_through.set(name, latest)
+    return None if latest == date.min else latest
+
+
+def reads_archive(model, start_date=None):
+    """Whether a read starting at ``start_date`` (None: all history) may hit archived rows"""
+    if model.__tablename__ not in ARCHIVE_TABLES:
+        return False
+    cutoff = archive_cutoff()
+    if start_date is None:
+        return cutoff is not None or archived_through(model) is not None
+    if cutoff is not None and start_date < cutoff:
+        return True
+    # Rows archived under an earlier, shorter horizon
+    latest = archived_through(model)
+    return latest is not None and start_date <= latest
+
+
+def entry_source(model, start_date=None):
+    """The model's table, or hot plus archived rows when the read reaches that far back"""
+    if not reads_archive(model, start_date):
+        return model.__table__
+    archive = ARCHIVE_TABLES[model.__tablename__]
+    return union_all(select(model.__table__), select(archive)).subquery(f'{model.__tablename__}_all')
+
+
+def archive_old_entries(horizon_days=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Move rows older than the horizon into the archive tables, in id chunks.
+
+    Rows are copied and deleted in the same transaction per chunk, so a
+    crash leaves each row in exactly one place. No signals are sent: the
+    entries still exist, so counters, snapshots and the feed stay valid.
+    Returns {entry_type: rows moved}.
+    """
+    horizon_days = horizon_days or current_app.config.get('ARCHIVE_HORIZON_DAYS')
+    if not horizon_days:
+        raise click.UsageError('Set ARCHIVE_HORIZON_DAYS or pass --horizon')
+    cutoff = date.today() - timedelta(days=horizon_days)
+
+    moved = {}
+    for entry_type, model in ARCHIVED_MODELS.items():
+        table = model.__table__
+        archive = ARCHIVE_TABLES[table.name]
+        moved[entry_type] = 0
+        while True:
+            ids = db.session.execute(
+                select(table.c.id).where(table.c.date < cutoff).order_by(table.c.id).limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                break
+            db.session.execute(insert(archive).from_select(
+                [column.name for column in table.columns],
+                select(table).where(table.c.id.in_(ids))
+            ))
+            db.session.execute(delete(table).where(table.c.id.in_(ids)))
+            db.session.commit()
+            moved[entry_type] += len(ids)
+        _archived_through.pop(table.name)
+        if is_partitioned(table.name):
+            drop_empty_partitions(table.name, cutoff)
+    return moved
+
+
+# PostgreSQL monthly partitioning
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(table_name, month):
+    return f'{table_name}_p{month:%Y_%m}'
+
+
+def partition_ddl(table_name, month):
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} PARTITION OF {table_name} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    )
+
+
+def is_partitioned(table_name):
+    if not _is_postgres():
+        return False
+    return db.session.execute(text(
+        'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+        'WHERE c.relname = :name'
+    ), {'name': table_name}).scalar() is not None
+
+
+def convert_to_partitioned_ddl(model, first_month, last_month, sequence):
+    """Statements that rebuild a table as a range-partitioned one by month.
+
+    The primary key has to include the partition column, so it becomes
+    (id, date); ids still come from the original sequence and stay unique.
+    """
+    name = model.__tablename__
+    old = f'{name}_unpartitioned'
+    statements = [
+        f'ALTER TABLE {name} RENAME TO {old}',
+        f'CREATE TABLE {name} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (date)',
+        f'ALTER SEQUENCE {sequence} OWNED BY {name}.id',
+        f'CREATE TABLE {name}_default PARTITION OF {name} DEFAULT',
+    ]
+    month = first_month
+    while month <= last_month:
+        statements.append(partition_ddl(name, month))
+        month = _next_month(month)
+    statements += [
+        f'INSERT INTO {name} SELECT * FROM {old}',
+        f'DROP TABLE {old}',
+        f'ALTER TABLE {name} ADD PRIMARY KEY (id, date)',
+        f'ALTER TABLE {name} ADD FOREIGN KEY (user_id) REFERENCES "user" (id)',
+    ]
+    statements += [str(CreateIndex(index).compile(dialect=db.engine.dialect)) for index in model.__table__.indexes]
+    return statements
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD, dry_run=False):
+    """Partition the archived tables, or add the coming months' partitions"""
+    today = date.today()
+    last_month = _month_start(today)
+    for _ in range(months_ahead):
+        last_month = _next_month(last_month)
+
+    statements = []
+    for model in ARCHIVED_MODELS.values():
+        name = model.__tablename__
+        if is_partitioned(name):
+            month = _month_start(today)
+            while month <= last_month:
+                statements.append(partition_ddl(name, month))
+                month = _next_month(month)
+            continue
+        first = db.session.execute(select(func.min(model.date))).scalar() or today
+        sequence = db.session.execute(text("SELECT pg_get_serial_sequence(:name, 'id')"), {'name': name}).scalar()
+        statements += convert_to_partitioned_ddl(model, _month_start(first), last_month, sequence)
+    db.session.rollback()
+
+    if not dry_run:
+        # One transaction: a failure leaves every table as it was
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    return statements
+
+
+def drop_empty_partitions(table_name, cutoff):
+    """Drop monthly partitions that end before the cutoff and hold no rows"""
+    partitions = db.session.execute(text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name'
+    ), {'name': table_name}).scalars().all()
+    prefix = f'{table_name}_p'
+    dropped = 0
+    for partition in partitions:
+        if not partition.startswith(prefix):
+            continue
+        year, month = partition[len(prefix):].split('_')
+        if _next_month(date(int(year), int(month), 1)) > cutoff:
+            continue
+        if db.session.execute(text(f'SELECT 1 FROM {partition} LIMIT 1')).scalar() is None:
+            db.session.execute(text(f'DROP TABLE {partition}'))
+            dropped += 1
+    db.session.commit()
+    if dropped:
+        logging.info(f"Dropped {dropped} archived partitions of {table_name}")
+    return dropped
+
+
+@app.cli.command('archive-entries')
+@click.option('--horizon', type=int, default=None, help='Days to keep hot (default: ARCHIVE_HORIZON_DAYS).')
+@click.option('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE, show_default=True, help='Rows per batch.')
+def archive_entries_command(horizon, chunk_size):
+    """Move old diet, water and exercise rows into the archive tables"""
+    for entry_type, count in archive_old_entries(horizon, chunk_size).items():
+        click.echo(f'{entry_type}: archived {count} rows')
+
+
+@app.cli.command('partition-tables')
+@click.option('--months-ahead', type=int, default=PARTITION_MONTHS_AHEAD, show_default=True,
+              help='Future monthly partitions to create.')
+@click.option('--dry-run', is_flag=True, help='Print the DDL without running it.')
+def partition_tables_command(months_ahead, dry_run):
+    """Range-partition the tracking tables by month (PostgreSQL only)"""
+    if not _is_postgres():
+        click.echo('Partitioning needs PostgreSQL; use archive-entries to keep these tables bounded.')
+        return
+    for statement in ensure_partitions(months_ahead, dry_run=dry_run):
+        click.echo(f'{statement};')
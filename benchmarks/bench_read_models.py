@@ -0,0 +1,120 @@
+"""Compare ORM hydration with the read-model queries used by the heaviest pages.
+
+Runs against a throw-away SQLite database unless DATABASE_URL is set:
+
+    python benchmarks/bench_read_models.py --entries 20000 --per-day 12
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--entries', type=int, default=20000, help='Diet, water and exercise rows each.')
+parser.add_argument('--per-day', type=int, default=12, help='Entries per day.')
+parser.add_argument('--repeat', type=int, default=200, help='Calls per measurement.')
+args = parser.parse_args()
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3"
+
+from sqlalchemy import func  # noqa: E402
+
+from app import app, db  # noqa: E402
+from models import User, Diet, Water, Exercise  # noqa: E402
+from read_models import diet_day, water_day, exercise_day, daily_sums  # noqa: E402
+from reporting import build_export  # noqa: E402
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    user.set_unusable_password()
+    db.session.add(user)
+    db.session.flush()
+    today = date.today()
+    for i in range(args.entries):
+        day = today - timedelta(days=i // args.per_day)
+        db.session.add_all([
+            Diet(user_id=user.id, date=day, meal_type='lunch', food_name=f'Food {i % 50}',
+                 calories=300 + i % 200, carbs=30.0, protein=20.0, fat=10.0),
+            Water(user_id=user.id, date=day, amount=250),
+            Exercise(user_id=user.id, date=day, activity='running', duration=30, calories_burned=300),
+        ])
+    db.session.commit()
+    return user.id
+
+
+def orm_diet_page(user_id, day):
+    meals = Diet.query.filter_by(user_id=user_id, date=day).order_by(Diet.meal_type, Diet.created_at).all()
+    return (meals, sum(m.calories or 0 for m in meals), sum(m.carbs or 0 for m in meals),
+            sum(m.protein or 0 for m in meals), sum(m.fat or 0 for m in meals))
+
+
+def orm_water_page(user_id, day):
+    entries = Water.query.filter_by(user_id=user_id, date=day).order_by(Water.created_at).all()
+    total = sum(e.amount for e in entries)
+    week = [db.session.query(func.sum(Water.amount)).filter(
+        Water.user_id == user_id, Water.date == day - timedelta(days=i)).scalar() or 0 for i in range(7)]
+    return entries, total, week
+
+
+def orm_exercise_page(user_id, day):
+    entries = Exercise.query.filter_by(user_id=user_id, date=day).order_by(Exercise.created_at).all()
+    totals = sum(e.duration for e in entries), sum(e.calories_burned or 0 for e in entries)
+    week = []
+    for i in range(7):
+        d = day - timedelta(days=i)
+        week.append((
+            db.session.query(func.sum(Exercise.duration)).filter(Exercise.user_id == user_id, Exercise.date == d).scalar() or 0,
+            db.session.query(func.sum(Exercise.calories_burned)).filter(Exercise.user_id == user_id, Exercise.date == d).scalar() or 0,
+        ))
+    return entries, totals, week
+
+
+def orm_export(user_id):
+    return [
+        [(e.date.strftime('%Y-%m-%d'), e.meal_type, e.food_name, e.calories, e.carbs, e.protein, e.fat)
+         for e in Diet.query.filter_by(user_id=user_id).all()],
+        [(e.date.strftime('%Y-%m-%d'), e.amount) for e in Water.query.filter_by(user_id=user_id).all()],
+        [(e.date.strftime('%Y-%m-%d'), e.activity, e.duration, e.calories_burned, e.notes)
+         for e in Exercise.query.filter_by(user_id=user_id).all()],
+    ]
+
+
+def read_model_water_page(user_id, day):
+    entries, totals = water_day(user_id, day)
+    return entries, totals, daily_sums(Water, user_id, day - timedelta(days=6), day, 'amount')
+
+
+def read_model_exercise_page(user_id, day):
+    entries, totals = exercise_day(user_id, day)
+    return entries, totals, daily_sums(Exercise, user_id, day - timedelta(days=6), day, 'duration', 'calories_burned')
+
+
+def measure(label, func, repeat):
+    def run():
+        func()
+        db.session.remove()
+    seconds = min(timeit.repeat(run, number=repeat, repeat=3)) / repeat
+    print(f'{label:<32} {seconds * 1000:8.3f} ms')
+    return seconds
+
+
+with app.app_context():
+    user_id = seed()
+    today = date.today()
+    print(f'{args.entries} rows per table, {args.per_day} per day, {db.engine.dialect.name}\n')
+    cases = [
+        ('diet page', lambda: orm_diet_page(user_id, today), lambda: diet_day(user_id, today), args.repeat),
+        ('water page', lambda: orm_water_page(user_id, today), lambda: read_model_water_page(user_id, today), args.repeat),
+        ('exercise page', lambda: orm_exercise_page(user_id, today), lambda: read_model_exercise_page(user_id, today), args.repeat),
+        ('export (3 tables)', lambda: orm_export(user_id), lambda: build_export(user_id), max(args.repeat // 50, 1)),
+    ]
+    for label, orm, read_model, repeat in cases:
+        before = measure(f'{label} / ORM', orm, repeat)
+        after = measure(f'{label} / read model', read_model, repeat)
+        print(f'{"":<32} {before / after:8.1f}x\n')
@@ -0,0 +1,164 @@
+"""Compare gunicorn worker classes under mixed traffic against mock upstreams.
+
+Starts the mock OAuth/LLM server, then for each worker class runs gunicorn
+(with gunicorn.conf.py) and keeps --concurrency clients busy for --duration
+seconds with a mix of chat requests (one LLM call), Google OAuth callbacks
+(token plus userinfo calls) and light JSON reads:
+
+    python benchmarks/bench_worker_classes.py --classes sync,gevent --workers 4 --latency-ms 300
+
+Uses a throw-away SQLite database unless DATABASE_URL is set. The gevent
+profile needs the ``async`` extra.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_upstreams import start_mock_upstreams  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--classes', default='sync,gevent', help='Comma-separated gunicorn worker classes.')
+parser.add_argument('--workers', type=int, default=4, help='Gunicorn worker processes.')
+parser.add_argument('--concurrency', type=int, default=100, help='Clients sending at the same time.')
+parser.add_argument('--duration', type=float, default=20, help='Seconds of traffic per worker class.')
+parser.add_argument('--users', type=int, default=50, help='Accounts the clients are spread over.')
+parser.add_argument('--latency-ms', type=int, default=300, help='Mock upstream latency per call.')
+parser.add_argument('--mix', default='chat=4,oauth=2,read=4', help='Relative weights of the request kinds.')
+args = parser.parse_args()
+
+MIX = {kind: float(weight) for kind, weight in (part.split('=') for part in args.mix.split(','))}
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(worker_class, upstream, database_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        LLM_PROVIDER='openai',
+        OPENAI_API_KEY='mock',
+        OPENAI_BASE_URL=f'{upstream}/v1',
+        GOOGLE_TOKEN_URL=f'{upstream}/token',
+        GOOGLE_USERINFO_URL=f'{upstream}/userinfo',
+        OAUTHLIB_INSECURE_TRANSPORT='1',
+        RATELIMIT_ENABLED='0',
+    )
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'main:app'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f'{base_url}/login', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f'gunicorn ({worker_class}) did not start')
+
+
+def oauth_login(session, base_url, user):
+    return session.get(f'{base_url}/login/google/callback', params={'code': f'u{user}', 'state': 'bench'},
+                       allow_redirects=False, timeout=120)
+
+
+def run(base_url):
+    # Create the accounts up front so the measured callbacks sign existing users in
+    for user in range(args.users):
+        oauth_login(requests.Session(), base_url, user)
+
+    sessions = []
+    for number in range(args.concurrency):
+        sessions.append(requests.Session())
+        oauth_login(sessions[-1], base_url, number % args.users)
+
+    results = {kind: [] for kind in MIX}
+    errors = {kind: 0 for kind in MIX}
+    stop_at = time.perf_counter() + args.duration
+
+    def client(number):
+        rng = random.Random(number)
+        session = sessions[number]
+        user = number % args.users
+        kinds, weights = list(MIX), list(MIX.values())
+        while time.perf_counter() < stop_at:
+            kind = rng.choices(kinds, weights)[0]
+            started = time.perf_counter()
+            try:
+                if kind == 'chat':
+                    response = session.post(f'{base_url}/api/chat', json={'message': 'How am I doing?'},
+                                            timeout=120)
+                    ok = response.status_code == 200
+                elif kind == 'oauth':
+                    response = oauth_login(session, base_url, user)
+                    ok = response.status_code == 302 and response.headers['Location'].endswith('/dashboard')
+                else:
+                    response = session.get(f'{base_url}/api/user-progress', timeout=120)
+                    ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                results[kind].append(time.perf_counter() - started)
+            else:
+                errors[kind] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.perf_counter() - started
+
+
+def main():
+    upstream = start_mock_upstreams(latency=args.latency_ms / 1000)
+    upstream_url = f'http://127.0.0.1:{upstream.server_port}'
+    database_url = os.environ.get('DATABASE_URL') or f"sqlite:///{tempfile.mkdtemp()}/bench.sqlite3"
+
+    print(f'{args.workers} workers, {args.concurrency} clients, {args.duration:.0f} s each, '
+          f'upstream latency {args.latency_ms} ms, mix {args.mix}')
+    for worker_class in args.classes.split(','):
+        if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(f'{worker_class:>8}: skipped (pip install .[async])')
+            continue
+        process, base_url = start_gunicorn(worker_class, upstream_url, database_url)
+        try:
+            results, errors, wall = run(base_url)
+        finally:
+            process.terminate()
+            process.wait()
+        total = sum(len(latencies) for latencies in results.values())
+        print(f'{worker_class:>8}: {total / wall:7.1f} req/s, {sum(errors.values())} errors')
+        for kind, latencies in results.items():
+            print(f'{"":>10}{kind:<6} {len(latencies):6d} ok  p50 {percentile(latencies, 50) * 1000:7.0f} ms  '
+                  f'p95 {percentile(latencies, 95) * 1000:7.0f} ms  errors {errors[kind]}')
+
+
+if __name__ == '__main__':
+    main()
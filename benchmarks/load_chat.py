@@ -0,0 +1,171 @@
+"""Load-test the chat assistant against the local LLM stand-in.
+
+Serves the app in-process from a fixed pool of worker threads (like a
+threaded gunicorn worker) and fires concurrent /api/chat requests at it.
+Reports end-to-end latency as seen by the clients, time spent queued for a
+free worker, and worker occupancy:
+
+    python benchmarks/load_chat.py --requests 5000 --concurrency 200 --workers 16 --llm-latency-ms 300
+
+Runs against a throw-away SQLite database unless DATABASE_URL is set. With
+--url it targets an already running server instead (started with
+LLM_PROVIDER=local and RATELIMIT_ENABLED=0) and only client-side latency is
+reported.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--requests', type=int, default=2000, help='Chat requests in total.')
+parser.add_argument('--concurrency', type=int, default=100, help='Clients sending at the same time.')
+parser.add_argument('--workers', type=int, default=8, help='Server worker threads (in-process only).')
+parser.add_argument('--users', type=int, default=20, help='Accounts the clients are spread over.')
+parser.add_argument('--llm-latency-ms', type=int, default=200, help='Simulated provider latency.')
+parser.add_argument('--url', default=None, help='Base URL of a running server instead of the in-process one.')
+args = parser.parse_args()
+
+QUESTIONS = [
+    'How much water have I had today?',
+    'Am I on track with my calories?',
+    'How is my weight trending?',
+    'What affects my mood?',
+    'How long is my streak?',
+    'Suggest a workout for today',
+    'Hello!',
+]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def start_server():
+    """Serve the app on a free port from a fixed pool of worker threads; returns (url, stats)"""
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/load.sqlite3"
+    os.environ['LLM_PROVIDER'] = 'local'
+    os.environ['LLM_LOCAL_LATENCY_MS'] = str(args.llm_latency_ms)
+    os.environ['RATELIMIT_ENABLED'] = '0'
+    os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+
+    import logging
+    from werkzeug.serving import BaseWSGIServer
+
+    import main  # noqa: F401  (registers the routes)
+    from app import app, db
+    from models import User, UserProfile
+
+    with app.app_context():
+        for i in range(args.users):
+            if User.query.filter_by(username=f'load{i}').first():
+                continue
+            user = User(username=f'load{i}', email=f'load{i}@example.com')
+            user.set_password('load')
+            db.session.add(user)
+            db.session.add(UserProfile(user=user, calorie_goal=2000, water_goal=2000))
+        db.session.commit()
+
+    stats = {'queued': [], 'busy': [], 'in_flight': 0, 'max_in_flight': 0}
+    lock = threading.Lock()
+
+    class PooledServer(BaseWSGIServer):
+        request_queue_size = 4096
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.pool = ThreadPoolExecutor(max_workers=args.workers)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.handle_pooled, request, client_address, time.perf_counter())
+
+        def handle_pooled(self, request, client_address, accepted):
+            started = time.perf_counter()
+            with lock:
+                stats['in_flight'] += 1
+                stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with lock:
+                    stats['in_flight'] -= 1
+                stats['queued'].append(started - accepted)
+                stats['busy'].append(time.perf_counter() - started)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = PooledServer('127.0.0.1', 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', stats
+
+
+def login(base_url, i):
+    session = requests.Session()
+    response = session.post(f'{base_url}/login', data={'username': f'load{i}', 'password': 'load'},
+                            allow_redirects=False)
+    if response.status_code != 302:
+        raise SystemExit(f'Login as load{i} failed with {response.status_code}')
+    return session
+
+
+def main_():
+    base_url, server_stats = (args.url, None) if args.url else start_server()
+    sessions = [login(base_url, i) for i in range(args.users)]
+    latencies = []
+    errors = []
+    numbers = count()
+
+    def client():
+        while True:
+            n = next(numbers)
+            if n >= args.requests:
+                return
+            started = time.perf_counter()
+            try:
+                response = sessions[n % len(sessions)].post(
+                    f'{base_url}/api/chat', json={'message': QUESTIONS[n % len(QUESTIONS)]}, timeout=120
+                )
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors.append(n)
+
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    ms = lambda seconds: f'{seconds * 1000:8.1f} ms'  # noqa: E731
+    print(f'{args.requests} requests, {args.concurrency} clients, {len(errors)} errors, '
+          f'{args.requests / wall:.1f} req/s over {wall:.1f} s')
+    print(f'end-to-end  p50 {ms(percentile(latencies, 50))}  p95 {ms(percentile(latencies, 95))}  '
+          f'p99 {ms(percentile(latencies, 99))}  max {ms(max(latencies))}')
+    if server_stats:
+        queued, busy = server_stats['queued'], server_stats['busy']
+        print(f'queued      p50 {ms(percentile(queued, 50))}  p95 {ms(percentile(queued, 95))}  '
+              f'p99 {ms(percentile(queued, 99))}  max {ms(max(queued))}')
+        print(f'service     mean {ms(statistics.mean(busy))}  p95 {ms(percentile(busy, 95))}')
+        print(f'workers     {args.workers}, occupancy {sum(busy) / (args.workers * wall):.0%}, '
+              f'max busy {server_stats["max_in_flight"]}')
+
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,93 @@
+"""Local stand-ins for Google OAuth and the OpenAI API, with configurable latency.
+
+    python benchmarks/mock_upstreams.py --port 5050 --latency-ms 300
+
+Point the app at it with:
+
+    GOOGLE_TOKEN_URL=http://127.0.0.1:5050/token
+    GOOGLE_USERINFO_URL=http://127.0.0.1:5050/userinfo
+    OPENAI_BASE_URL=http://127.0.0.1:5050/v1
+    OAUTHLIB_INSECURE_TRANSPORT=1
+
+The authorization code picks the account: code "u7" signs in as
+u7@mock.example.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_POST(self):
+        body = self._read_body()
+        time.sleep(self.latency)
+        if self.path == '/token':
+            code = parse_qs(body.decode('utf-8')).get('code', ['anonymous'])[0]
+            self._send_json({'access_token': f'token-{code}', 'token_type': 'Bearer', 'expires_in': 3600})
+        elif self.path == '/v1/chat/completions':
+            request = json.loads(body or b'{}')
+            question = request.get('messages', [{}])[-1].get('content', '')
+            self._send_json({
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': f'Mock answer to: {question}'},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.startswith('/userinfo'):
+            code = self.headers.get('Authorization', '').rsplit('token-', 1)[-1] or 'anonymous'
+            self._send_json({'email': f'{code}@mock.example', 'name': code})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+
+def start_mock_upstreams(port=0, latency=0.0):
+    """Serve the mocks from a background thread; returns the server (``server_port`` has the port)"""
+    handler = type('Handler', (MockUpstreamHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--latency-ms', type=int, default=300, help='Delay before every response.')
+    args = parser.parse_args()
+    server = start_mock_upstreams(args.port, args.latency_ms / 1000)
+    print(f'Mock OAuth and LLM upstreams on http://127.0.0.1:{server.server_port}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
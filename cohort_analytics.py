@@ -0,0 +1,212 @@
+"""Cross-user cohort analytics for operators.
+
+Each metric is one grouped query per chunk of user ids that yields a value
+per user together with the user's cohort. Chunks run on a process pool and
+return mergeable partial statistics (count, mean, M2, min, max), so memory
+stays bounded by the number of cohorts however many users there are. The
+merged results replace the metric's rows in CohortStat.
+"""
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+
+import click
+from sqlalchemy import select, delete, func, case
+
+from app import app, db
+from jobs import init_worker_process
+from models import User, UserProfile, Water, Exercise, ActivityEvent, CohortStat
+
+USER_CHUNK_SIZE = 5000
+DEFAULT_WINDOW_DAYS = 28
+AGE_BANDS = ((18, 'under 18'), (30, '18-29'), (45, '30-44'), (60, '45-59'))
+
+
+def age_band(age):
+    if age is None:
+        return 'unknown'
+    for upper, label in AGE_BANDS:
+        if age < upper:
+            return label
+    return '60+'
+
+
+def _water_adherence_by_age(lo, hi, since):
+    """Share of logged water days that met the user's goal, in percent"""
+    daily = select(
+        Water.user_id, Water.date, func.sum(Water.amount).label('total')
+    ).where(
+        Water.user_id.between(lo, hi), Water.date >= since
+    ).group_by(Water.user_id, Water.date).subquery()
+    met = case((daily.c.total >= func.coalesce(UserProfile.water_goal, 2000), 100.0), else_=0.0)
+    rows = db.session.execute(
+        select(UserProfile.age, func.avg(met))
+        .select_from(daily)
+        .outerjoin(UserProfile, UserProfile.user_id == daily.c.user_id)
+        .group_by(daily.c.user_id, UserProfile.age)
+    )
+    return [(age_band(age), value) for age, value in rows]
+
+
+def _exercise_minutes_by_gender(lo, hi, since):
+    """Average exercise minutes per week, counting users who logged none"""
+    minutes = select(
+        Exercise.user_id, func.sum(Exercise.duration).label('minutes')
+    ).where(
+        Exercise.user_id.between(lo, hi), Exercise.date >= since
+    ).group_by(Exercise.user_id).subquery()
+    weeks = (date.today() - since).days / 7 or 1
+    rows = db.session.execute(
+        select(UserProfile.gender, func.coalesce(minutes.c.minutes, 0))
+        .select_from(User)
+        .outerjoin(UserProfile, UserProfile.user_id == User.id)
+        .outerjoin(minutes, minutes.c.user_id == User.id)
+        .where(User.id.between(lo, hi))
+    )
+    return [((gender or 'unknown').strip().lower() or 'unknown', total / weeks) for gender, total in rows]
+
+
+def _retention_by_signup_month(lo, hi, since):
+    """Percent of users with any tracking activity since the window start"""
+    active = select(ActivityEvent.user_id).where(
+        ActivityEvent.user_id.between(lo, hi),
+        ActivityEvent.occurred_at >= datetime.combine(since, datetime.min.time())
+    ).group_by(ActivityEvent.user_id).subquery()
+    rows = db.session.execute(
+        select(User.created_at, active.c.user_id)
+        .select_from(User)
+        .outerjoin(active, active.c.user_id == User.id)
+        .where(User.id.between(lo, hi))
+    )
+    return [
+        (created_at.strftime('%Y-%m') if created_at else 'unknown', 100.0 if active_id else 0.0)
+        for created_at, active_id in rows
+    ]
+
+
+METRICS = {
+    'water_adherence_by_age': _water_adherence_by_age,
+    'exercise_minutes_by_gender': _exercise_minutes_by_gender,
+    'retention_by_signup_month': _retention_by_signup_month,
+}
+
+
+def _merge(a, b):
+    """Combine two (count, mean, M2, min, max) partials (Chan et al.)"""
+    n = a[0] + b[0]
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / n
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / n
+    return (n, mean, m2, min(a[3], b[3]), max(a[4], b[4]))
+
+
+def merge_partials(target, partials):
+    for cohort, partial in partials.items():
+        target[cohort] = _merge(target[cohort], partial) if cohort in target else partial
+    return target
+
+
+def compute_chunk(metric, lo, hi, since):
+    """Partial statistics per cohort for users lo..hi; runs in a worker process"""
+    with app.app_context():
+        partials = {}
+        for cohort, value in METRICS[metric](lo, hi, since):
+            if value is None:
+                continue
+            value = float(value)
+            merge_partials(partials, {cohort: (1, value, 0.0, value, value)})
+        db.session.remove()
+        return metric, partials
+
+
+def user_id_ranges(chunk_size=USER_CHUNK_SIZE):
+    """(first, last) user id of consecutive chunks, found without loading the ids"""
+    last_id = 0
+    while True:
+        upper = db.session.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).offset(chunk_size - 1).limit(1)
+        ).scalar()
+        if upper is None:
+            upper = db.session.execute(select(func.max(User.id)).where(User.id > last_id)).scalar()
+            if upper is not None:
+                yield last_id + 1, upper
+            return
+        yield last_id + 1, upper
+        last_id = upper
+
+
+def store_cohort_stats(metric, partials):
+    """Replace the stored rows of a metric with freshly merged statistics"""
+    now = datetime.utcnow()
+    db.session.execute(delete(CohortStat).where(CohortStat.metric == metric))
+    db.session.add_all([
+        CohortStat(
+            metric=metric, cohort=cohort, users=n, mean=mean,
+            stddev=math.sqrt(m2 / n) if n else None,
+            min_value=low, max_value=high, computed_at=now
+        )
+        for cohort, (n, mean, m2, low, high) in partials.items()
+    ])
+    db.session.commit()
+
+
+def compute_cohorts(metrics=None, processes=None, chunk_size=USER_CHUNK_SIZE, window_days=DEFAULT_WINDOW_DAYS):
+    """Recompute the given metrics (all by default); returns {metric: cohorts}"""
+    metrics = list(metrics or METRICS)
+    since = date.today() - timedelta(days=window_days)
+    processes = processes or os.cpu_count() or 2
+    tasks = [(metric, lo, hi, since) for lo, hi in user_id_ranges(chunk_size) for metric in metrics]
+    db.session.remove()
+
+    results = {metric: {} for metric in metrics}
+    if processes == 1:
+        outputs = (compute_chunk(*task) for task in tasks)
+    else:
+        context = multiprocessing.get_context('fork') if hasattr(os, 'fork') else None
+        pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_worker_process)
+        outputs = pool.map(compute_chunk, *zip(*tasks)) if tasks else ()
+    try:
+        for metric, partials in outputs:
+            merge_partials(results[metric], partials)
+    finally:
+        if processes != 1:
+            pool.shutdown()
+
+    for metric, partials in results.items():
+        store_cohort_stats(metric, partials)
+        logging.info(f"Computed {len(partials)} cohorts for {metric}")
+    return {metric: len(partials) for metric, partials in results.items()}
+
+
+def get_cohort_stats(metric=None):
+    """Stored statistics, grouped by metric"""
+    query = select(CohortStat).order_by(CohortStat.metric, CohortStat.cohort)
+    if metric:
+        query = query.where(CohortStat.metric == metric)
+    stats = {}
+    for stat in db.session.execute(query).scalars():
+        stats.setdefault(stat.metric, []).append({
+            'cohort': stat.cohort,
+            'users': stat.users,
+            'mean': round(stat.mean, 2) if stat.mean is not None else None,
+            'stddev': round(stat.stddev, 2) if stat.stddev is not None else None,
+            'min': stat.min_value,
+            'max': stat.max_value,
+            'computed_at': stat.computed_at.isoformat() if stat.computed_at else None
+        })
+    return stats
+
+
+@app.cli.command('compute-cohorts')
+@click.option('--metric', type=click.Choice(list(METRICS)), multiple=True, help='Only these metrics.')
+@click.option('--processes', type=int, default=None, help='Worker processes (default: CPU count).')
+@click.option('--chunk-size', type=int, default=USER_CHUNK_SIZE, help='Users per chunk.')
+@click.option('--window', type=int, default=DEFAULT_WINDOW_DAYS, help='Days of activity to consider.')
+def compute_cohorts_command(metric, processes, chunk_size, window):
+    """Recompute the operator cohort statistics"""
+    counts = compute_cohorts(metric, processes=processes, chunk_size=chunk_size, window_days=window)
+    for name, cohorts in counts.items():
+        click.echo(f'{name}: {cohorts} cohorts')
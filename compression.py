@@ -0,0 +1,107 @@
+"""Negotiated response compression.
+
+Text-like responses above COMPRESS_MIN_SIZE are compressed with brotli
+(when the optional ``brotli`` package is installed and the client accepts
+it) or gzip. Streamed responses such as job result downloads are
+compressed chunk by chunk; Server-Sent Events and partial content are
+left alone so they are never buffered. Byte ranges of a compressed body
+cannot be served, so compressed responses drop Accept-Ranges and carry a
+weak ETag, which If-Range never matches.
+"""
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'text/javascript',
+    'image/svg+xml',
+}
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    if app.config['COMPRESS_ENABLED']:
+        app.after_request(_compress_response)
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding the client accepts: "br", "gzip" or None"""
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding, config):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits 16 + MAX_WBITS writes a gzip header and trailer
+    compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compress_stream(chunks, encoding, config):
+    """Compress an iterable of chunks, flushing after each so nothing is held back"""
+    process, flush, finish = _compressor(encoding, config)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _compress_response(response):
+    config = current_app.config
+
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or request.method == 'HEAD'
+            or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed or response.direct_passthrough:
+        # Length is unknown up front; stream it compressed
+        response.direct_passthrough = False
+        response.response = _compress_stream(response.response, encoding, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+        process, _, finish = _compressor(encoding, config)
+        response.set_data(process(body) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    response.headers.pop('Accept-Ranges', None)
+    etag, _ = response.get_etag()
+    if etag:
+        # The compressed body is a different representation of the resource
+        response.set_etag(f'{etag}-{encoding}', weak=True)
+    return response
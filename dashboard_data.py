@@ -0,0 +1,114 @@
+"""Everything the dashboard shows, loaded in two round-trips and cached per user"""
+from datetime import date, timedelta
+
+from sqlalchemy import select, union_all, literal, null, cast, func, Date, DateTime, Float, String
+
+from app import db
+from cache import LRUCache
+from data_version import get_data_version
+from models import UserProfile, Diet, Weight, Water, Exercise, Mood, DataVersion
+
+# How many of each kind of recent entry the activity list shows
+RECENT_LIMITS = {'diet': 2, 'exercise': 2, 'mood': 1}
+WEIGHT_CHART_DAYS = 30
+
+# (user_id, today) -> (data version, dashboard data)
+_dashboard_cache = LRUCache(maxsize=10000, ttl=3600)
+
+
+def _scalar(column, *conditions):
+    return select(column).where(*conditions).scalar_subquery()
+
+
+def _today_summary(user_id, today):
+    """Today's totals, the goals and the latest weight as a single row"""
+    return db.session.execute(select(
+        _scalar(func.coalesce(func.sum(Diet.calories), 0), Diet.user_id == user_id, Diet.date == today).label('calories'),
+        _scalar(func.coalesce(func.sum(Water.amount), 0), Water.user_id == user_id, Water.date == today).label('water'),
+        _scalar(func.coalesce(func.sum(Exercise.calories_burned), 0), Exercise.user_id == user_id, Exercise.date == today).label('burned'),
+        select(UserProfile.calorie_goal).where(UserProfile.user_id == user_id).limit(1).scalar_subquery().label('calorie_goal'),
+        select(UserProfile.water_goal).where(UserProfile.user_id == user_id).limit(1).scalar_subquery().label('water_goal'),
+        select(Weight.weight).where(Weight.user_id == user_id).order_by(Weight.date.desc()).limit(1).scalar_subquery().label('latest_weight'),
+        _scalar(DataVersion.version, DataVersion.user_id == user_id).label('version'),
+    )).one()
+
+
+def _recent_and_weights(user_id, start_date, end_date):
+    """Recent entries of every kind plus the weight chart series in one UNION ALL"""
+    def recent(kind, model, title, number):
+        return select(
+            literal(kind).label('kind'),
+            model.created_at.label('created_at'),
+            cast(null(), Date).label('day'),
+            cast(title, String).label('title'),
+            cast(number, Float).label('value'),
+        ).where(model.user_id == user_id).order_by(model.created_at.desc()).limit(RECENT_LIMITS[kind]).subquery()
+
+    parts = [
+        recent('diet', Diet, Diet.food_name, Diet.calories),
+        recent('exercise', Exercise, Exercise.activity, Exercise.duration),
+        recent('mood', Mood, Mood.mood_description, Mood.mood_level),
+    ]
+    weights = select(
+        literal('weight').label('kind'),
+        cast(null(), DateTime).label('created_at'),
+        Weight.date.label('day'),
+        cast(null(), String).label('title'),
+        Weight.weight.label('value'),
+    ).where(Weight.user_id == user_id, Weight.date >= start_date, Weight.date <= end_date)
+
+    return db.session.execute(union_all(*[select(part) for part in parts], weights)).all()
+
+
+def _build_update(row):
+    if row.kind == 'diet':
+        value = int(row.value) if row.value is not None else None
+        return {'icon': 'utensils', 'title': f"{row.title} ({value} cal)", 'color': 'rgba(255, 152, 0, 0.1)'}
+    if row.kind == 'exercise':
+        return {'icon': 'running', 'title': f"{row.title} ({int(row.value)} min)", 'color': 'rgba(76, 175, 80, 0.1)'}
+    return {
+        'icon': 'smile',
+        'title': f"Mood: {row.title or 'Level ' + str(int(row.value))}",
+        'color': 'rgba(33, 150, 243, 0.1)'
+    }
+
+
+def load_dashboard_data(user_id):
+    """Return today's stats, recent updates and the weight series.
+
+    Cached per user; a hit costs one primary key read of the user's data
+    version, a miss costs two queries in total.
+    """
+    today = date.today()
+    key = (user_id, today)
+    cached = _dashboard_cache.get(key)
+    if cached is not None and cached[0] == get_data_version(user_id):
+        return cached[1]
+
+    summary = _today_summary(user_id, today)
+    rows = _recent_and_weights(user_id, today - timedelta(days=WEIGHT_CHART_DAYS), today)
+
+    feed = sorted((r for r in rows if r.kind != 'weight'), key=lambda r: r.created_at, reverse=True)
+    weights = sorted((r for r in rows if r.kind == 'weight'), key=lambda r: r.day)
+
+    updates = []
+    for row in feed:
+        update = _build_update(row)
+        update['time'] = row.created_at.strftime('%H:%M, %b %d')
+        updates.append(update)
+
+    data = {
+        'today': {
+            'calories_consumed': summary.calories or 0,
+            'water_intake': summary.water or 0,
+            'calories_burned': summary.burned or 0,
+            'calorie_goal': summary.calorie_goal if summary.calorie_goal is not None else 2000,
+            'water_goal': summary.water_goal if summary.water_goal is not None else 2000,
+        },
+        'latest_weight': summary.latest_weight,
+        'updates': updates,
+        'weight_dates': [row.day.strftime('%Y-%m-%d') for row in weights],
+        'weight_values': [row.value for row in weights],
+    }
+    _dashboard_cache.set(key, (summary.version or 0, data))
+    return data
@@ -0,0 +1,32 @@
+"""Per-user data version, bumped in the same transaction as every tracking write.
+
+Caches key their entries on it, so a write made through any worker is
+seen by every other worker on its next read.
+"""
+from sqlalchemy import update
+
+from app import db
+from models import DataVersion
+from signals import entries_saved, entries_deleted, profile_updated
+
+
+def get_data_version(user_id):
+    return db.session.query(DataVersion.version).filter(
+        DataVersion.user_id == user_id
+    ).scalar() or 0
+
+
+def bump_data_version(user_id):
+    result = db.session.execute(
+        update(DataVersion).where(DataVersion.user_id == user_id).values(version=DataVersion.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(user_id=user_id, version=1))
+
+
+@entries_saved.connect
+@entries_deleted.connect
+@profile_updated.connect
+def _on_user_data_changed(sender, user_id, **kwargs):
+    bump_data_version(user_id)
@@ -0,0 +1,242 @@
+"""MET-based calorie estimates for Exercise entries"""
+import logging
+import re
+from bisect import bisect_right
+
+import click
+from sqlalchemy import update
+
+from app import app, db
+from data_version import bump_data_version
+from models import Exercise, Weight
+from mood_insights import update_observations
+from report_snapshots import invalidate_snapshots
+
+# Metabolic equivalents from the Compendium of Physical Activities,
+# keyed by normalized activity name.
+MET_TABLE = {
+    'walking': 3.5,
+    'brisk walking': 4.3,
+    'hiking': 6.0,
+    'running': 9.8,
+    'jogging': 7.0,
+    'sprinting': 12.0,
+    'treadmill': 8.0,
+    'cycling': 7.5,
+    'stationary bike': 6.8,
+    'spinning': 8.5,
+    'mountain biking': 8.5,
+    'swimming': 7.0,
+    'water aerobics': 5.5,
+    'rowing': 7.0,
+    'elliptical': 5.0,
+    'stair climbing': 8.8,
+    'jump rope': 11.0,
+    'aerobics': 7.3,
+    'dancing': 5.5,
+    'zumba': 6.5,
+    'hiit': 8.0,
+    'circuit training': 8.0,
+    'crossfit': 8.0,
+    'weight lifting': 5.0,
+    'strength training': 5.0,
+    'bodyweight exercises': 3.8,
+    'calisthenics': 3.8,
+    'pilates': 3.0,
+    'yoga': 2.5,
+    'power yoga': 4.0,
+    'stretching': 2.3,
+    'tai chi': 3.0,
+    'boxing': 7.8,
+    'kickboxing': 10.0,
+    'martial arts': 10.3,
+    'basketball': 6.5,
+    'football': 8.0,
+    'soccer': 7.0,
+    'tennis': 7.3,
+    'badminton': 5.5,
+    'table tennis': 4.0,
+    'volleyball': 4.0,
+    'cricket': 4.8,
+    'baseball': 5.0,
+    'golf': 4.8,
+    'skiing': 7.0,
+    'snowboarding': 5.3,
+    'skating': 7.0,
+    'climbing': 8.0,
+    'gardening': 3.8,
+    'housework': 3.3,
+}
+
+ALIASES = {
+    'walk': 'walking',
+    'run': 'running',
+    'jog': 'jogging',
+    'bike': 'cycling',
+    'biking': 'cycling',
+    'bicycling': 'cycling',
+    'cycle': 'cycling',
+    'swim': 'swimming',
+    'row': 'rowing',
+    'rower': 'rowing',
+    'weights': 'weight lifting',
+    'weightlifting': 'weight lifting',
+    'lifting': 'weight lifting',
+    'gym': 'strength training',
+    'resistance training': 'strength training',
+    'stairs': 'stair climbing',
+    'stairmaster': 'stair climbing',
+    'skipping': 'jump rope',
+    'skipping rope': 'jump rope',
+    'dance': 'dancing',
+    'hike': 'hiking',
+    'cross trainer': 'elliptical',
+    'bouldering': 'climbing',
+    'rock climbing': 'climbing',
+    'ping pong': 'table tennis',
+    'push ups': 'bodyweight exercises',
+    'pushups': 'bodyweight exercises',
+    'squats': 'bodyweight exercises',
+}
+
+# Used when the activity isn't recognised ("general moderate exercise")
+DEFAULT_MET = 4.0
+# Used when the user has never logged a weight
+DEFAULT_WEIGHT_KG = 70.0
+
+_WORD_RE = re.compile(r'[a-z]+')
+_met_cache = {}
+
+
+def normalize_activity(activity):
+    """Lowercase an activity name and drop punctuation, e.g. 'Run (5k)!' -> 'run k'"""
+    return ' '.join(_WORD_RE.findall((activity or '').lower()))
+
+
+def met_for_activity(activity):
+    """Look up the MET value for a free-text activity name"""
+    key = normalize_activity(activity)
+    met = _met_cache.get(key)
+    if met is not None:
+        return met
+
+    name = ALIASES.get(key, key)
+    met = MET_TABLE.get(name)
+    if met is None:
+        # Fall back to the longest known name or alias contained in the text,
+        # so "evening run in the park" counts as running.
+        words = f' {key} '
+        candidates = [k for k in MET_TABLE if f' {k} ' in words]
+        candidates += [ALIASES[a] for a in ALIASES if f' {a} ' in words]
+        met = MET_TABLE[max(candidates, key=len)] if candidates else DEFAULT_MET
+
+    if len(_met_cache) < 10000:
+        _met_cache[key] = met
+    return met
+
+
+def estimate_calories(activity, duration_minutes, weight_kg=None):
+    """kcal = MET x body weight (kg) x hours"""
+    if not duration_minutes or duration_minutes <= 0:
+        return None
+    weight_kg = weight_kg or DEFAULT_WEIGHT_KG
+    return int(round(met_for_activity(activity) * weight_kg * duration_minutes / 60.0))
+
+
+def latest_weight(user_id, on_or_before=None):
+    """The user's most recent logged weight, optionally as of a date"""
+    query = db.session.query(Weight.weight).filter(Weight.user_id == user_id)
+    if on_or_before is not None:
+        query = query.filter(Weight.date <= on_or_before)
+    return query.order_by(Weight.date.desc()).limit(1).scalar()
+
+
+def estimate_for_user(user_id, activity, duration_minutes, on_date=None):
+    weight_kg = latest_weight(user_id, on_date) or latest_weight(user_id)
+    return estimate_calories(activity, duration_minutes, weight_kg)
+
+
+def _weight_histories(user_ids):
+    """Dates and weights per user, oldest first, for a batch of users in one query"""
+    histories = {}
+    rows = db.session.query(Weight.user_id, Weight.date, Weight.weight).filter(
+        Weight.user_id.in_(user_ids)
+    ).order_by(Weight.user_id, Weight.date)
+    for user_id, day, weight in rows:
+        dates, weights = histories.setdefault(user_id, ([], []))
+        dates.append(day)
+        weights.append(weight)
+    return histories
+
+
+def _weight_as_of(history, on_date):
+    """Same choice as estimate_for_user: the weight on or before the date, else the latest"""
+    if history is None:
+        return DEFAULT_WEIGHT_KG
+    dates, weights = history
+    position = bisect_right(dates, on_date) - 1 if on_date is not None else -1
+    return weights[position] if position >= 0 else weights[-1]
+
+
+def _forget_derived_data(dates_by_user):
+    """Drop what was computed from the old calories_burned of these users' days.
+
+    The backfill writes with a bulk UPDATE instead of entries_saved, so it
+    does the receivers' work for a calories-only change itself: bump the
+    data version (dashboard, history and fragment caches), drop the closed
+    report snapshots and re-derive the mood observations of those days.
+    Counters only count rows, which the backfill does not add or remove.
+    """
+    for user_id, dates in dates_by_user.items():
+        bump_data_version(user_id)
+        invalidate_snapshots(user_id, dates)
+        update_observations(user_id, dates)
+
+
+def backfill_exercise_calories(chunk_size=5000):
+    """Fill calories_burned for every Exercise row that is missing it.
+
+    Walks the table once in primary key order. Each chunk costs one select
+    of bare columns, one weight history lookup for the chunk's users and one
+    executemany UPDATE keyed by primary key, plus dropping the derived data
+    of the days that changed.
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.session.query(
+            Exercise.id, Exercise.user_id, Exercise.date, Exercise.activity, Exercise.duration
+        ).filter(
+            Exercise.id > last_id,
+            Exercise.calories_burned.is_(None)
+        ).order_by(Exercise.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        histories = _weight_histories({row.user_id for row in rows})
+        mets = {activity: met_for_activity(activity) for activity in {row.activity for row in rows}}
+
+        values = []
+        dates_by_user = {}
+        for row_id, user_id, on_date, activity, duration in rows:
+            if not duration or duration <= 0:
+                continue
+            weight_kg = _weight_as_of(histories.get(user_id), on_date)
+            values.append({'id': row_id, 'calories_burned': int(round(mets[activity] * weight_kg * duration / 60.0))})
+            dates_by_user.setdefault(user_id, set()).add(on_date)
+        if values:
+            db.session.execute(update(Exercise), values)
+            _forget_derived_data(dates_by_user)
+        db.session.commit()
+        updated += len(values)
+        logging.info(f"Backfilled calories for {updated} exercise entries (last id {last_id})")
+    return updated
+
+
+@app.cli.command('backfill-exercise-calories')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per UPDATE batch.')
+def backfill_exercise_calories_command(chunk_size):
+    """Estimate calories_burned for exercise entries that don't have it"""
+    count = backfill_exercise_calories(chunk_size)
+    click.echo(f'Updated {count} exercise entries.')
@@ -0,0 +1,377 @@
+"""Food catalog seeding and the in-memory autocomplete index behind /api/foods/search.
+
+The bundled catalog is loaded once per database by `flask seed-food-catalog`.
+"""
+import bisect
+import csv
+import heapq
+import os
+import re
+import threading
+import time
+
+import click
+from sqlalchemy import func
+
+from app import app, db
+from cache import LRUCache
+from models import Food, Diet
+from signals import entries_deleted
+
+FOOD_DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'foods.csv')
+
+# Prefixes up to this length are ranked eagerly when the index is built;
+# longer prefixes match few enough tokens to rank on the fly.
+EAGER_PREFIX_DEPTH = 3
+TOP_K = 50
+# Pick up catalog rows added by other workers at most this often
+REFRESH_INTERVAL = 60
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase and reduce a food name to space separated alphanumeric words"""
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def _trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodIndex:
+    """Prefix index over food names with a trigram fallback for typos.
+
+    Every word of a name is a token, so "bre" finds "Chicken Breast". Items
+    are ranked by popularity, then by shorter name. Top results for short
+    prefixes are kept precomputed so the hottest queries ("c", "ch", "chi")
+    never rank the whole catalog.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._items = {}            # id -> (rank_key, normalized name)
+        self._postings = {}         # token -> set of ids
+        self._tokens = []           # sorted unique tokens
+        self._grams = {}            # trigram -> set of ids
+        self._top = {}              # short prefix -> ranked list of ids
+        self._dirty_prefixes = set()
+        self.max_id = 0
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _rank_key(name, popularity):
+        return (-(popularity or 0), len(name), name)
+
+    def add(self, food_id, name, popularity=0):
+        """Insert or replace a single item, updating the precomputed prefixes"""
+        with self._lock:
+            if food_id in self._items:
+                self.remove(food_id)
+            norm = normalize(name)
+            key = self._rank_key(norm, popularity)
+            self._items[food_id] = (key, norm)
+            self.max_id = max(self.max_id, food_id)
+            for token in set(norm.split()):
+                ids = self._postings.get(token)
+                if ids is None:
+                    ids = self._postings[token] = set()
+                    bisect.insort(self._tokens, token)
+                ids.add(food_id)
+                for gram in _trigrams(token):
+                    self._grams.setdefault(gram, set()).add(food_id)
+            for prefix in self._short_prefixes(norm):
+                top = self._top.get(prefix)
+                if top is None or prefix in self._dirty_prefixes:
+                    continue
+                if len(top) < TOP_K or key < self._items[top[-1]][0]:
+                    keys = [self._items[i][0] for i in top]
+                    top.insert(bisect.bisect(keys, key), food_id)
+                    del top[TOP_K:]
+
+    def remove(self, food_id):
+        with self._lock:
+            item = self._items.pop(food_id, None)
+            if item is None:
+                return
+            norm = item[1]
+            for token in set(norm.split()):
+                ids = self._postings.get(token)
+                if ids is None:
+                    continue
+                ids.discard(food_id)
+                if not ids:
+                    del self._postings[token]
+                    del self._tokens[bisect.bisect_left(self._tokens, token)]
+                for gram in _trigrams(token):
+                    self._grams.get(gram, set()).discard(food_id)
+            for prefix in self._short_prefixes(norm):
+                if food_id in self._top.get(prefix, ()):
+                    self._dirty_prefixes.add(prefix)
+
+    def bulk_load(self, rows):
+        """Build the index from ``(id, name, popularity)`` rows in one pass"""
+        with self._lock:
+            for food_id, name, popularity in rows:
+                norm = normalize(name)
+                self._items[food_id] = (self._rank_key(norm, popularity), norm)
+                self.max_id = max(self.max_id, food_id)
+                for token in set(norm.split()):
+                    self._postings.setdefault(token, set()).add(food_id)
+                    for gram in _trigrams(token):
+                        self._grams.setdefault(gram, set()).add(food_id)
+            self._tokens = sorted(self._postings)
+            self._top.clear()
+            self._dirty_prefixes.clear()
+            buckets = {}
+            for token, ids in self._postings.items():
+                for size in range(1, min(EAGER_PREFIX_DEPTH, len(token)) + 1):
+                    buckets.setdefault(token[:size], set()).update(ids)
+            for prefix, ids in buckets.items():
+                self._top[prefix] = self._rank(ids, TOP_K)
+
+    def _short_prefixes(self, norm):
+        prefixes = set()
+        for token in norm.split():
+            for size in range(1, min(EAGER_PREFIX_DEPTH, len(token)) + 1):
+                prefixes.add(token[:size])
+        return prefixes
+
+    def _rank(self, ids, limit):
+        items = self._items
+        return heapq.nsmallest(limit, ids, key=lambda i: items[i][0])
+
+    def _prefix_ids(self, prefix):
+        tokens = self._tokens
+        ids = set()
+        start = bisect.bisect_left(tokens, prefix)
+        for pos in range(start, len(tokens)):
+            token = tokens[pos]
+            if not token.startswith(prefix):
+                break
+            ids |= self._postings[token]
+        return ids
+
+    def _top_for_prefix(self, prefix, limit):
+        if len(prefix) <= EAGER_PREFIX_DEPTH:
+            if prefix in self._dirty_prefixes or prefix not in self._top:
+                self._top[prefix] = self._rank(self._prefix_ids(prefix), TOP_K)
+                self._dirty_prefixes.discard(prefix)
+            if limit <= TOP_K:
+                return self._top[prefix][:limit]
+        return self._rank(self._prefix_ids(prefix), limit)
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ranked ids whose words start with the query words"""
+        words = normalize(query).split()
+        if not words:
+            return []
+        with self._lock:
+            if len(words) == 1:
+                results = self._top_for_prefix(words[0], limit)
+            else:
+                # Drive the lookup from the longest (most selective) word and
+                # require every other word to prefix some word of the name.
+                driver = max(words, key=len)
+                others = [w for w in words if w is not driver]
+                matches = []
+                for food_id in self._prefix_ids(driver):
+                    name_words = self._items[food_id][1].split()
+                    if all(any(nw.startswith(w) for nw in name_words) for w in others):
+                        matches.append(food_id)
+                results = self._rank(matches, limit)
+            if len(results) < limit:
+                seen = set(results)
+                results += [i for i in self.fuzzy(' '.join(words), limit) if i not in seen][:limit - len(results)]
+            return results
+
+    def fuzzy(self, query, limit=10, min_score=0.5, max_candidates=200):
+        """Trigram fallback for misspelled queries.
+
+        Scores are the share of the query's trigrams found in the name, so a
+        partially typed word still matches a longer name.
+        """
+        norm = normalize(query)
+        if len(norm.replace(' ', '')) < 3:
+            return []
+        grams = set()
+        for word in norm.split():
+            grams |= _trigrams(word)
+        with self._lock:
+            counts = {}
+            # Only the rarest grams seed candidates, which keeps common
+            # fragments like " ch" from touching half of the catalog.
+            for gram in sorted(grams, key=lambda g: len(self._grams.get(g, ())))[:4]:
+                for food_id in self._grams.get(gram, ()):
+                    counts[food_id] = counts.get(food_id, 0) + 1
+            candidates = heapq.nlargest(max_candidates, counts, key=counts.get)
+            scored = []
+            for food_id in candidates:
+                name_grams = set()
+                for word in self._items[food_id][1].split():
+                    name_grams |= _trigrams(word)
+                score = len(grams & name_grams) / len(grams)
+                if score >= min_score:
+                    scored.append((-score, self._items[food_id][0], food_id))
+            return [food_id for _, _, food_id in heapq.nsmallest(limit, scored)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_food_index():
+    """Return the process-wide index, building or topping it up as needed"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = FoodIndex()
+            index.bulk_load(db.session.query(Food.id, Food.name, Food.popularity).yield_per(10000))
+            index.synced_at = time.monotonic()
+            _index = index
+        elif time.monotonic() - _index.synced_at > REFRESH_INTERVAL:
+            for row in db.session.query(Food.id, Food.name, Food.popularity).filter(
+                Food.id > _index.max_id
+            ).order_by(Food.id):
+                _index.add(*row)
+            _index.synced_at = time.monotonic()
+        return _index
+
+
+def add_food(name, serving=None, calories=None, carbs=None, protein=None, fat=None, popularity=0):
+    """Add a catalog item and index it immediately in this worker"""
+    food = Food(name=name, serving=serving, calories=calories, carbs=carbs,
+                protein=protein, fat=fat, popularity=popularity)
+    db.session.add(food)
+    db.session.commit()
+    if _index is not None:
+        _index.add(food.id, food.name, food.popularity)
+    return food
+
+
+def seed_food_catalog(path=FOOD_DATASET_PATH):
+    """Load the bundled dataset into an empty Food table"""
+    if db.session.query(Food.id).first() is not None or not os.path.exists(path):
+        return 0
+
+    def number(value, cast):
+        return cast(value) if value not in (None, '') else None
+
+    with open(path, newline='', encoding='utf-8') as fh:
+        foods = [
+            Food(
+                name=row['name'],
+                serving=row.get('serving') or None,
+                calories=number(row.get('calories'), int),
+                carbs=number(row.get('carbs'), float),
+                protein=number(row.get('protein'), float),
+                fat=number(row.get('fat'), float),
+                popularity=number(row.get('popularity'), int) or 0
+            )
+            for row in csv.DictReader(fh)
+        ]
+    db.session.add_all(foods)
+    db.session.commit()
+    return len(foods)
+
+
+@app.cli.command('seed-food-catalog')
+def seed_food_catalog_command():
+    """Load the bundled food dataset into an empty catalog"""
+    count = seed_food_catalog()
+    click.echo(f'Added {count} foods.' if count else 'The food catalog already has entries; nothing added.')
+
+
+# user_id -> list of the user's own foods, most frequent first
+_recent_foods_cache = LRUCache(maxsize=2048, ttl=300)
+
+
+def get_recent_foods(user_id, limit=50):
+    """Foods the user logs most often, with their latest nutrition values"""
+    cached = _recent_foods_cache.get(user_id)
+    if cached is not None:
+        return cached[:limit]
+
+    latest = db.session.query(
+        func.max(Diet.id).label('id'),
+        func.count(Diet.id).label('times'),
+        func.max(Diet.created_at).label('last_used')
+    ).filter(Diet.user_id == user_id).group_by(Diet.food_name).subquery()
+
+    rows = db.session.query(
+        Diet.food_name, Diet.calories, Diet.carbs, Diet.protein, Diet.fat,
+        latest.c.times, latest.c.last_used
+    ).join(latest, Diet.id == latest.c.id).order_by(
+        latest.c.times.desc(), latest.c.last_used.desc()
+    ).limit(200).all()
+
+    foods = [
+        {
+            'name': row.food_name,
+            'normalized': normalize(row.food_name),
+            'calories': row.calories,
+            'carbs': row.carbs,
+            'protein': row.protein,
+            'fat': row.fat,
+            'times': row.times,
+            'source': 'recent'
+        }
+        for row in rows
+    ]
+    _recent_foods_cache.set(user_id, foods)
+    return foods[:limit]
+
+
+def forget_recent_foods(user_id):
+    _recent_foods_cache.pop(user_id)
+
+
+@entries_deleted.connect
+def _on_entries_deleted(sender, user_id, entry_type, **kwargs):
+    if entry_type == 'diet':
+        forget_recent_foods(user_id)
+
+
+def search_foods(user_id, query, limit=10):
+    """Autocomplete: the user's own matching foods first, then the catalog"""
+    words = normalize(query).split()
+    if not words:
+        return []
+
+    results = []
+    seen = set()
+    # Up to half the slots (rounded up) for the user's own foods
+    for food in get_recent_foods(user_id):
+        if len(results) >= (limit + 1) // 2:
+            break
+        name_words = food['normalized'].split()
+        if all(any(nw.startswith(w) for nw in name_words) for w in words):
+            results.append({k: v for k, v in food.items() if k != 'normalized'})
+            seen.add(food['normalized'])
+
+    if len(results) >= limit:
+        return results
+    ids = get_food_index().search(query, limit + len(results))
+    if ids:
+        foods = {food.id: food for food in Food.query.filter(Food.id.in_(ids))}
+        for food_id in ids:
+            if len(results) >= limit:
+                break
+            food = foods.get(food_id)
+            if food is None or normalize(food.name) in seen:
+                continue
+            results.append({
+                'id': food.id,
+                'name': food.name,
+                'serving': food.serving,
+                'calories': food.calories,
+                'carbs': food.carbs,
+                'protein': food.protein,
+                'fat': food.fat,
+                'source': 'catalog'
+            })
+    return results
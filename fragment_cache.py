@@ -0,0 +1,66 @@
+"""Per-user cache of rendered template fragments.
+
+Sections that only change when the user writes (weight and mood history
+tables, past days in the diet/water/exercise views) can be wrapped in a
+call block; the body is rendered once and reused until the user's data
+version moves on:
+
+    {% call cached_fragment('weight_history') %}
+      ... table rows ...
+    {% endcall %}
+
+    {% call cached_fragment('diet_day', selected_date) %} ... {% endcall %}
+
+Extra arguments become part of the key. The key also includes the user,
+the data version and the theme, so any tracking or profile write makes
+the old fragments unreachable; they are evicted LRU under
+FRAGMENT_CACHE_MAX_BYTES.
+"""
+import sys
+
+from flask import g, session
+from flask_login import current_user
+from markupsafe import Markup
+
+from cache import LRUCache
+from data_version import get_data_version
+
+_fragments = None
+
+
+def init_fragment_cache(app):
+    global _fragments
+    app.config.setdefault('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 3600)
+    _fragments = LRUCache(
+        maxsize=100000,
+        ttl=app.config['FRAGMENT_CACHE_TTL'],
+        max_bytes=app.config['FRAGMENT_CACHE_MAX_BYTES'],
+        sizeof=sys.getsizeof
+    )
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+
+
+def _request_data_version(user_id):
+    """The user's data version, read once per request"""
+    versions = g.setdefault('fragment_data_versions', {})
+    if user_id not in versions:
+        versions[user_id] = get_data_version(user_id)
+    return versions[user_id]
+
+
+def fragment_key(user_id, name, *vary):
+    return (user_id, name, tuple(str(part) for part in vary),
+            _request_data_version(user_id), session.get('theme', 'green'))
+
+
+def cached_fragment(name, *vary, caller):
+    """Jinja call-block global: the rendered body of the block, cached per user"""
+    if _fragments is None or not current_user.is_authenticated:
+        return caller()
+    key = fragment_key(current_user.id, name, *vary)
+    html = _fragments.get(key)
+    if html is None:
+        html = Markup(caller())
+        _fragments.set(key, html)
+    return html
@@ -0,0 +1,53 @@
+"""Gunicorn settings, picked up automatically from the working directory.
+
+GUNICORN_WORKER_CLASS selects the deployment profile:
+
+``sync`` (default)  one request per worker process; a request waiting on
+                    OpenAI or Google holds its worker for the whole wait
+``gevent``          each worker serves up to GUNICORN_WORKER_CONNECTIONS
+                    requests as greenlets. Sockets are monkey-patched, so the
+                    OpenAI and OAuth calls yield while they wait, and psycopg2
+                    waits cooperatively through psycogreen. Needs the
+                    ``async`` extra (``pip install .[async]``).
+
+With gevent many more requests run at once than there are database
+connections, so the gevent profile sizes each worker's pool from
+DB_MAX_CONNECTIONS, the connections the whole app may hold (default 80,
+below PostgreSQL's default max_connections of 100): DB_POOL_SIZE defaults
+to an equal share per worker and DB_MAX_OVERFLOW to 0, so the total never
+exceeds it. Requests wait cooperatively for up to DB_POOL_TIMEOUT seconds
+for a free connection. The chat endpoint gives its connection back before
+calling the provider. Set DB_POOL_SIZE / DB_MAX_OVERFLOW to override.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+if worker_class == 'gevent':
+    # Read by app.py in each worker; SQLAlchemy's 5 + 10 runs out long
+    # before worker_connections greenlets do
+    os.environ.setdefault('DB_POOL_SIZE', str(max(1, int(os.environ.get('DB_MAX_CONNECTIONS', 80)) // workers)))
+    os.environ.setdefault('DB_MAX_OVERFLOW', '0')
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    # Runs before the worker monkey-patches. trio, which httpcore imports
+    # when it is installed, needs select.epoll, and gevent removes that.
+    try:
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    if not os.environ.get('DATABASE_URL', '').startswith('postgres'):
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed; PostgreSQL queries will block the gevent worker')
+        return
+    patch_psycopg()
@@ -0,0 +1,203 @@
+"""Compact per-user metric history for trend and chat computations.
+
+Each (user, metric) history is a pair of contiguous ``array`` vectors,
+date ordinals and float values with one point per day, loaded by a single
+column-only grouped query instead of materialising ORM rows. New entries
+are appended in place by the entries_saved receiver; any other change
+(backdated entries, edits, deletes) drops the history and it is reloaded
+on the next read. Entries are validated against the per-user data version
+so writes through other workers are picked up, and evicted LRU under
+HISTORY_CACHE_MAX_BYTES. ``History.to_numpy()`` wraps the same buffers
+when NumPy is installed.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from sqlalchemy import select, func
+
+from app import app, db
+from archiving import entry_source
+from cache import LRUCache
+from data_version import get_data_version
+from models import Diet, Water, Exercise, Weight, Mood
+from signals import entries_saved, entries_deleted
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# metric -> (model, column, how several entries on one day combine)
+METRICS = {
+    'calories': (Diet, 'calories', 'sum'),
+    'water': (Water, 'amount', 'sum'),
+    'burned': (Exercise, 'calories_burned', 'sum'),
+    'exercise_minutes': (Exercise, 'duration', 'sum'),
+    'weight': (Weight, 'weight', 'last'),
+    'mood': (Mood, 'mood_level', 'last'),
+}
+METRICS_BY_ENTRY_TYPE = {}
+for _metric, (_model, _, _) in METRICS.items():
+    METRICS_BY_ENTRY_TYPE.setdefault(_model.__tablename__, []).append(_metric)
+
+
+class History:
+    """Per-day values of one metric; ``days`` holds date ordinals in ascending order"""
+    __slots__ = ('days', 'values', 'version', 'pending')
+
+    def __init__(self, version=0):
+        self.days = array('l')
+        self.values = array('d')
+        self.version = version
+        # Appends made by this worker since ``version`` was read
+        self.pending = 0
+
+    @property
+    def nbytes(self):
+        return len(self.days) * self.days.itemsize + len(self.values) * self.values.itemsize + 64
+
+    def __len__(self):
+        return len(self.days)
+
+    def add(self, day, value, how):
+        """Fold a new entry in; False if it would land before the last day"""
+        ordinal = day.toordinal()
+        if self.days and ordinal < self.days[-1]:
+            return False
+        if self.days and ordinal == self.days[-1]:
+            self.values[-1] = self.values[-1] + value if how == 'sum' else value
+        else:
+            self.days.append(ordinal)
+            self.values.append(value)
+        return True
+
+    def window(self, start_date=None, end_date=None):
+        """(days, values) slices covering start_date..end_date inclusive"""
+        lo = bisect_left(self.days, start_date.toordinal()) if start_date else 0
+        hi = bisect_right(self.days, end_date.toordinal()) if end_date else len(self.days)
+        return self.days[lo:hi], self.values[lo:hi]
+
+    def first(self):
+        return (date.fromordinal(self.days[0]), self.values[0]) if self.days else None
+
+    def last(self):
+        return (date.fromordinal(self.days[-1]), self.values[-1]) if self.days else None
+
+    def to_numpy(self):
+        """Zero-copy (days, values) NumPy views; requires numpy"""
+        if numpy is None:
+            raise RuntimeError('History.to_numpy() requires the numpy package')
+        days = numpy.frombuffer(self.days, dtype=f'i{self.days.itemsize}')
+        return days, numpy.frombuffer(self.values, dtype=numpy.float64)
+
+
+_history_cache = LRUCache(
+    maxsize=100000,
+    max_bytes=app.config.get('HISTORY_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+    sizeof=lambda history: history.nbytes
+)
+
+
+def load_history(user_id, metric, version=0):
+    """Build a metric's history with one grouped, column-only query"""
+    model, column_name, how = METRICS[metric]
+    source = entry_source(model)
+    column = source.c[column_name]
+    history = History(version)
+    if how == 'sum':
+        rows = db.session.execute(
+            select(source.c.date, func.sum(column)).where(source.c.user_id == user_id)
+            .group_by(source.c.date).order_by(source.c.date)
+        )
+    else:
+        # Latest entry of each day wins, as on the weight and mood pages
+        rows = db.session.execute(
+            select(source.c.date, column).where(source.c.user_id == user_id)
+            .order_by(source.c.date, source.c.id)
+        )
+    for day, value in rows:
+        if value is not None:
+            history.add(day, float(value), how)
+    return history
+
+
+def get_history(user_id, metric):
+    """The user's cached history for a metric, reloaded if another write happened"""
+    version = get_data_version(user_id)
+    history = _history_cache.get((user_id, metric))
+    if history is not None:
+        if history.version + history.pending == version:
+            history.version, history.pending = version, 0
+            return history
+    history = load_history(user_id, metric, version)
+    _history_cache.set((user_id, metric), history)
+    return history
+
+
+def forget_history(user_id, metrics=None):
+    for metric in metrics or METRICS:
+        _history_cache.pop((user_id, metric))
+
+
+@entries_saved.connect
+def _on_entries_saved(sender, user_id, entry_type, entries, created, **kwargs):
+    metrics = METRICS_BY_ENTRY_TYPE.get(entry_type)
+    if not metrics:
+        return
+    if not created:
+        forget_history(user_id, metrics)
+        return
+    for metric in metrics:
+        history = _history_cache.get((user_id, metric))
+        if history is None:
+            continue
+        _, column_name, how = METRICS[metric]
+        values = [(entry.date, getattr(entry, column_name)) for entry in entries]
+        if not all(history.add(day, float(value), how) for day, value in values if value is not None):
+            _history_cache.pop((user_id, metric))
+            continue
+        # The data version receiver bumps once for this signal
+        history.pending += 1
+        _history_cache.set((user_id, metric), history)
+
+
+@entries_deleted.connect
+def _on_entries_deleted(sender, user_id, entry_type, **kwargs):
+    metrics = METRICS_BY_ENTRY_TYPE.get(entry_type)
+    if metrics:
+        forget_history(user_id, metrics)
+
+
+def daily_average(user_id, metric, days, today=None):
+    """Mean over the logged days among the last ``days`` days (None if none logged)"""
+    today = today or date.today()
+    _, values = get_history(user_id, metric).window(today - timedelta(days=days - 1), today)
+    return sum(values) / len(values) if values else None
+
+
+def trend_per_week(user_id, metric, days, today=None):
+    """Least-squares slope of the metric over the last ``days`` days, per week"""
+    today = today or date.today()
+    day_ordinals, values = get_history(user_id, metric).window(today - timedelta(days=days - 1), today)
+    n = len(values)
+    if n < 2:
+        return None
+    mean_x = sum(day_ordinals) / n
+    mean_y = sum(values) / n
+    sxx = sum((x - mean_x) ** 2 for x in day_ordinals)
+    if sxx == 0:
+        return None
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(day_ordinals, values))
+    return sxy / sxx * 7
+
+
+def compact_series(user_id, metric, start_date, end_date):
+    """One value per day from start_date to end_date; missing days are 0 for sums, None otherwise"""
+    _, _, how = METRICS[metric]
+    days, values = get_history(user_id, metric).window(start_date, end_date)
+    dense = [0 if how == 'sum' else None] * ((end_date - start_date).days + 1)
+    base = start_date.toordinal()
+    for day, value in zip(days, values):
+        dense[day - base] = int(value) if value.is_integer() else round(value, 2)
+    return dense
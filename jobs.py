@@ -0,0 +1,196 @@
+"""Database-backed job queue for heavy reports and exports.
+
+Web requests enqueue a Job row and return its id. `flask run-jobs` claims
+queued jobs and runs them on a process pool; results are written as JSON
+files under JOB_RESULTS_DIR and removed when they expire. Jobs left
+running by a worker that died are re-queued after JOB_STALE_AFTER seconds,
+or failed once they have been claimed JOB_MAX_ATTEMPTS times.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+
+import click
+from sqlalchemy import select, update, delete, func
+
+from app import app, db
+from models import Job
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register ``func(user_id, **params) -> JSON-serialisable result`` for a job kind"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def _results_dir():
+    path = app.config.get('JOB_RESULTS_DIR') or os.path.join(app.instance_path, 'job_results')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def enqueue_job(user_id, kind, **params):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    job = Job(id=uuid.uuid4().hex, user_id=user_id, kind=kind, params=json.dumps(params), status='queued')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+    }
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; None if the queue is empty.
+
+    The conditional UPDATE makes concurrent workers safe on any database:
+    only one of them sees a row count of 1 for a given job.
+    """
+    while True:
+        job_id = db.session.execute(
+            select(Job.id).where(Job.status == 'queued').order_by(Job.created_at).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+        result = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', started_at=datetime.utcnow(),
+                    attempts=func.coalesce(Job.attempts, 0) + 1),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return job_id
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serialisable')
+
+
+def run_job(job_id):
+    """Execute one claimed job; runs inside a worker process"""
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        try:
+            handler = JOB_HANDLERS[job.kind]
+            result = handler(job.user_id, **json.loads(job.params or '{}'))
+            path = os.path.join(_results_dir(), f'{job.id}.json')
+            with open(path, 'w', encoding='utf-8') as fh:
+                json.dump(result, fh, default=_json_default, separators=(',', ':'))
+            job.status = 'done'
+            job.result_path = path
+        except Exception as e:
+            logging.exception(f"Job {job_id} ({job.kind}) failed")
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.error = str(e)[:500]
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(seconds=app.config.get('JOB_RESULT_TTL', 86400))
+        db.session.commit()
+        db.session.remove()
+        return job_id
+
+
+def cleanup_expired_jobs():
+    """Remove expired job rows and their result files"""
+    now = datetime.utcnow()
+    expired = db.session.execute(
+        select(Job.id, Job.result_path).where(Job.expires_at < now)
+    ).all()
+    for _, path in expired:
+        if path and os.path.exists(path):
+            os.remove(path)
+    if expired:
+        db.session.execute(delete(Job).where(Job.id.in_([job_id for job_id, _ in expired])))
+        db.session.commit()
+    return len(expired)
+
+
+def recover_stale_jobs():
+    """Re-queue jobs whose worker stopped without finishing them, or fail them
+    after JOB_MAX_ATTEMPTS claims; returns (requeued, failed)"""
+    now = datetime.utcnow()
+    stale = (Job.status == 'running') & (
+        Job.started_at < now - timedelta(seconds=app.config.get('JOB_STALE_AFTER', 3600)))
+    exhausted = func.coalesce(Job.attempts, 1) >= app.config.get('JOB_MAX_ATTEMPTS', 3)
+    # Conditional on status, so a job that finishes meanwhile is left alone
+    failed = db.session.execute(
+        update(Job).where(stale, exhausted).values(
+            status='failed', error='Worker stopped before the job finished', finished_at=now,
+            expires_at=now + timedelta(seconds=app.config.get('JOB_RESULT_TTL', 86400))),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    requeued = db.session.execute(
+        update(Job).where(stale, ~exhausted).values(status='queued', started_at=None),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    return requeued, failed
+
+
+def init_worker_process():
+    # Connections inherited from the parent must not be shared across processes
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def run_worker(processes=None, poll_interval=1.0, cleanup_interval=300, once=False):
+    """Claim queued jobs and keep up to ``processes`` of them running"""
+    processes = processes or os.cpu_count() or 2
+    context = multiprocessing.get_context('fork') if hasattr(os, 'fork') else None
+    running = set()
+    last_cleanup = None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                             initializer=init_worker_process) as pool:
+        while True:
+            running = {future for future in running if not future.done()}
+            claimed = False
+            while len(running) < processes:
+                job_id = claim_next_job()
+                if job_id is None:
+                    break
+                claimed = True
+                running.add(pool.submit(run_job, job_id))
+            # Also on start-up, to pick up jobs a previous worker left running
+            if last_cleanup is None or time.monotonic() - last_cleanup > cleanup_interval:
+                removed = cleanup_expired_jobs()
+                if removed:
+                    logging.info(f"Removed {removed} expired jobs")
+                requeued, failed = recover_stale_jobs()
+                if requeued or failed:
+                    logging.warning(f"Re-queued {requeued} and failed {failed} stale jobs")
+                last_cleanup = time.monotonic()
+            if once and not claimed and not running:
+                return
+            db.session.remove()
+            time.sleep(poll_interval if not claimed else 0)
+
+
+@app.cli.command('run-jobs')
+@click.option('--processes', type=int, default=None, help='Worker processes (default: CPU count).')
+@click.option('--once', is_flag=True, help='Exit once the queue is drained.')
+def run_jobs_command(processes, once):
+    """Run the background job worker"""
+    run_worker(processes=processes, once=once)
@@ -0,0 +1,233 @@
+"""Server-Sent Events push channel for dashboard widgets.
+
+Tracking writes publish a small "today" delta per user after they commit.
+Subscribers of this worker are served from an in-process broker; the
+optional SQLite backend relays events between the workers on a host.
+Its poller starts with the first subscription in each worker process, so
+it never runs in a gunicorn master that preloaded the app.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date
+
+from flask import g
+from sqlalchemy import select
+
+from app import db
+from dashboard_data import load_dashboard_data
+from models import Mood
+from signals import entries_saved, entries_deleted, profile_updated
+
+HEARTBEAT_SECONDS = 15
+# Streams are closed after this long; EventSource reconnects on its own,
+# which also rebalances long-lived connections across workers.
+MAX_STREAM_SECONDS = 300
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Broker:
+    """In-process fan-out of events to the subscribers of each user"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def dispatch(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # A stalled client loses deltas; the next snapshot catches it up
+                pass
+
+
+class LocalBackend:
+    """Publishes straight to this worker's broker"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, user_id, event):
+        self.broker.dispatch(user_id, event)
+
+
+class SQLiteBackend:
+    """Relays events through a local SQLite file polled by every worker"""
+
+    def __init__(self, broker, path, poll_interval=0.5, retention=60):
+        self.broker = broker
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._start_lock = threading.Lock()
+        self._poller_pid = None
+        self._last_id = 0
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS live_events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, '
+                'payload TEXT NOT NULL, created REAL NOT NULL)'
+            )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Connections must not cross a fork; the main thread's survives one
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ensure_polling(self):
+        """Start this process's poller if it is not running yet"""
+        if self._poller_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._last_id = self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM live_events').fetchone()[0]
+            threading.Thread(target=self._poll, name='live-updates-poller', daemon=True).start()
+            self._poller_pid = os.getpid()
+
+    def publish(self, user_id, event):
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO live_events (user_id, payload, created) VALUES (?, ?, ?)',
+            (user_id, json.dumps(event), time.time())
+        )
+
+    def _poll(self):
+        conn = self._connect()
+        last_prune = time.time()
+        while True:
+            try:
+                rows = conn.execute(
+                    'SELECT id, user_id, payload FROM live_events WHERE id > ? ORDER BY id',
+                    (self._last_id,)
+                ).fetchall()
+                for event_id, user_id, payload in rows:
+                    self._last_id = event_id
+                    if self.broker.has_subscribers(user_id):
+                        self.broker.dispatch(user_id, json.loads(payload))
+                if time.time() - last_prune > self.retention:
+                    conn.execute('DELETE FROM live_events WHERE created < ?', (time.time() - self.retention,))
+                    last_prune = time.time()
+            except sqlite3.Error as e:
+                logging.error(f"Live updates poller failed: {str(e)}")
+            time.sleep(self.poll_interval)
+
+
+broker = Broker()
+_backend = None
+
+
+def init_live_updates(app):
+    global _backend
+    app.config.setdefault('LIVE_UPDATES_ENABLED', False)
+    app.config.setdefault('LIVE_UPDATES_BACKEND', 'local')
+    if not app.config['LIVE_UPDATES_ENABLED']:
+        return
+    if app.config['LIVE_UPDATES_BACKEND'] == 'sqlite':
+        path = app.config.get('LIVE_UPDATES_SQLITE_PATH') or os.path.join(app.instance_path, 'live_updates.sqlite3')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _backend = SQLiteBackend(broker, path)
+    else:
+        _backend = LocalBackend(broker)
+    app.after_request(_publish_pending)
+
+
+def today_snapshot(user_id, changed=()):
+    """Current totals for today, the payload of every delta event"""
+    data = load_dashboard_data(user_id)
+    today = data['today']
+    event = {
+        'date': date.today().strftime('%Y-%m-%d'),
+        'changed': sorted(changed),
+        'calories': today['calories_consumed'],
+        'calorie_goal': today['calorie_goal'],
+        'water': today['water_intake'],
+        'water_goal': today['water_goal'],
+        'calories_burned': today['calories_burned'],
+        'weight': data['latest_weight'],
+    }
+    mood = db.session.execute(
+        select(Mood.mood_level, Mood.mood_description).where(Mood.user_id == user_id)
+        .order_by(Mood.date.desc()).limit(1)
+    ).first()
+    event['mood'] = {'level': mood.mood_level, 'description': mood.mood_description} if mood else None
+    return event
+
+
+@entries_saved.connect
+@entries_deleted.connect
+@profile_updated.connect
+def _on_user_data_changed(sender, user_id, entry_type='profile', **kwargs):
+    pending = g.setdefault('live_updates_pending', {})
+    pending.setdefault(user_id, set()).add(entry_type)
+
+
+def _publish_pending(response):
+    """Publish deltas once the request that wrote them has committed"""
+    pending = g.pop('live_updates_pending', None)
+    if not pending or response.status_code >= 400 or _backend is None:
+        return response
+    for user_id, changed in pending.items():
+        if isinstance(_backend, LocalBackend) and not broker.has_subscribers(user_id):
+            continue
+        try:
+            _backend.publish(user_id, today_snapshot(user_id, changed))
+        except Exception as e:
+            logging.error(f"Failed to publish live update: {str(e)}")
+    return response
+
+
+def format_event(event, name='today'):
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream(user_id, initial):
+    """Yield SSE frames for one client until it disconnects or times out"""
+    if isinstance(_backend, SQLiteBackend):
+        _backend.ensure_polling()
+    q = broker.subscribe(user_id)
+    try:
+        yield f"retry: 5000\n{format_event(initial)}"
+        deadline = time.monotonic() + MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                event = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(user_id, q)
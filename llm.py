@@ -0,0 +1,164 @@
+"""Pluggable chat completion providers for the assistant.
+
+LLM_PROVIDER selects one of:
+
+``openai``  the OpenAI API (default)
+``local``   a deterministic rule/template responder built from the context
+            in the system message; needs no network, so the chat path can be
+            load-tested and benchmarked offline (LLM_LOCAL_LATENCY_MS adds a
+            fixed delay to stand in for upstream latency)
+``replay``  answers recorded earlier with LLM_RECORD_PATH, read from
+            LLM_REPLAY_PATH; a conversation is matched on all its messages,
+            then on the user's message alone
+
+Setting LLM_RECORD_PATH with any provider appends every exchange to that
+JSON lines file for later replay.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+
+from flask import current_app
+from openai import OpenAI
+
+
+class OpenAIProvider:
+    """The OpenAI chat completions API"""
+
+    def __init__(self, api_key, model='gpt-4o', timeout=60.0):
+        # Honours OPENAI_BASE_URL, e.g. for a mock server in benchmarks
+        self.client = OpenAI(api_key=api_key, timeout=timeout)
+        self.model = model
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response.choices[0].message.content
+
+
+class LocalProvider:
+    """Deterministic replies from keyword rules and the "- Key: value" context lines"""
+
+    # (keywords in the user's message, reply template over the context)
+    RULES = [
+        (('water', 'hydrat', 'drink'),
+         "You've had {Today's water intake} of water today against a goal of {Daily water goal}. "
+         "Your 7-day average is {Average daily water (last 7 days)}."),
+        (('calorie', 'eat', 'food', 'meal', 'diet'),
+         "So far today you've eaten {Today's calories consumed} and burned {Today's calories burned}. "
+         "Your daily goal is {Daily calorie goal}."),
+        (('weight', 'lose', 'gain'),
+         "Your current weight is {Current weight} and your goal is {Weight goal}. "
+         "Trend over the last 30 days: {Weight trend (last 30 days)}."),
+        (('mood', 'feel', 'stress'),
+         "Mood patterns in your data: {Mood patterns}."),
+        (('streak', 'consecutive', 'in a row'),
+         "Your current streaks (consecutive days): {Current streaks (consecutive days)}."),
+        (('exercise', 'workout', 'run', 'train'),
+         "Today you've burned {Today's calories burned} through exercise. "
+         "Your fitness goal is {Fitness goal}."),
+    ]
+    DEFAULT_REPLY = ("Hi {Username}! I can help with your diet, water, weight, exercise and mood. "
+                     "What would you like to know?")
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    @staticmethod
+    def parse_context(system_message):
+        return dict(re.findall(r'^\s*- ([^:\n]+): (.*)$', system_message or '', re.MULTILINE))
+
+    def reply(self, messages):
+        context = self.parse_context(next((m['content'] for m in messages if m['role'] == 'system'), ''))
+        question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '').lower()
+        template = next(
+            (template for keywords, template in self.RULES if any(word in question for word in keywords)),
+            self.DEFAULT_REPLY
+        )
+        return re.sub(r'\{([^}]+)\}', lambda match: context.get(match.group(1), 'not available'), template)
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(messages)
+
+
+def conversation_key(messages):
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def question_key(messages):
+    question = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+    return hashlib.sha256(question.strip().lower().encode('utf-8')).hexdigest()
+
+
+class ReplayProvider:
+    """Responses recorded by RecordingProvider, looked up by conversation then by question"""
+
+    def __init__(self, path):
+        self.by_conversation = {}
+        self.by_question = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self.by_conversation[record['key']] = record['response']
+                self.by_question.setdefault(record['question_key'], record['response'])
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        response = self.by_conversation.get(conversation_key(messages))
+        if response is None:
+            response = self.by_question.get(question_key(messages))
+        if response is None:
+            raise LookupError('No recorded response for this conversation')
+        return response
+
+
+class RecordingProvider:
+    """Wraps another provider and appends each exchange to a JSON lines file"""
+
+    def __init__(self, provider, path):
+        self.provider = provider
+        self.path = path
+        self._lock = threading.Lock()
+
+    def complete(self, messages, max_tokens=500, temperature=0.7):
+        response = self.provider.complete(messages, max_tokens=max_tokens, temperature=temperature)
+        record = {'key': conversation_key(messages), 'question_key': question_key(messages),
+                  'messages': messages, 'response': response}
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        return response
+
+
+def init_llm(app):
+    app.config.setdefault('LLM_PROVIDER', 'openai')
+    app.config.setdefault('LLM_MODEL', 'gpt-4o')
+    app.config.setdefault('LLM_LOCAL_LATENCY_MS', 0)
+    app.config.setdefault('LLM_TIMEOUT', 60.0)
+    name = app.config['LLM_PROVIDER']
+    if name == 'openai':
+        provider = OpenAIProvider(app.config.get('OPENAI_API_KEY'), app.config['LLM_MODEL'], app.config['LLM_TIMEOUT'])
+    elif name == 'local':
+        provider = LocalProvider(app.config['LLM_LOCAL_LATENCY_MS'] / 1000)
+    elif name == 'replay':
+        if not app.config.get('LLM_REPLAY_PATH'):
+            raise RuntimeError('LLM_PROVIDER=replay needs LLM_REPLAY_PATH')
+        provider = ReplayProvider(app.config['LLM_REPLAY_PATH'])
+    else:
+        raise RuntimeError(f'Unknown LLM_PROVIDER {name!r}')
+    if app.config.get('LLM_RECORD_PATH'):
+        provider = RecordingProvider(provider, app.config['LLM_RECORD_PATH'])
+    app.extensions['llm'] = provider
+
+
+def chat_completion(messages, max_tokens=500, temperature=0.7):
+    """The assistant's reply to ``messages`` from the configured provider"""
+    return current_app.extensions['llm'].complete(messages, max_tokens=max_tokens, temperature=temperature)
@@ -1,7 +1,8 @@
 from datetime import datetime
 from app import db
+from flask import current_app
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import UNUSABLE_PASSWORD, hash_password, verify_password, needs_rehash
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,10 +21,26 @@ class User(UserMixin, db.Model):
     reminders = db.relationship('Reminder', backref='user', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
+        
+    def set_unusable_password(self):
+        """Mark the account as OAuth-only; no hashing work is done"""
+        self.password_hash = UNUSABLE_PASSWORD
+        
+    def has_usable_password(self):
+        return self.password_hash != UNUSABLE_PASSWORD
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify the password, upgrading the stored hash if the configured cost changed"""
+        if not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+        
+    @property
+    def is_admin(self):
+        return (self.email or '').lower() in current_app.config.get('ADMIN_EMAILS', ())
         
     def __repr__(self):
         return f'<User {self.username}>'
@@ -47,6 +64,11 @@ class UserProfile(db.Model):
 
 
 class Diet(db.Model):
+    __table_args__ = (
+        db.Index('ix_diet_user_date', 'user_id', 'date'),
+        db.Index('ix_diet_user_created', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -62,7 +84,26 @@ class Diet(db.Model):
         return f'<Diet {self.food_name} on {self.date}>'
 
 
+class Food(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    serving = db.Column(db.String(50))  # e.g. "1 cup (158 g)"
+    calories = db.Column(db.Integer)
+    carbs = db.Column(db.Float)  # in grams
+    protein = db.Column(db.Float)  # in grams
+    fat = db.Column(db.Float)  # in grams
+    popularity = db.Column(db.Integer, default=0)  # ranking weight for search
+
+    def __repr__(self):
+        return f'<Food {self.name}>'
+
+
 class Weight(db.Model):
+    __table_args__ = (
+        # One entry per day; weight() and mood() upsert on it
+        db.Index('uq_weight_user_date', 'user_id', 'date', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -75,6 +116,10 @@ class Weight(db.Model):
 
 
 class Water(db.Model):
+    __table_args__ = (
+        db.Index('ix_water_user_date', 'user_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -86,6 +131,11 @@ class Water(db.Model):
 
 
 class Exercise(db.Model):
+    __table_args__ = (
+        db.Index('ix_exercise_user_date', 'user_id', 'date'),
+        db.Index('ix_exercise_user_created', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -100,6 +150,11 @@ class Exercise(db.Model):
 
 
 class Mood(db.Model):
+    __table_args__ = (
+        db.Index('uq_mood_user_date', 'user_id', 'date', unique=True),
+        db.Index('ix_mood_user_created', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -118,9 +173,202 @@ class Reminder(db.Model):
     reminder_type = db.Column(db.String(20), nullable=False)  # workout, water, meal
     time = db.Column(db.Time, nullable=False)
     days = db.Column(db.String(20), nullable=False)  # comma-separated days (e.g., "0,1,3" for Mon,Tue,Thu)
+    days_mask = db.Column(db.Integer)  # bit n set for weekday n (Mon=0), see reminder_schedule.py
     message = db.Column(db.String(200))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Reminder {self.reminder_type} at {self.time}>'
+
+
+class ReminderSlot(db.Model):
+    """One weekly occurrence of an active reminder, indexed by minute of the week"""
+    __table_args__ = (
+        db.Index('ix_reminder_slot_minute', 'minute_of_week'),
+        db.Index('ix_reminder_slot_user_minute', 'user_id', 'minute_of_week'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    reminder_id = db.Column(db.Integer, db.ForeignKey('reminder.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    minute_of_week = db.Column(db.Integer, nullable=False)  # 0 = Monday 00:00
+    
+    def __repr__(self):
+        return f'<ReminderSlot {self.reminder_id} at {self.minute_of_week}>'
+
+
+class DataVersion(db.Model):
+    """Per-user counter bumped on every tracking write, used to validate caches"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.version} for {self.user_id}>'
+
+
+class ActivityEvent(db.Model):
+    """Append-only timeline of tracking entries across all types"""
+    __table_args__ = (
+        db.Index('ix_activity_event_user_time', 'user_id', 'occurred_at', 'id'),
+        db.Index('ix_activity_event_entry', 'entry_type', 'entry_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entry_type = db.Column(db.String(20), nullable=False)  # diet, water, weight, exercise, mood
+    entry_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    entry_date = db.Column(db.Date)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ActivityEvent {self.entry_type} {self.entry_id} at {self.occurred_at}>'
+
+
+class TrackingCounters(db.Model):
+    """Per-user entry counts, kept in step by the insert and delete paths"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    diet = db.Column(db.Integer, nullable=False, default=0)
+    water = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Integer, nullable=False, default=0)
+    exercise = db.Column(db.Integer, nullable=False, default=0)
+    mood = db.Column(db.Integer, nullable=False, default=0)
+    
+    user = db.relationship('User')
+    
+    def as_dict(self):
+        return {
+            'diet': self.diet,
+            'water': self.water,
+            'weight': self.weight,
+            'exercise': self.exercise,
+            'mood': self.mood
+        }
+    
+    def __repr__(self):
+        return f'<TrackingCounters for {self.user_id}>'
+
+
+class Job(db.Model):
+    """Queued background work such as long reports and full exports"""
+    __table_args__ = (
+        db.Index('ix_job_status_created', 'status', 'created_at'),
+        db.Index('ix_job_expires', 'expires_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # report, export, ...
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    result_path = db.Column(db.String(300))
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer)  # claims so far, counting re-queues of stale runs
+    
+    def __repr__(self):
+        return f'<Job {self.kind} {self.id} {self.status}>'
+
+
+class ReportSnapshot(db.Model):
+    """Frozen report figures for a closed ISO week or calendar month"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period_type', 'start_date', name='uq_report_snapshot_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period_type = db.Column(db.String(10), nullable=False)  # week, month
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # compact JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ReportSnapshot {self.period_type} {self.start_date} for {self.user_id}>'
+
+
+class CohortStat(db.Model):
+    """Aggregate of one per-user metric over a cohort, rebuilt by compute-cohorts"""
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'cohort', name='uq_cohort_stat_metric_cohort'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)
+    cohort = db.Column(db.String(50), nullable=False)  # e.g. "30-44", "female", "2024-05"
+    users = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.Float)
+    stddev = db.Column(db.Float)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CohortStat {self.metric} {self.cohort}>'
+
+
+class MoodObservation(db.Model):
+    """A mood day and the behaviour features it currently contributes to MoodStat"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    mood_level = db.Column(db.Integer, nullable=False)
+    exercise_minutes = db.Column(db.Float)
+    prev_day_exercise_minutes = db.Column(db.Float)
+    water_adherence = db.Column(db.Float)  # water / water goal
+    calorie_balance = db.Column(db.Float)  # consumed - burned - calorie goal
+    
+    def __repr__(self):
+        return f'<MoodObservation {self.date} for {self.user_id}>'
+
+
+class MoodStat(db.Model):
+    """Running sums relating mood to one feature, for incremental correlations"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    feature = db.Column(db.String(50), primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    sum_x = db.Column(db.Float, nullable=False, default=0)
+    sum_y = db.Column(db.Float, nullable=False, default=0)
+    sum_xx = db.Column(db.Float, nullable=False, default=0)
+    sum_yy = db.Column(db.Float, nullable=False, default=0)
+    sum_xy = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MoodStat {self.feature} for {self.user_id}>'
+
+
+class GoalStreak(db.Model):
+    """Consecutive qualifying days of one metric (e.g. water goal reached) for a user"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    metric = db.Column(db.String(50), primary_key=True)
+    current = db.Column(db.Integer, nullable=False, default=0)  # run ending at last_date
+    current_start = db.Column(db.Date)
+    last_date = db.Column(db.Date)  # latest qualifying day
+    longest = db.Column(db.Integer, nullable=False, default=0)
+    longest_end = db.Column(db.Date)
+    
+    def __repr__(self):
+        return f'<GoalStreak {self.metric} for {self.user_id}>'
+
+
+def _archive_table(model):
+    """Table with the same columns as ``model``'s, holding rows moved out by the archiver"""
+    name = f'{model.__tablename__}_archive'
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key,
+                  nullable=column.nullable, autoincrement=False)
+        for column in model.__table__.columns
+    ]
+    return db.Table(
+        name, *columns,
+        db.Index(f'ix_{name}_user_date', 'user_id', 'date'),
+        db.Index(f'ix_{name}_date', 'date')
+    )
+
+
+# Cold storage for the high-volume tracking tables, see archiving.py
+ARCHIVE_TABLES = {model.__tablename__: _archive_table(model) for model in (Diet, Water, Exercise)}
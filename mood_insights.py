@@ -0,0 +1,248 @@
+"""How a user's mood relates to exercise, water and calorie habits.
+
+Every mood day is an observation (mood level, behaviour features of that
+day). For each feature MoodStat keeps running sums of the observations
+(n, x, y, x², y², xy), shifted by a typical value to keep them
+well-conditioned. A write that changes a day's features subtracts the
+day's old observation and adds the new one as a single additive UPDATE,
+so correlations are read in O(1) and concurrent writers cannot lose each
+other's changes. The sums are built by a background job the first time
+insights are requested; until it has run there are no insights to show.
+The app records no sleep data, so the previous day's exercise is the only
+lagged feature.
+"""
+import math
+from datetime import timedelta
+
+import click
+from sqlalchemy import select, update, delete
+
+from app import app, db
+from jobs import job_handler, enqueue_job
+from models import Mood, Diet, Water, Exercise, UserProfile, MoodObservation, MoodStat, Job
+from read_models import daily_sums
+from signals import entries_saved, entries_deleted, profile_updated
+
+# feature -> shift subtracted before summing (a typical value for it)
+FEATURES = {
+    'exercise_minutes': 30.0,
+    'prev_day_exercise_minutes': 30.0,
+    'water_adherence': 1.0,
+    'calorie_balance': 0.0,
+}
+MOOD_SHIFT = 3.0
+MIN_OBSERVATIONS = 5
+AFFECTING_ENTRY_TYPES = {'mood', 'diet', 'water', 'exercise'}
+
+
+def _goals(user_id):
+    row = db.session.execute(
+        select(UserProfile.calorie_goal, UserProfile.water_goal).where(UserProfile.user_id == user_id)
+    ).first()
+    return (row.calorie_goal if row else None) or 2000, (row.water_goal if row else None) or 2000
+
+
+def compute_observations(user_id, days=None):
+    """{date: feature dict} for the user's mood days (all of them, or those in ``days``)"""
+    query = select(Mood.date, Mood.mood_level).where(Mood.user_id == user_id).order_by(Mood.date, Mood.id)
+    if days is not None:
+        query = query.where(Mood.date.in_(days))
+    # Latest entry of a day wins, as on the mood page
+    moods = dict(db.session.execute(query).all())
+    if not moods:
+        return {}
+
+    start, end = min(moods) - timedelta(days=1), max(moods)
+    exercise = daily_sums(Exercise, user_id, start, end, 'duration', 'calories_burned')
+    calories = daily_sums(Diet, user_id, start, end, 'calories')
+    water = daily_sums(Water, user_id, start, end, 'amount')
+    calorie_goal, water_goal = _goals(user_id)
+
+    observations = {}
+    for day, mood_level in moods.items():
+        minutes, burned = exercise.get(day, (0, 0))
+        observations[day] = {
+            'mood_level': mood_level,
+            'exercise_minutes': float(minutes),
+            'prev_day_exercise_minutes': float(exercise.get(day - timedelta(days=1), (0, 0))[0]),
+            # Only days where something was logged say anything about the habit
+            'water_adherence': water[day][0] / water_goal if day in water else None,
+            'calorie_balance': float(calories[day][0] - burned - calorie_goal) if day in calories else None,
+        }
+    return observations
+
+
+def _add_to(deltas, observation, sign):
+    y = observation['mood_level'] - MOOD_SHIFT
+    for feature, shift in FEATURES.items():
+        if observation[feature] is None:
+            continue
+        x = observation[feature] - shift
+        delta = deltas.setdefault(feature, [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        for i, value in enumerate((1, x, y, x * x, y * y, x * y)):
+            delta[i] += sign * value
+
+
+def _lock_stats(user_id):
+    """Write-lock the user's sums; False if they have not been built yet.
+
+    The no-op UPDATE takes row locks where the database has them and the
+    write lock on SQLite, so writers for one user run one after another
+    and each sees the observations the previous one stored.
+    """
+    result = db.session.execute(
+        update(MoodStat).where(MoodStat.user_id == user_id).values(n=MoodStat.n),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == len(FEATURES)
+
+
+def update_observations(user_id, days):
+    """Re-derive the observations of ``days`` and apply the difference to the sums"""
+    if not _lock_stats(user_id):
+        return
+    stored = {
+        observation.date: observation for observation in db.session.execute(
+            select(MoodObservation).where(MoodObservation.user_id == user_id, MoodObservation.date.in_(days))
+        ).scalars()
+    }
+    current = compute_observations(user_id, days)
+
+    deltas = {}
+    for day in set(stored) | set(current):
+        old = stored.get(day)
+        new = current.get(day)
+        if old is not None:
+            _add_to(deltas, {name: getattr(old, name) for name in ('mood_level', *FEATURES)}, -1)
+            if new is None:
+                db.session.delete(old)
+        if new is not None:
+            _add_to(deltas, new, 1)
+            if old is None:
+                db.session.add(MoodObservation(user_id=user_id, date=day, **new))
+            else:
+                for name, value in new.items():
+                    setattr(old, name, value)
+
+    columns = ('n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy')
+    for feature, delta in deltas.items():
+        if not any(delta):
+            continue
+        db.session.execute(
+            update(MoodStat).where(MoodStat.user_id == user_id, MoodStat.feature == feature).values({
+                getattr(MoodStat, column): getattr(MoodStat, column) + value
+                for column, value in zip(columns, delta)
+            }),
+            execution_options={'synchronize_session': False}
+        )
+
+
+@entries_saved.connect
+@entries_deleted.connect
+def _on_entries_changed(sender, user_id, entry_type, dates=(), **kwargs):
+    if entry_type not in AFFECTING_ENTRY_TYPES or not dates:
+        return
+    days = set(dates)
+    if entry_type == 'exercise':
+        days |= {day + timedelta(days=1) for day in dates}
+    update_observations(user_id, days)
+
+
+@profile_updated.connect
+def _on_profile_updated(sender, user_id, **kwargs):
+    # Goals feed two features; the next read queues a rebuild
+    forget_mood_stats(user_id)
+
+
+def forget_mood_stats(user_id):
+    db.session.execute(delete(MoodStat).where(MoodStat.user_id == user_id))
+    db.session.execute(delete(MoodObservation).where(MoodObservation.user_id == user_id))
+
+
+def rebuild_mood_stats(user_id):
+    """Recompute a user's observations and sums from scratch; the caller commits"""
+    forget_mood_stats(user_id)
+    observations = compute_observations(user_id)
+    deltas = {}
+    for day, observation in observations.items():
+        db.session.add(MoodObservation(user_id=user_id, date=day, **observation))
+        _add_to(deltas, observation, 1)
+    for feature in FEATURES:
+        n, sum_x, sum_y, sum_xx, sum_yy, sum_xy = deltas.get(feature, [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        db.session.add(MoodStat(user_id=user_id, feature=feature, n=n, sum_x=sum_x, sum_y=sum_y,
+                                sum_xx=sum_xx, sum_yy=sum_yy, sum_xy=sum_xy))
+
+
+def _describe(stat):
+    n = stat.n
+    result = {'observations': n, 'correlation': None, 'mood_change_per_unit': None,
+              'average': round(stat.sum_x / n + FEATURES[stat.feature], 2) if n else None}
+    if n < MIN_OBSERVATIONS:
+        return result
+    var_x = n * stat.sum_xx - stat.sum_x ** 2
+    var_y = n * stat.sum_yy - stat.sum_y ** 2
+    cov = n * stat.sum_xy - stat.sum_x * stat.sum_y
+    if var_x <= 1e-9 or var_y <= 1e-9:
+        return result
+    result['correlation'] = round(max(-1.0, min(1.0, cov / math.sqrt(var_x * var_y))), 3)
+    result['mood_change_per_unit'] = round(cov / var_x, 4)
+    return result
+
+
+@job_handler('mood-stats')
+def build_mood_stats(user_id):
+    rebuild_mood_stats(user_id)
+    db.session.commit()
+    return {'features': len(FEATURES)}
+
+
+def get_mood_insights(user_id):
+    """{feature: {observations, correlation, mood_change_per_unit, average}}
+
+    Empty until the user's sums exist; the first such read queues the job
+    that builds them.
+    """
+    stats = db.session.execute(select(MoodStat).where(MoodStat.user_id == user_id)).scalars().all()
+    if len(stats) != len(FEATURES):
+        queued = db.session.execute(
+            select(Job.id).where(Job.user_id == user_id, Job.kind == 'mood-stats',
+                                 Job.status.in_(('queued', 'running'))).limit(1)
+        ).scalar()
+        if queued is None:
+            enqueue_job(user_id, 'mood-stats')
+        return {}
+    return {stat.feature: _describe(stat) for stat in stats}
+
+
+def notable_insights(insights, threshold=0.3, min_observations=10):
+    """Human readable lines for the clearer relationships, strongest first"""
+    labels = {
+        'exercise_minutes': 'exercise',
+        'prev_day_exercise_minutes': 'exercise the day before',
+        'water_adherence': 'water relative to the goal',
+        'calorie_balance': 'calories relative to the goal',
+    }
+    notable = sorted(
+        ((feature, result) for feature, result in insights.items()
+         if result['correlation'] is not None and abs(result['correlation']) >= threshold
+         and result['observations'] >= min_observations),
+        key=lambda item: -abs(item[1]['correlation'])
+    )
+    return [
+        f"Mood tends to be {'higher' if result['correlation'] > 0 else 'lower'} on days with more "
+        f"{labels[feature]} (r = {result['correlation']:+.2f}, {result['observations']} days)"
+        for feature, result in notable
+    ]
+
+
+@app.cli.command('rebuild-mood-stats')
+@click.option('--user-id', type=int, default=None, help='Only this user (default: everyone with stats).')
+def rebuild_mood_stats_command(user_id):
+    """Recompute the incremental mood correlation sums"""
+    user_ids = [user_id] if user_id else db.session.execute(
+        select(MoodStat.user_id).distinct()
+    ).scalars().all()
+    for uid in user_ids:
+        rebuild_mood_stats(uid)
+        db.session.commit()
+    click.echo(f'Rebuilt mood statistics for {len(user_ids)} users.')
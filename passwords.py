@@ -0,0 +1,75 @@
+"""Password hashing with configurable cost, rehash-on-login and bounded verify concurrency"""
+import logging
+import os
+import threading
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Stored for accounts that can only sign in through OAuth; never matches a hash
+UNUSABLE_PASSWORD = '!'
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when a verification waited longer than PASSWORD_VERIFY_TIMEOUT for a slot"""
+
+
+_expected_prefix = {}
+
+
+def init_password_hashing(app):
+    # Werkzeug method strings, e.g. "scrypt", "scrypt:65536:8:1" or "pbkdf2:sha256:1000000"
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+    # Hashing is CPU bound (hashlib releases the GIL), so at most one
+    # verification per core runs at once and the rest wait for a slot
+    # instead of slowing every login down together.
+    app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+    app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', 5.0)
+    app.extensions['password_hash_slots'] = threading.BoundedSemaphore(app.config['PASSWORD_HASH_WORKERS'])
+
+
+def hash_password(password):
+    config = current_app.config
+    return generate_password_hash(
+        password,
+        method=config['PASSWORD_HASH_METHOD'],
+        salt_length=config['PASSWORD_SALT_LENGTH']
+    )
+
+
+def verify_password(password_hash, password):
+    """check_password_hash once one of the PASSWORD_HASH_WORKERS slots is free.
+
+    The hash runs on the calling thread; waiting for a slot is what is
+    bounded, so a burst of logins fails fast with PasswordCheckBusy
+    instead of queueing hashes that nobody waits for any more.
+    """
+    if not password_hash or password_hash == UNUSABLE_PASSWORD or password is None:
+        return False
+    slots = current_app.extensions['password_hash_slots']
+    if not slots.acquire(timeout=current_app.config['PASSWORD_VERIFY_TIMEOUT']):
+        logging.warning("Password verification timed out waiting for a hashing slot")
+        raise PasswordCheckBusy()
+    try:
+        return check_password_hash(password_hash, password)
+    finally:
+        slots.release()
+
+
+def needs_rehash(password_hash):
+    """True when a stored hash was made with other parameters than configured"""
+    if not password_hash or password_hash == UNUSABLE_PASSWORD:
+        return False
+    config = current_app.config
+    settings = (config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+    prefix = _expected_prefix.get(settings)
+    if prefix is None:
+        # Werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"), so
+        # hash once to learn the exact method string it writes.
+        prefix = _expected_prefix[settings] = generate_password_hash(
+            '', method=settings[0], salt_length=settings[1]
+        ).split('$', 1)[0]
+    method, _, rest = password_hash.partition('$')
+    salt = rest.partition('$')[0]
+    return method != prefix or len(salt) != settings[1]
@@ -0,0 +1,315 @@
+"""Opt-in per-request profiling with flamegraph output.
+
+Off unless PROFILING=1; then nothing is registered at all and requests run
+exactly as before. When on, a request is profiled if
+
+- it carries ``X-Profile: sample`` or ``X-Profile: cprofile`` and comes
+  from an admin or with ``X-Profile-Token`` equal to PROFILING_TOKEN,
+- its user was flagged by an admin (POST /api/admin/profiling/targets), or
+- it falls in the PROFILING_SAMPLE_RATE share of requests under
+  PROFILING_PATH_PREFIX.
+
+``sample`` polls the request thread's stack every PROFILING_INTERVAL_MS
+from a helper thread and costs little. ``cprofile`` traces every call;
+it is exact but slows the request down. Its call graph is turned into
+approximate stacks. Both are saved as collapsed stacks (one
+"frame;frame;frame count" line per stack, ready for flamegraph.pl or
+speedscope) with a JSON sidecar under PROFILING_DIR. The oldest profiles
+are removed beyond PROFILING_MAX_BYTES. Profiled responses carry
+``X-Profile-Id``.
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+from cache import LRUCache
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_NAME_RE = re.compile(r'^[0-9]{8}T[0-9]{9}-[0-9a-f]{8}$')
+TARGETS_FILE = 'targets.json'
+MAX_STACK_DEPTH = 100
+
+_targets = LRUCache(maxsize=1, ttl=5)
+
+
+def init_profiling(app):
+    app.config.setdefault('PROFILING_ENABLED', False)
+    app.config.setdefault('PROFILING_DIR', None)
+    app.config.setdefault('PROFILING_MAX_BYTES', 50 * 1024 * 1024)
+    app.config.setdefault('PROFILING_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILING_PATH_PREFIX', '/')
+    app.config.setdefault('PROFILING_MODE', 'sample')
+    app.config.setdefault('PROFILING_INTERVAL_MS', 5)
+    app.config.setdefault('PROFILING_TOKEN', None)
+    if not app.config['PROFILING_ENABLED']:
+        return
+    app.before_request(_start_profiling)
+    app.after_request(_finish_profiling)
+    app.teardown_request(_abandon_profiling)
+
+
+def profile_dir():
+    return current_app.config['PROFILING_DIR'] or os.path.join(current_app.instance_path, 'profiles')
+
+
+class SamplingProfiler:
+    """Counts the stacks of one thread, sampled from a helper thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                names.append(_frame_name(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        return self.stacks
+
+
+class CallProfiler:
+    """cProfile, with its caller/callee graph spread into approximate stacks in microseconds"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def collapsed(self, min_time=0.000001):
+        stats = pstats.Stats(self.profiler).stats
+        callees = {}
+        for func, (_, _, _, _, callers) in stats.items():
+            for caller, edge in callers.items():
+                callees.setdefault(caller, {})[func] = edge[3]
+        stacks = Counter()
+
+        def expand(func, spent, path, on_path):
+            _, _, own, cumulative, _ = stats[func]
+            if cumulative <= 0:
+                return
+            scale = spent / cumulative
+            stacks[path] += own * scale
+            if len(on_path) >= MAX_STACK_DEPTH:
+                return
+            for callee, edge_time in callees.get(func, {}).items():
+                # Recursion is folded into the outermost call
+                if callee not in on_path and edge_time * scale >= min_time:
+                    expand(callee, edge_time * scale, f'{path};{_func_name(callee)}', on_path | {callee})
+
+        for func, (_, _, _, cumulative, callers) in stats.items():
+            if not callers:
+                expand(func, cumulative, _func_name(func), {func})
+        return Counter({stack: round(seconds * 1000000) for stack, seconds in stacks.items() if seconds >= min_time})
+
+
+def _frame_name(filename, name):
+    return f'{os.path.basename(filename)}:{name}'.replace(';', ':')
+
+
+def _func_name(func):
+    filename, _, name = func
+    return name.replace(';', ':') if filename == '~' else _frame_name(filename, name)
+
+
+# Deciding what to profile
+
+def profiled_users():
+    users = _targets.get('users')
+    if users is None:
+        try:
+            with open(os.path.join(profile_dir(), TARGETS_FILE)) as f:
+                users = set(json.load(f))
+        except (OSError, ValueError):
+            users = set()
+        _targets.set('users', users)
+    return users
+
+
+def set_profiled_user(user_id, enabled):
+    """Flag or unflag a user's requests for profiling (shared by the workers of this host)"""
+    users = set(profiled_users())
+    if enabled:
+        users.add(user_id)
+    else:
+        users.discard(user_id)
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f'.{TARGETS_FILE}.{uuid.uuid4().hex}')
+    with open(temporary, 'w') as f:
+        json.dump(sorted(users), f)
+    os.replace(temporary, os.path.join(directory, TARGETS_FILE))
+    _targets.set('users', users)
+    return sorted(users)
+
+
+def _requested_mode():
+    config = current_app.config
+    header = request.headers.get('X-Profile')
+    if header in PROFILE_MODES:
+        token = config['PROFILING_TOKEN']
+        supplied = request.headers.get('X-Profile-Token', '').encode()
+        if (token and hmac.compare_digest(supplied, token.encode())) or (
+                current_user.is_authenticated and current_user.is_admin):
+            return header
+    # Flask-Login's session key, so unflagged requests never load the user
+    user_id = session.get('_user_id')
+    if user_id is not None and int(user_id) in profiled_users():
+        return config['PROFILING_MODE']
+    if (config['PROFILING_SAMPLE_RATE'] and request.path.startswith(config['PROFILING_PATH_PREFIX'])
+            and random.random() < config['PROFILING_SAMPLE_RATE']):
+        return config['PROFILING_MODE']
+    return None
+
+
+def _start_profiling():
+    mode = _requested_mode()
+    if mode is None:
+        return
+    profiler = SamplingProfiler(current_app.config['PROFILING_INTERVAL_MS'] / 1000) if mode == 'sample' else CallProfiler()
+    g.profiling = (mode, profiler, time.perf_counter())
+    profiler.start()
+
+
+def _finish_profiling(response):
+    name = _stop_and_save(response.status_code)
+    if name:
+        response.headers['X-Profile-Id'] = name
+    return response
+
+
+def _abandon_profiling(exc):
+    # The request failed before after_request ran
+    _stop_and_save(500)
+
+
+def _stop_and_save(status_code):
+    profiling = g.pop('profiling', None)
+    if profiling is None:
+        return None
+    mode, profiler, started = profiling
+    profiler.stop()
+    duration = time.perf_counter() - started
+    meta = {
+        'method': request.method,
+        'path': request.path,
+        'user_id': int(session['_user_id']) if session.get('_user_id') else None,
+        'mode': mode,
+        'status': status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+    try:
+        return save_profile(meta, profiler.collapsed())
+    except OSError as e:
+        logging.error(f"Could not save profile of {request.path}: {str(e)}")
+        return None
+
+
+# On-disk store
+
+def save_profile(meta, stacks):
+    """Write collapsed stacks plus metadata and trim the store; returns the profile name"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    name = f'{time.strftime("%Y%m%dT%H%M%S", time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}'
+    with open(os.path.join(directory, f'{name}.collapsed'), 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            if count > 0:
+                f.write(f'{stack} {count}\n')
+    meta = dict(meta, name=name, size=os.path.getsize(os.path.join(directory, f'{name}.collapsed')))
+    with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+        json.dump(meta, f)
+    _prune(directory, current_app.config['PROFILING_MAX_BYTES'], keep=name)
+    return name
+
+
+def _prune(directory, max_bytes, keep=None):
+    profiles = []
+    for entry in os.scandir(directory):
+        name, extension = os.path.splitext(entry.name)
+        if extension == '.collapsed' and PROFILE_NAME_RE.match(name) and name != keep:
+            meta_path = os.path.join(directory, f'{name}.json')
+            size = entry.stat().st_size + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0)
+            profiles.append((name, size))
+    # Names start with the timestamp, so they sort oldest first
+    profiles.sort()
+    total = sum(size for _, size in profiles)
+    if keep:
+        # The profile just written is never removed, but it counts towards the cap
+        total += sum(os.path.getsize(os.path.join(directory, f'{keep}{extension}'))
+                     for extension in ('.collapsed', '.json'))
+    for name, size in profiles:
+        if total <= max_bytes:
+            break
+        for extension in ('.collapsed', '.json'):
+            try:
+                os.remove(os.path.join(directory, f'{name}{extension}'))
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def list_profiles(limit=100):
+    """Metadata of the stored profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(
+        (os.path.splitext(entry)[0] for entry in os.listdir(directory) if entry.endswith('.json')),
+        reverse=True
+    )
+    profiles = []
+    for name in names:
+        if not PROFILE_NAME_RE.match(name):
+            continue
+        try:
+            with open(os.path.join(directory, f'{name}.json')) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        if len(profiles) >= limit:
+            break
+    return profiles
+
+
+def profile_path(name):
+    """Path of a stored profile's collapsed stacks, or None"""
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = os.path.join(profile_dir(), f'{name}.collapsed')
+    return path if os.path.exists(path) else None
@@ -0,0 +1,172 @@
+"""Token-bucket rate limiting for expensive endpoints"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request, Response
+from flask_login import current_user
+
+from cache import LRUCache
+
+# Per endpoint: a list of (key, "N/period") buckets that must all allow the request.
+# "user" keys on the logged in user, "ip" on the client address and
+# "username" on the username submitted in a login form.
+DEFAULT_LIMITS = {
+    'chat': [('user', '20/minute'), ('ip', '60/minute')],
+    'login': [('ip', '10/minute'), ('username', '5/minute')],
+    'oauth': [('ip', '20/minute')],
+}
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$')
+
+
+def parse_limit(limit):
+    """'20/minute' -> (capacity 20, refill of 20 tokens per 60 seconds)"""
+    match = _LIMIT_RE.match(limit)
+    if not match:
+        raise ValueError(f'Invalid rate limit {limit!r}')
+    count, multiplier, period = match.groups()
+    seconds = _PERIODS[period] * int(multiplier or 1)
+    return int(count), int(count) / seconds
+
+
+def _take(tokens, updated, now, capacity, rate, cost):
+    """Refill a bucket and try to take ``cost`` tokens; returns (tokens, retry_after)"""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryRateLimitStore:
+    """Buckets held in this process; each worker limits independently"""
+
+    def __init__(self, maxsize=100000):
+        self._buckets = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, retry_after = _take(tokens, updated, now, capacity, rate, cost)
+            self._buckets.set(key, (tokens, now))
+        return retry_after
+
+
+class SQLiteRateLimitStore:
+    """Buckets in a local SQLite file so every worker on the host shares them"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, rate, cost=1):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, retry_after = _take(tokens, updated, now, capacity, rate, cost)
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                # Buckets idle for a day are full again; dropping them is free
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return retry_after
+
+
+def init_rate_limiting(app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMIT_STORAGE', 'memory')
+    limits = {name: list(buckets) for name, buckets in DEFAULT_LIMITS.items()}
+    limits.update(app.config.get('RATELIMITS') or {})
+    app.config['RATELIMITS'] = limits
+
+    if app.config['RATELIMIT_STORAGE'] == 'sqlite':
+        path = app.config.get('RATELIMIT_SQLITE_PATH') or os.path.join(app.instance_path, 'ratelimits.sqlite3')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store = SQLiteRateLimitStore(path)
+    else:
+        store = MemoryRateLimitStore()
+    app.extensions['rate_limit_store'] = store
+
+
+def _bucket_key(kind):
+    if kind == 'user':
+        return str(current_user.id) if current_user.is_authenticated else None
+    if kind == 'ip':
+        return request.remote_addr
+    if kind == 'username':
+        return (request.form.get('username') or '').strip().lower() or None
+    raise ValueError(f'Unknown rate limit key {kind!r}')
+
+
+def _too_many_requests(retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if request.path.startswith('/api/') or request.is_json:
+        response = jsonify({
+            'error': 'Too many requests. Please slow down and try again shortly.',
+            'retry_after': retry_after
+        })
+        response.status_code = 429
+    else:
+        response = Response(
+            f'Too many requests. Please try again in {retry_after} seconds.',
+            status=429,
+            mimetype='text/plain'
+        )
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name, methods=None):
+    """Apply the buckets configured under RATELIMITS[name] to a view.
+
+    ``methods`` restricts limiting to those HTTP methods, e.g. only the
+    POST of a login form.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            app = current_app
+            if app.config.get('RATELIMIT_ENABLED') and (methods is None or request.method in methods):
+                store = app.extensions['rate_limit_store']
+                retry_after = 0.0
+                for kind, limit in app.config['RATELIMITS'].get(name, ()):
+                    key = _bucket_key(kind)
+                    if key is None:
+                        continue
+                    capacity, rate = parse_limit(limit)
+                    retry_after = max(retry_after, store.consume(f'{name}:{kind}:{key}', capacity, rate))
+                if retry_after > 0:
+                    return _too_many_requests(retry_after)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
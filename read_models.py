@@ -0,0 +1,105 @@
+"""Read-only views of tracking data without ORM hydration.
+
+Pages and exports that only display entries select the columns they need
+into slotted dataclasses, with totals computed by window sums in the same
+query, so no identity map, instance state or Python-side summing is
+involved. Rows reached through entry_source() include archived entries.
+"""
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+
+from sqlalchemy import select, func
+
+from app import db
+from archiving import entry_source
+from models import Diet, Water, Exercise
+
+
+@dataclass(slots=True, frozen=True)
+class MealRow:
+    id: int
+    date: date
+    meal_type: str
+    food_name: str
+    calories: int
+    carbs: float
+    protein: float
+    fat: float
+    created_at: datetime
+
+
+@dataclass(slots=True, frozen=True)
+class WaterRow:
+    id: int
+    date: date
+    amount: int
+    created_at: datetime
+
+
+@dataclass(slots=True, frozen=True)
+class ExerciseRow:
+    id: int
+    date: date
+    activity: str
+    duration: int
+    calories_burned: int
+    notes: str
+    created_at: datetime
+
+
+def _day_rows(row_class, model, user_id, day, order_by, totals):
+    """Rows of one day as ``row_class`` plus {name: SUM(column)} from the same query"""
+    source = entry_source(model, day)
+    names = [field.name for field in fields(row_class)]
+    query = select(
+        *[source.c[name] for name in names],
+        *[func.sum(source.c[name]).over().label(f'total_{name}') for name in totals]
+    ).where(
+        source.c.user_id == user_id, source.c.date == day
+    ).order_by(*[source.c[name] for name in order_by])
+
+    result = db.session.execute(query).all()
+    width = len(names)
+    rows = [row_class(*row[:width]) for row in result]
+    sums = dict(zip(totals, result[0][width:])) if result else {}
+    return rows, {name: sums.get(name) or 0 for name in totals}
+
+
+def diet_day(user_id, day):
+    """Meals of a day and their calorie and macro totals"""
+    return _day_rows(MealRow, Diet, user_id, day, ('meal_type', 'created_at', 'id'),
+                     ('calories', 'carbs', 'protein', 'fat'))
+
+
+def water_day(user_id, day):
+    """Water entries of a day and the total amount"""
+    return _day_rows(WaterRow, Water, user_id, day, ('created_at', 'id'), ('amount',))
+
+
+def exercise_day(user_id, day):
+    """Exercise entries of a day with total duration and calories burned"""
+    return _day_rows(ExerciseRow, Exercise, user_id, day, ('created_at', 'id'),
+                     ('duration', 'calories_burned'))
+
+
+def daily_sums(model, user_id, start_date, end_date, *columns):
+    """{date: (SUM(column), ...)} for each day with entries, in one grouped query"""
+    source = entry_source(model, start_date)
+    rows = db.session.execute(
+        select(source.c.date, *[func.coalesce(func.sum(source.c[name]), 0) for name in columns]).where(
+            source.c.user_id == user_id,
+            source.c.date >= start_date,
+            source.c.date <= end_date
+        ).group_by(source.c.date)
+    )
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def column_rows(model, user_id, *columns, order_by=('id',)):
+    """Tuple-like rows of the given columns for all of a user's entries"""
+    source = entry_source(model)
+    return db.session.execute(
+        select(*[source.c[name] for name in columns])
+        .where(source.c.user_id == user_id)
+        .order_by(*[source.c[name] for name in order_by])
+    ).all()
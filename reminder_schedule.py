@@ -0,0 +1,171 @@
+"""Indexed weekly schedule for reminders.
+
+A reminder's weekdays are kept as a bitmask (bit n = weekday n, Monday 0)
+and each active (reminder, weekday) pair as a ReminderSlot row holding its
+minute of the week. "What is due in the next N minutes" is then a range
+scan on that index, and the next occurrence of every reminder of a user
+comes from one grouped query.
+"""
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, delete, update, func
+
+from app import app, db
+from models import Reminder, ReminderSlot
+from signals import entries_saved, entries_deleted
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+MIGRATION_CHUNK_SIZE = 1000
+
+
+def days_to_mask(days):
+    """"0,2,4" or ["0", "2", "4"] -> 0b10101; unknown values are ignored"""
+    if isinstance(days, str):
+        days = days.split(',')
+    mask = 0
+    for day in days:
+        day = str(day).strip()
+        if day.isdigit() and int(day) < 7:
+            mask |= 1 << int(day)
+    return mask
+
+
+def mask_to_days(mask):
+    return [day for day in range(7) if mask & (1 << day)]
+
+
+def minute_of_week(weekday, time):
+    return weekday * MINUTES_PER_DAY + time.hour * 60 + time.minute
+
+
+def reminder_mask(reminder):
+    return reminder.days_mask if reminder.days_mask is not None else days_to_mask(reminder.days)
+
+
+def sync_reminder_slots(reminder):
+    """Replace the reminder's slots with one per scheduled weekday (none if inactive)"""
+    db.session.execute(delete(ReminderSlot).where(ReminderSlot.reminder_id == reminder.id))
+    if not reminder.active:
+        return
+    db.session.add_all([
+        ReminderSlot(reminder_id=reminder.id, user_id=reminder.user_id,
+                     minute_of_week=minute_of_week(day, reminder.time))
+        for day in mask_to_days(reminder_mask(reminder))
+    ])
+
+
+@entries_saved.connect
+def _on_entries_saved(sender, user_id, entry_type, entries, **kwargs):
+    if entry_type != 'reminder':
+        return
+    if any(reminder.id is None for reminder in entries):
+        db.session.flush()
+    for reminder in entries:
+        if reminder.days_mask is None:
+            reminder.days_mask = days_to_mask(reminder.days)
+        sync_reminder_slots(reminder)
+
+
+@entries_deleted.connect
+def _on_entries_deleted(sender, user_id, entry_type, ids, **kwargs):
+    # The foreign key cascades on PostgreSQL; SQLite does not enforce it
+    if entry_type == 'reminder':
+        db.session.execute(delete(ReminderSlot).where(ReminderSlot.reminder_id.in_(ids)))
+
+
+def _week_position(now):
+    return minute_of_week(now.weekday(), now)
+
+
+def minutes_until_next(user_id, now=None):
+    """{reminder_id: minutes until its next occurrence} for all of a user's active reminders"""
+    now = now or datetime.now()
+    offset = (ReminderSlot.minute_of_week - _week_position(now) + MINUTES_PER_WEEK) % MINUTES_PER_WEEK
+    rows = db.session.execute(
+        select(ReminderSlot.reminder_id, func.min(offset))
+        .where(ReminderSlot.user_id == user_id)
+        .group_by(ReminderSlot.reminder_id)
+    )
+    return dict(rows.all())
+
+
+def reminders_by_next_occurrence(user_id, now=None):
+    """Active reminders of a user, soonest first, each with ``next_occurrence`` set"""
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    minutes = minutes_until_next(user_id, now)
+    reminders = Reminder.query.filter_by(user_id=user_id, active=True).all()
+    for reminder in reminders:
+        until = minutes.get(reminder.id)
+        reminder.next_occurrence = now + timedelta(minutes=until) if until is not None else None
+    # Reminders without slots (no weekdays, or not migrated yet) go last
+    return sorted(reminders, key=lambda r: (r.next_occurrence is None, minutes.get(r.id, 0), r.time))
+
+
+def due_reminders(now=None, window=15, user_id=None):
+    """(reminder, due_at) for slots in [now, now + window minutes), across the week boundary"""
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    window = max(1, min(window, MINUTES_PER_WEEK))
+    start = _week_position(now)
+    end = start + window
+    ranges = [(start, min(end, MINUTES_PER_WEEK))]
+    if end > MINUTES_PER_WEEK:
+        ranges.append((0, end - MINUTES_PER_WEEK))
+
+    due = []
+    for low, high in ranges:
+        query = select(Reminder, ReminderSlot.minute_of_week).join(
+            ReminderSlot, ReminderSlot.reminder_id == Reminder.id
+        ).where(
+            ReminderSlot.minute_of_week >= low,
+            ReminderSlot.minute_of_week < high,
+            Reminder.active.is_(True)
+        ).order_by(ReminderSlot.minute_of_week)
+        if user_id is not None:
+            query = query.where(ReminderSlot.user_id == user_id)
+        for reminder, minute in db.session.execute(query):
+            until = (minute - start) % MINUTES_PER_WEEK
+            due.append((reminder, now + timedelta(minutes=until)))
+    return due
+
+
+def migrate_reminder_schedule(chunk_size=MIGRATION_CHUNK_SIZE):
+    """Fill days_mask from the days string and rebuild every reminder's slots"""
+    migrated = 0
+    last_id = 0
+    while True:
+        reminders = db.session.execute(
+            select(Reminder).where(Reminder.id > last_id).order_by(Reminder.id).limit(chunk_size)
+        ).scalars().all()
+        if not reminders:
+            break
+        ids = [reminder.id for reminder in reminders]
+        db.session.execute(delete(ReminderSlot).where(ReminderSlot.reminder_id.in_(ids)))
+        masks = []
+        slots = []
+        for reminder in reminders:
+            mask = days_to_mask(reminder.days)
+            masks.append({'id': reminder.id, 'days_mask': mask})
+            if reminder.active:
+                slots += [
+                    {'reminder_id': reminder.id, 'user_id': reminder.user_id,
+                     'minute_of_week': minute_of_week(day, reminder.time)}
+                    for day in mask_to_days(mask)
+                ]
+        db.session.execute(update(Reminder), masks)
+        if slots:
+            db.session.execute(ReminderSlot.__table__.insert(), slots)
+        db.session.commit()
+        db.session.expunge_all()
+        migrated += len(reminders)
+        last_id = ids[-1]
+    return migrated
+
+
+@app.cli.command('migrate-reminder-schedule')
+@click.option('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE, show_default=True, help='Reminders per batch.')
+def migrate_reminder_schedule_command(chunk_size):
+    """Convert reminder day lists to bitmasks and build the schedule index"""
+    migrated = migrate_reminder_schedule(chunk_size)
+    click.echo(f'Migrated {migrated} reminders.')
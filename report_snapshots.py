@@ -0,0 +1,261 @@
+"""Immutable per-week and per-month report snapshots.
+
+Past days do not change unless an entry is backdated, so once an ISO week
+or calendar month has closed its daily totals, averages, goal adherence and
+weight change are stored as one compact JSON row. Reports stitch closed
+periods from these rows and only compute the open period live. Backdated
+writes and deletes drop the snapshots they touch. Requests compute missing
+closed periods live and queue a job to store them, so nothing is written
+while serving a read; `flask generate-report-snapshots` fills them too.
+"""
+import json
+import logging
+from datetime import date, timedelta
+
+import click
+from sqlalchemy import select, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import User, UserProfile, Diet, Water, Exercise, Weight, ReportSnapshot, Job
+from archiving import entry_source
+from jobs import job_handler, enqueue_job
+from signals import entries_saved, entries_deleted
+
+PERIOD_TYPES = ('week', 'month')
+SNAPSHOT_ENTRY_TYPES = {'diet', 'water', 'exercise', 'weight'}
+USER_CHUNK_SIZE = 200
+
+
+def period_start(day, period_type):
+    if period_type == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_end(start, period_type):
+    if period_type == 'week':
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def iter_periods(start_date, end_date, period_type):
+    """(start, end) of every period overlapping start_date..end_date"""
+    start = period_start(start_date, period_type)
+    while start <= end_date:
+        end = period_end(start, period_type)
+        yield start, end
+        start = end + timedelta(days=1)
+
+
+def daily_totals(user_id, column, start_date, end_date):
+    """Sum of a column per day with one grouped query: {date: total}"""
+    source = entry_source(column.class_, start_date)
+    rows = db.session.execute(
+        select(source.c.date, func.sum(source.c[column.key])).where(
+            source.c.user_id == user_id,
+            source.c.date >= start_date,
+            source.c.date <= end_date
+        ).group_by(source.c.date)
+    )
+    return {day: total or 0 for day, total in rows}
+
+
+def _goals(user_id):
+    row = db.session.execute(
+        select(UserProfile.calorie_goal, UserProfile.water_goal).where(UserProfile.user_id == user_id)
+    ).first()
+    return (row.calorie_goal if row else None) or 2000, (row.water_goal if row else None) or 2000
+
+
+def compute_periods(user_id, periods, goals=None):
+    """Summaries for several (start, end) periods from one query per table"""
+    if not periods:
+        return []
+    calorie_goal, water_goal = goals or _goals(user_id)
+    first = min(start for start, _ in periods)
+    last = max(end for _, end in periods)
+    calories = daily_totals(user_id, Diet.calories, first, last)
+    water = daily_totals(user_id, Water.amount, first, last)
+    burned = daily_totals(user_id, Exercise.calories_burned, first, last)
+    weights = db.session.execute(
+        select(Weight.date, Weight.weight).where(
+            Weight.user_id == user_id, Weight.date >= first, Weight.date <= last
+        ).order_by(Weight.date, Weight.id)
+    ).all()
+
+    summaries = []
+    for start, end in periods:
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        series = {
+            'calories': [calories.get(day, 0) for day in days],
+            'water': [water.get(day, 0) for day in days],
+            'burned': [burned.get(day, 0) for day in days],
+        }
+        totals = {key: sum(values) for key, values in series.items()}
+        logged = {key: sum(1 for value in values if value) for key, values in series.items()}
+        period_weights = [value for day, value in weights if start <= day <= end]
+        summaries.append(dict(
+            series,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            totals=totals,
+            # Averages are over the days something was logged, not the whole period
+            averages={key: round(totals[key] / logged[key], 1) if logged[key] else 0 for key in totals},
+            adherence={
+                'calorie_goal': calorie_goal,
+                'water_goal': water_goal,
+                'calorie_days': sum(1 for value in series['calories'] if 0 < value <= calorie_goal),
+                'water_days': sum(1 for value in series['water'] if value >= water_goal),
+                'logged_days': logged['calories'],
+                'days': len(days),
+            },
+            weight={
+                'first': period_weights[0] if period_weights else None,
+                'last': period_weights[-1] if period_weights else None,
+                'delta': round(period_weights[-1] - period_weights[0], 2) if period_weights else None,
+            },
+        ))
+    return summaries
+
+
+def get_period_summaries(user_id, period_type, start_date, end_date, today=None, store=False):
+    """Summaries of the periods overlapping start_date..end_date, oldest first.
+
+    Closed periods come from snapshots. Missing ones are computed live and
+    stored when ``store`` is set, otherwise a job is queued to store them.
+    The open period (if any) is computed live and never stored.
+    """
+    today = today or date.today()
+    periods = list(iter_periods(start_date, end_date, period_type))
+    closed = [(start, end) for start, end in periods if end < today]
+
+    stored = {}
+    if closed:
+        rows = db.session.execute(
+            select(ReportSnapshot.start_date, ReportSnapshot.payload).where(
+                ReportSnapshot.user_id == user_id,
+                ReportSnapshot.period_type == period_type,
+                ReportSnapshot.start_date >= closed[0][0],
+                ReportSnapshot.start_date <= closed[-1][0]
+            )
+        ).all()
+        stored = {start: json.loads(payload) for start, payload in rows}
+
+    missing = [(start, end) for start, end in closed if start not in stored]
+    if missing:
+        goals = _goals(user_id)
+        for (start, end), summary in zip(missing, compute_periods(user_id, missing, goals)):
+            stored[start] = summary
+            if store:
+                db.session.add(ReportSnapshot(
+                    user_id=user_id, period_type=period_type, start_date=start, end_date=end,
+                    payload=json.dumps(summary, separators=(',', ':'))
+                ))
+        if store:
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another job stored the same periods first; theirs are identical
+                db.session.rollback()
+        else:
+            _queue_snapshots(user_id, period_type, missing[0][0], missing[-1][1])
+
+    open_periods = [(start, min(end, today)) for start, end in periods if end >= today]
+    live = dict(zip([start for start, _ in open_periods], compute_periods(user_id, open_periods)))
+    return [stored.get(start) or live[start] for start, _ in periods]
+
+
+def _queue_snapshots(user_id, period_type, start_date, end_date):
+    queued = db.session.execute(
+        select(Job.id).where(Job.user_id == user_id, Job.kind == 'report-snapshots',
+                             Job.status.in_(('queued', 'running'))).limit(1)
+    ).scalar()
+    if queued is None:
+        enqueue_job(user_id, 'report-snapshots', period_type=period_type,
+                    start_date=start_date.isoformat(), end_date=end_date.isoformat())
+
+
+@job_handler('report-snapshots')
+def store_snapshots(user_id, period_type, start_date, end_date):
+    summaries = get_period_summaries(user_id, period_type, date.fromisoformat(start_date),
+                                     date.fromisoformat(end_date), store=True)
+    return {'periods': len(summaries)}
+
+
+def daily_series(user_id, start_date, end_date):
+    """{'calories'|'water'|'burned': {date: total}} stitched from weekly summaries"""
+    series = {'calories': {}, 'water': {}, 'burned': {}}
+    for summary in get_period_summaries(user_id, 'week', start_date, end_date):
+        first = date.fromisoformat(summary['start'])
+        for key, values in series.items():
+            for offset, value in enumerate(summary[key]):
+                day = first + timedelta(days=offset)
+                if start_date <= day <= end_date:
+                    values[day] = value
+    return series
+
+
+def invalidate_snapshots(user_id, dates, today=None):
+    """Drop the closed-period snapshots that contain any of ``dates``"""
+    today = today or date.today()
+    # A day can be in a closed week but the open month, or the other way round
+    conditions = []
+    for period_type in PERIOD_TYPES:
+        open_from = period_start(today, period_type)
+        starts = {period_start(day, period_type) for day in dates if day < open_from}
+        if starts:
+            conditions.append(and_(ReportSnapshot.period_type == period_type, ReportSnapshot.start_date.in_(starts)))
+    if not conditions:
+        return 0
+    result = db.session.execute(
+        delete(ReportSnapshot).where(ReportSnapshot.user_id == user_id, or_(*conditions)),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount
+
+
+@entries_saved.connect
+@entries_deleted.connect
+def _on_entries_changed(sender, user_id, entry_type, dates=(), **kwargs):
+    if entry_type in SNAPSHOT_ENTRY_TYPES and dates:
+        invalidate_snapshots(user_id, dates)
+
+
+def generate_closed_snapshots(period_type, periods_back=1, chunk_size=USER_CHUNK_SIZE):
+    """Store the last ``periods_back`` closed periods for every user"""
+    today = date.today()
+    end_date = period_start(today, period_type) - timedelta(days=1)
+    start_date = period_start(end_date, period_type)
+    for _ in range(max(periods_back, 1) - 1):
+        start_date = period_start(start_date - timedelta(days=1), period_type)
+
+    users = 0
+    last_id = 0
+    while True:
+        user_ids = db.session.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        ).scalars().all()
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            try:
+                get_period_summaries(user_id, period_type, start_date, end_date, today=today, store=True)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Failed to snapshot reports for user {user_id}: {str(e)}")
+        users += len(user_ids)
+        last_id = user_ids[-1]
+        db.session.expunge_all()
+    return users
+
+
+@app.cli.command('generate-report-snapshots')
+@click.option('--period', type=click.Choice(PERIOD_TYPES), default=None, help='Only this period type.')
+@click.option('--back', type=int, default=1, help='Number of closed periods to cover.')
+def generate_report_snapshots_command(period, back):
+    """Snapshot the most recently closed weeks and months for all users"""
+    for period_type in ([period] if period else PERIOD_TYPES):
+        users = generate_closed_snapshots(period_type, periods_back=back)
+        click.echo(f'Snapshotted {period_type} reports for {users} users')
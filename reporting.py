@@ -0,0 +1,193 @@
+"""Report and export builders shared by the request handlers and the job workers"""
+from datetime import date, timedelta
+
+from app import db
+from jobs import job_handler
+from models import User, UserProfile, Diet, Weight, Water, Exercise, Mood, Reminder
+from report_snapshots import daily_series
+from read_models import column_rows
+
+
+def get_weight_data(user_id, days=30, end_date=None):
+    """Get weight data for the X days before ``end_date`` (default: today), inclusive"""
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days)
+
+    weights = db.session.query(Weight.date, Weight.weight).filter(
+        Weight.user_id == user_id,
+        Weight.date >= start_date,
+        Weight.date <= end_date
+    ).order_by(Weight.date).all()
+
+    dates = [entry.date.strftime('%Y-%m-%d') for entry in weights]
+    weight_values = [entry.weight for entry in weights]
+    return dates, weight_values
+
+
+@job_handler('report')
+def build_report_data(user_id, days=30, end_date=None):
+    """Everything the reports page shows for the ``days`` ending at ``end_date``"""
+    end_date = end_date or date.today()
+    start_date = end_date - timedelta(days=days - 1)
+
+    # Same window as the other series: days - 1 days back plus end_date itself
+    dates, weights = get_weight_data(user_id, days=days - 1, end_date=end_date)
+
+    # Closed weeks come from stored snapshots, only the current one is summed live
+    series = daily_series(user_id, start_date, end_date)
+    calories, water, burned = series['calories'], series['water'], series['burned']
+
+    daily_calories = []
+    daily_water = []
+    daily_exercise = []
+
+    for i in range(days):
+        day = start_date + timedelta(days=i)
+        label = {'date': day.strftime('%Y-%m-%d'), 'day': day.strftime('%a')}
+        daily_calories.append(dict(label, value=calories.get(day, 0)))
+        daily_water.append(dict(label, value=water.get(day, 0)))
+        daily_exercise.append(dict(label, value=burned.get(day, 0)))
+
+    user = db.session.get(User, user_id)
+    profile = UserProfile.query.filter_by(user_id=user_id).first()
+
+    user_data = {
+        'username': user.username,
+        'name': profile.name if profile else '',
+        'email': user.email,
+        'age': profile.age if profile else '',
+        'gender': profile.gender if profile else '',
+        'height': profile.height if profile else '',
+        'weight_goal': profile.weight_goal if profile else '',
+        'calorie_goal': profile.calorie_goal if profile else 2000,
+        'water_goal': profile.water_goal if profile else 2000,
+        'fitness_goal': profile.fitness_goal if profile else ''
+    }
+
+    return {
+        'user_data': user_data,
+        'dates': dates,
+        'weights': weights,
+        'daily_calories': daily_calories,
+        'daily_water': daily_water,
+        'daily_exercise': daily_exercise,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+
+
+EXPORT_LAYOUTS = ('records', 'columns')
+
+# Keys of each exported entry list, in order
+EXPORT_FIELDS = {
+    'diet': ('date', 'meal_type', 'food_name', 'calories', 'carbs', 'protein', 'fat'),
+    'weight': ('date', 'weight', 'notes'),
+    'water': ('date', 'amount'),
+    'exercise': ('date', 'activity', 'duration', 'calories_burned', 'notes'),
+    'mood': ('date', 'mood_level', 'mood_description', 'notes'),
+    'reminders': ('reminder_type', 'time', 'days', 'message', 'active'),
+}
+
+
+def to_columns(records, fields):
+    """[{k: v}, ...] -> {k: [v, ...]}, which does not repeat every key per entry.
+
+    Every field gets a list, also when there are no records.
+    """
+    columns = {field: [] for field in fields}
+    for record in records:
+        for field in fields:
+            columns[field].append(record[field])
+    return columns
+
+
+@job_handler('export')
+def build_export(user_id, layout='records'):
+    """All of a user's data as a JSON-serialisable dict.
+
+    With ``layout='columns'`` every entry list becomes a dict of value lists.
+    """
+    user_data = {
+        'profile': {},
+        'diet': [],
+        'weight': [],
+        'water': [],
+        'exercise': [],
+        'mood': [],
+        'reminders': []
+    }
+
+    # Get profile
+    profile = UserProfile.query.filter_by(user_id=user_id).first()
+    if profile:
+        user_data['profile'] = {
+            'name': profile.name,
+            'age': profile.age,
+            'gender': profile.gender,
+            'height': profile.height,
+            'weight_goal': profile.weight_goal,
+            'calorie_goal': profile.calorie_goal,
+            'water_goal': profile.water_goal,
+            'theme': profile.theme,
+            'fitness_goal': profile.fitness_goal
+        }
+
+    # Entries are read as plain column tuples; no ORM objects are built
+    for day, meal_type, food_name, calories, carbs, protein, fat in column_rows(
+            Diet, user_id, 'date', 'meal_type', 'food_name', 'calories', 'carbs', 'protein', 'fat'):
+        user_data['diet'].append({
+            'date': day.strftime('%Y-%m-%d'),
+            'meal_type': meal_type,
+            'food_name': food_name,
+            'calories': calories,
+            'carbs': carbs,
+            'protein': protein,
+            'fat': fat
+        })
+
+    for day, weight, notes in column_rows(Weight, user_id, 'date', 'weight', 'notes'):
+        user_data['weight'].append({
+            'date': day.strftime('%Y-%m-%d'),
+            'weight': weight,
+            'notes': notes
+        })
+
+    for day, amount in column_rows(Water, user_id, 'date', 'amount'):
+        user_data['water'].append({
+            'date': day.strftime('%Y-%m-%d'),
+            'amount': amount
+        })
+
+    for day, activity, duration, calories_burned, notes in column_rows(
+            Exercise, user_id, 'date', 'activity', 'duration', 'calories_burned', 'notes'):
+        user_data['exercise'].append({
+            'date': day.strftime('%Y-%m-%d'),
+            'activity': activity,
+            'duration': duration,
+            'calories_burned': calories_burned,
+            'notes': notes
+        })
+
+    for day, mood_level, mood_description, notes in column_rows(
+            Mood, user_id, 'date', 'mood_level', 'mood_description', 'notes'):
+        user_data['mood'].append({
+            'date': day.strftime('%Y-%m-%d'),
+            'mood_level': mood_level,
+            'mood_description': mood_description,
+            'notes': notes
+        })
+
+    for reminder_type, time, days, message, active in column_rows(
+            Reminder, user_id, 'reminder_type', 'time', 'days', 'message', 'active'):
+        user_data['reminders'].append({
+            'reminder_type': reminder_type,
+            'time': time.strftime('%H:%M'),
+            'days': days,
+            'message': message,
+            'active': active
+        })
+
+    if layout == 'columns':
+        for key, fields in EXPORT_FIELDS.items():
+            user_data[key] = to_columns(user_data[key], fields)
+    return user_data
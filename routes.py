@@ -4,19 +4,48 @@ import json
 import logging
 import os
 
-from flask import render_template, redirect, url_for, request, flash, jsonify, session, Response
+from flask import render_template, redirect, url_for, request, flash, jsonify, session, Response, send_file
 from flask_login import login_user, logout_user, current_user, login_required
 import os
 from requests_oauthlib import OAuth2Session
 from sqlalchemy import func, desc
-from werkzeug.security import generate_password_hash
-from openai import OpenAI
 
 from app import app, db
-from models import User, UserProfile, Diet, Weight, Water, Exercise, Mood, Reminder
+from models import User, UserProfile, Diet, Food, Weight, Water, Exercise, Mood, Reminder, TrackingCounters, Job
+from food_search import search_foods, get_recent_foods, forget_recent_foods
+from exercise_estimator import estimate_for_user
+from rate_limit import rate_limit
+from passwords import PasswordCheckBusy
+from tracking import ENTRY_MODELS, DATED_ENTRY_TYPES, bulk_delete_entries, upsert_daily_entries, notify_saved, notify_profile_updated
+from dashboard_data import load_dashboard_data
+from activity_feed import FEED_TYPES, get_feed_page
+from live_updates import init_live_updates, today_snapshot, event_stream
+from fragment_cache import init_fragment_cache
+from reminder_schedule import days_to_mask, reminders_by_next_occurrence, due_reminders
+from mood_insights import get_mood_insights, notable_insights
+from streaks import get_streaks, streak_achievement
+from tracking_counters import get_tracking_counts
+from reporting import EXPORT_LAYOUTS, get_weight_data, build_report_data, build_export
+from jobs import enqueue_job, job_status
+from report_snapshots import PERIOD_TYPES, period_start, get_period_summaries
+from cohort_analytics import METRICS as COHORT_METRICS, get_cohort_stats
+from read_models import diet_day, water_day, exercise_day, daily_sums
+from llm import chat_completion
+from profiling import list_profiles, profile_path, profiled_users, set_profiled_user
+from history_cache import METRICS as SERIES_METRICS, get_history, daily_average, trend_per_week, compact_series
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+init_live_updates(app)
+init_fragment_cache(app)
+
+def admin_required(f):
+    """Only let through signed-in users listed in ADMIN_EMAILS"""
+    @wraps(f)
+    @login_required
+    def decorated(*args, **kwargs):
+        if not current_user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated
 
 # Helper functions
 def get_total_calories_for_date(user_id, target_date):
@@ -40,26 +69,6 @@ def get_calories_burned_for_date(user_id, target_date):
         Exercise.date == target_date
     ).scalar() or 0
 
-def get_weight_data(user_id, days=30):
-    """Get weight data for the past X days"""
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days)
-    
-    weights = Weight.query.filter(
-        Weight.user_id == user_id,
-        Weight.date >= start_date,
-        Weight.date <= end_date
-    ).order_by(Weight.date).all()
-    
-    dates = []
-    weight_values = []
-    
-    for entry in weights:
-        dates.append(entry.date.strftime('%Y-%m-%d'))
-        weight_values.append(entry.weight)
-    
-    return dates, weight_values
-
 def get_today_stats(user_id):
     today = date.today()
     stats = {
@@ -87,6 +96,7 @@ def index():
     return render_template('login.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', methods=('POST',))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
@@ -97,7 +107,17 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except PasswordCheckBusy:
+            flash('We are seeing a lot of sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
+            # Persist a hash upgraded to the current cost parameters
+            if user in db.session.dirty:
+                db.session.commit()
+            
             login_user(user)
             
             # Set theme from user profile
@@ -152,6 +172,7 @@ def register():
         
         db.session.add(user)
         db.session.add(profile)
+        db.session.add(TrackingCounters(user=user))
         db.session.commit()
         
         # Set flag to show loading screen after first login
@@ -172,18 +193,8 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    today_stats = get_today_stats(current_user.id)
-    
-    # Get the most recent entries
-    recent_meals = Diet.query.filter_by(user_id=current_user.id).order_by(Diet.created_at.desc()).limit(5).all()
-    recent_exercises = Exercise.query.filter_by(user_id=current_user.id).order_by(Exercise.created_at.desc()).limit(5).all()
-    recent_moods = Mood.query.filter_by(user_id=current_user.id).order_by(Mood.created_at.desc()).limit(5).all()
-    
-    # Get latest weight
-    latest_weight = Weight.query.filter_by(user_id=current_user.id).order_by(Weight.date.desc()).first()
-    
-    # Get dates and weights for the chart
-    dates, weights = get_weight_data(current_user.id, days=30)
+    data = load_dashboard_data(current_user.id)
+    today_stats = data['today']
     
     # Format data for our updated dashboard
     stats = {
@@ -193,39 +204,12 @@ def dashboard():
         'water_percent': min(100, int(today_stats.get('water_intake', 0) / max(1, today_stats.get('water_goal', 2000)) * 100)),
         'exercise_calories': today_stats.get('calories_burned', 0),
         'exercise_percent': min(100, int(today_stats.get('calories_burned', 0) / 500 * 100)),  # Assuming 500 calories is a good daily goal
-        'current_weight': latest_weight.weight if latest_weight else 0,
+        'current_weight': data['latest_weight'] or 0,
         'weight_percent': 100  # Will calculate properly if we have a goal weight
     }
     
-    # Prepare updates list for the dashboard
-    updates = []
-    
-    # Add recent meals
-    for meal in recent_meals[:2]:
-        updates.append({
-            'icon': 'utensils',
-            'title': f"{meal.food_name} ({meal.calories} cal)",
-            'time': meal.created_at.strftime('%H:%M, %b %d'),
-            'color': 'rgba(255, 152, 0, 0.1)'
-        })
-    
-    # Add recent exercises
-    for exercise in recent_exercises[:2]:
-        updates.append({
-            'icon': 'running',
-            'title': f"{exercise.activity} ({exercise.duration} min)",
-            'time': exercise.created_at.strftime('%H:%M, %b %d'),
-            'color': 'rgba(76, 175, 80, 0.1)'
-        })
-    
-    # Add recent moods
-    for mood in recent_moods[:1]:
-        updates.append({
-            'icon': 'smile',
-            'title': f"Mood: {mood.mood_description or 'Level ' + str(mood.mood_level)}",
-            'time': mood.created_at.strftime('%H:%M, %b %d'),
-            'color': 'rgba(33, 150, 243, 0.1)'
-        })
+    # Recent meals, exercises and moods, newest first across all types
+    updates = data['updates']
     
     # Check if we need to show loading screen
     show_loading = False
@@ -240,8 +224,8 @@ def dashboard():
         'dashboard.html',
         stats=stats,
         updates=updates,
-        weight_dates=json.dumps(dates),
-        weight_values=json.dumps(weights),
+        weight_dates=json.dumps(data['weight_dates']),
+        weight_values=json.dumps(data['weight_values']),
         show_loading=show_loading
     )
 
@@ -269,6 +253,7 @@ def profile():
         # Update session theme
         session['theme'] = user_profile.theme
         
+        notify_profile_updated(user_profile)
         db.session.commit()
         flash('Profile updated successfully', 'success')
         return redirect(url_for('profile'))
@@ -285,6 +270,7 @@ def diet():
         carbs = request.form.get('carbs', type=float)
         protein = request.form.get('protein', type=float)
         fat = request.form.get('fat', type=float)
+        food_id = request.form.get('food_id', type=int)
         meal_date = request.form.get('date')
         
         try:
@@ -292,6 +278,16 @@ def diet():
         except:
             meal_date = date.today()
         
+        # Fill anything left blank from the picked catalog item
+        if food_id:
+            food = Food.query.get(food_id)
+            if food:
+                food_name = food_name or food.name
+                calories = calories if calories is not None else food.calories
+                carbs = carbs if carbs is not None else food.carbs
+                protein = protein if protein is not None else food.protein
+                fat = fat if fat is not None else food.fat
+        
         meal = Diet(
             user_id=current_user.id,
             date=meal_date,
@@ -304,7 +300,9 @@ def diet():
         )
         
         db.session.add(meal)
+        notify_saved('diet', meal)
         db.session.commit()
+        forget_recent_foods(current_user.id)
         flash('Meal added successfully', 'success')
         return redirect(url_for('diet'))
     
@@ -317,16 +315,12 @@ def diet():
     except:
         selected_date = today
     
-    meals = Diet.query.filter_by(
-        user_id=current_user.id,
-        date=selected_date
-    ).order_by(Diet.meal_type, Diet.created_at).all()
-    
-    # Calculate totals
-    total_calories = sum(meal.calories or 0 for meal in meals)
-    total_carbs = sum(meal.carbs or 0 for meal in meals)
-    total_protein = sum(meal.protein or 0 for meal in meals)
-    total_fat = sum(meal.fat or 0 for meal in meals)
+    # Meals and their totals in one query
+    meals, totals = diet_day(current_user.id, selected_date)
+    total_calories = totals['calories']
+    total_carbs = totals['carbs']
+    total_protein = totals['protein']
+    total_fat = totals['fat']
     
     # Get user's calorie goal
     profile = UserProfile.query.filter_by(user_id=current_user.id).first()
@@ -363,25 +357,14 @@ def weight():
         except:
             weight_date = date.today()
         
-        # Check if there's already a weight entry for this date
-        existing = Weight.query.filter_by(
-            user_id=current_user.id,
-            date=weight_date
-        ).first()
-        
-        if existing:
-            existing.weight = weight_val
-            existing.notes = notes
-            flash('Weight updated successfully', 'success')
-        else:
-            weight_entry = Weight(
-                user_id=current_user.id,
-                date=weight_date,
-                weight=weight_val,
-                notes=notes
-            )
-            db.session.add(weight_entry)
-            flash('Weight entry added successfully', 'success')
+        # One entry per date: insert it or update the existing one
+        [(weight_entry, created)] = upsert_daily_entries('weight', current_user.id, [{
+            'date': weight_date,
+            'weight': weight_val,
+            'notes': notes
+        }])
+        notify_saved('weight', weight_entry, created=created)
+        flash('Weight entry added successfully' if created else 'Weight updated successfully', 'success')
         
         db.session.commit()
         return redirect(url_for('weight'))
@@ -425,6 +408,7 @@ def water():
         )
         
         db.session.add(water_entry)
+        notify_saved('water', water_entry)
         db.session.commit()
         flash('Water intake added successfully', 'success')
         return redirect(url_for('water'))
@@ -438,13 +422,8 @@ def water():
     except:
         selected_date = today
     
-    water_entries = Water.query.filter_by(
-        user_id=current_user.id,
-        date=selected_date
-    ).order_by(Water.created_at).all()
-    
-    # Calculate total
-    total_water = sum(entry.amount for entry in water_entries)
+    water_entries, totals = water_day(current_user.id, selected_date)
+    total_water = totals['amount']
     
     # Get user's water goal
     profile = UserProfile.query.filter_by(user_id=current_user.id).first()
@@ -454,13 +433,11 @@ def water():
     end_date = date.today()
     start_date = end_date - timedelta(days=6)
     
+    sums = daily_sums(Water, current_user.id, start_date, end_date, 'amount')
     daily_water = []
     for i in range(7):
         day = start_date + timedelta(days=i)
-        amount = db.session.query(func.sum(Water.amount)).filter(
-            Water.user_id == current_user.id,
-            Water.date == day
-        ).scalar() or 0
+        amount, = sums.get(day, (0,))
         daily_water.append({
             'date': day.strftime('%Y-%m-%d'),
             'day': day.strftime('%a'),
@@ -492,6 +469,10 @@ def exercise():
         except:
             exercise_date = date.today()
         
+        # Estimate from MET x body weight when the user didn't enter calories
+        if calories_burned is None:
+            calories_burned = estimate_for_user(current_user.id, activity, duration, exercise_date)
+        
         exercise_entry = Exercise(
             user_id=current_user.id,
             date=exercise_date,
@@ -502,6 +483,7 @@ def exercise():
         )
         
         db.session.add(exercise_entry)
+        notify_saved('exercise', exercise_entry)
         db.session.commit()
         flash('Exercise added successfully', 'success')
         return redirect(url_for('exercise'))
@@ -515,30 +497,19 @@ def exercise():
     except:
         selected_date = today
     
-    exercise_entries = Exercise.query.filter_by(
-        user_id=current_user.id,
-        date=selected_date
-    ).order_by(Exercise.created_at).all()
-    
-    # Calculate totals
-    total_duration = sum(entry.duration for entry in exercise_entries)
-    total_calories_burned = sum(entry.calories_burned or 0 for entry in exercise_entries)
+    exercise_entries, totals = exercise_day(current_user.id, selected_date)
+    total_duration = totals['duration']
+    total_calories_burned = totals['calories_burned']
     
     # Get data for the last 7 days
     end_date = date.today()
     start_date = end_date - timedelta(days=6)
     
+    sums = daily_sums(Exercise, current_user.id, start_date, end_date, 'duration', 'calories_burned')
     daily_exercise = []
     for i in range(7):
         day = start_date + timedelta(days=i)
-        duration = db.session.query(func.sum(Exercise.duration)).filter(
-            Exercise.user_id == current_user.id,
-            Exercise.date == day
-        ).scalar() or 0
-        calories = db.session.query(func.sum(Exercise.calories_burned)).filter(
-            Exercise.user_id == current_user.id,
-            Exercise.date == day
-        ).scalar() or 0
+        duration, calories = sums.get(day, (0, 0))
         daily_exercise.append({
             'date': day.strftime('%Y-%m-%d'),
             'day': day.strftime('%a'),
@@ -570,27 +541,15 @@ def mood():
         except:
             mood_date = date.today()
         
-        # Check if there's already a mood entry for this date
-        existing = Mood.query.filter_by(
-            user_id=current_user.id,
-            date=mood_date
-        ).first()
-        
-        if existing:
-            existing.mood_level = mood_level
-            existing.mood_description = mood_description
-            existing.notes = notes
-            flash('Mood updated successfully', 'success')
-        else:
-            mood_entry = Mood(
-                user_id=current_user.id,
-                date=mood_date,
-                mood_level=mood_level,
-                mood_description=mood_description,
-                notes=notes
-            )
-            db.session.add(mood_entry)
-            flash('Mood entry added successfully', 'success')
+        # One entry per date: insert it or update the existing one
+        [(mood_entry, created)] = upsert_daily_entries('mood', current_user.id, [{
+            'date': mood_date,
+            'mood_level': mood_level,
+            'mood_description': mood_description,
+            'notes': notes
+        }])
+        notify_saved('mood', mood_entry, created=created)
+        flash('Mood entry added successfully' if created else 'Mood updated successfully', 'success')
         
         db.session.commit()
         return redirect(url_for('mood'))
@@ -637,89 +596,77 @@ def reminders():
             reminder_type=reminder_type,
             time=time_obj,
             days=days_str,
+            days_mask=days_to_mask(days),
             message=message,
             active=True
         )
         
         db.session.add(reminder)
+        notify_saved('reminder', reminder)
         db.session.commit()
         flash('Reminder added successfully', 'success')
         return redirect(url_for('reminders'))
     
-    # Get reminders
-    reminders = Reminder.query.filter_by(
-        user_id=current_user.id,
-        active=True
-    ).order_by(Reminder.time).all()
+    # Get reminders, the next one due first
+    reminders = reminders_by_next_occurrence(current_user.id)
     
     return render_template('reminders.html', reminders=reminders)
 
+@app.route('/api/insights/mood')
+@login_required
+def mood_insights_api():
+    """Correlation of mood with exercise, water and calorie habits"""
+    insights = get_mood_insights(current_user.id)
+    return jsonify({
+        'ready': bool(insights),
+        'features': insights,
+        'notable': notable_insights(insights)
+    })
+
+@app.route('/api/reminders/due')
+@login_required
+def due_reminders_api():
+    """Reminders of the current user due within the next ``window`` minutes"""
+    window = min(max(request.args.get('window', 15, type=int), 1), 24 * 60)
+    now = datetime.now()
+    
+    return jsonify({
+        'now': now.replace(second=0, microsecond=0).isoformat(),
+        'window': window,
+        'reminders': [
+            {
+                'id': reminder.id,
+                'type': reminder.reminder_type,
+                'message': reminder.message,
+                'time': reminder.time.strftime('%H:%M'),
+                'due_at': due_at.isoformat()
+            }
+            for reminder, due_at in due_reminders(now, window, user_id=current_user.id)
+        ]
+    })
+
 @app.route('/reports')
 @login_required
 def reports():
-    # Get date range
-    end_date = date.today()
-    start_date = end_date - timedelta(days=29)  # Last 30 days including today
-    
-    # Get weight data
-    dates, weights = get_weight_data(current_user.id, days=30)
-    
-    # Get daily calories and water intake
-    daily_calories = []
-    daily_water = []
-    daily_exercise = []
-    
-    for i in range(30):
-        day = start_date + timedelta(days=i)
-        
-        calories = get_total_calories_for_date(current_user.id, day)
-        water = get_water_for_date(current_user.id, day)
-        calories_burned = get_calories_burned_for_date(current_user.id, day)
-        
-        daily_calories.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'day': day.strftime('%a'),
-            'value': calories
-        })
-        
-        daily_water.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'day': day.strftime('%a'),
-            'value': water
-        })
-        
-        daily_exercise.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'day': day.strftime('%a'),
-            'value': calories_burned
-        })
+    # Last 30 days including today by default, up to a year
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
     
-    # Get user goals and profile
-    profile = UserProfile.query.filter_by(user_id=current_user.id).first()
+    if request.args.get('async'):
+        job = enqueue_job(current_user.id, 'report', days=days)
+        return jsonify({'job_id': job.id, 'status_url': url_for('job_status_api', job_id=job.id)}), 202
     
-    user_data = {
-        'username': current_user.username,
-        'name': profile.name if profile else '',
-        'email': current_user.email,
-        'age': profile.age if profile else '',
-        'gender': profile.gender if profile else '',
-        'height': profile.height if profile else '',
-        'weight_goal': profile.weight_goal if profile else '',
-        'calorie_goal': profile.calorie_goal if profile else 2000,
-        'water_goal': profile.water_goal if profile else 2000,
-        'fitness_goal': profile.fitness_goal if profile else ''
-    }
+    report = build_report_data(current_user.id, days=days)
     
     return render_template(
         'reports.html',
-        user_data=user_data,
-        dates=json.dumps(dates),
-        weights=json.dumps(weights),
-        daily_calories=daily_calories,
-        daily_water=daily_water,
-        daily_exercise=daily_exercise,
-        start_date=start_date,
-        end_date=end_date
+        user_data=report['user_data'],
+        dates=json.dumps(report['dates']),
+        weights=json.dumps(report['weights']),
+        daily_calories=report['daily_calories'],
+        daily_water=report['daily_water'],
+        daily_exercise=report['daily_exercise'],
+        start_date=report['start_date'],
+        end_date=report['end_date']
     )
 
 @app.route('/toggle_theme/<theme>')
@@ -740,6 +687,7 @@ def toggle_theme(theme):
 
 @app.route('/api/chat', methods=['POST'])
 @login_required
+@rate_limit('chat')
 def chat_api():
     """AI Chatbot API endpoint"""
     data = request.get_json()
@@ -768,9 +716,18 @@ def chat_api():
         'weight_goal': user_profile.weight_goal if user_profile else None,
         'today_calories': today_stats['calories_consumed'],
         'today_water': today_stats['water_intake'],
-        'today_calories_burned': today_stats['calories_burned']
+        'today_calories_burned': today_stats['calories_burned'],
+        'avg_calories_7d': daily_average(current_user.id, 'calories', 7),
+        'avg_water_7d': daily_average(current_user.id, 'water', 7),
+        'weight_trend': trend_per_week(current_user.id, 'weight', 30),
+        'mood_insights': notable_insights(get_mood_insights(current_user.id))
+            if app.config.get('CHAT_MOOD_INSIGHTS') else [],
+        'streaks': get_streaks(current_user.id)
     }
     
+    def rounded(value, unit):
+        return f"{value:.0f} {unit}" if value is not None else 'Not enough data'
+    
     # Construct system message with user context
     system_message = f"""
     You are a helpful fitness and wellness assistant for the WellnessXM365 app. 
@@ -788,6 +745,11 @@ def chat_api():
     - Today's calories consumed: {context['today_calories']} calories
     - Today's water intake: {context['today_water']} ml
     - Today's calories burned: {context['today_calories_burned']} calories
+    - Average daily calories (last 7 days): {rounded(context['avg_calories_7d'], 'calories')}
+    - Average daily water (last 7 days): {rounded(context['avg_water_7d'], 'ml')}
+    - Weight trend (last 30 days): {f"{context['weight_trend']:+.2f} kg per week" if context['weight_trend'] is not None else 'Not enough data'}
+    - Mood patterns: {'; '.join(context['mood_insights']) or 'None found yet'}
+    - Current streaks (consecutive days): water goal {context['streaks']['water']['current']}, within calorie goal {context['streaks']['calories']['current']}, exercise {context['streaks']['exercise']['current']}, mood logged {context['streaks']['mood']['current']}
     
     If asked about features of the app, you can mention:
     - Tracking diet and calories
@@ -803,11 +765,14 @@ def chat_api():
     track or add that data in the app.
     """
     
+    # End the read transaction so the database connection goes back to the
+    # pool while this request waits on the provider
+    db.session.commit()
+    
     try:
-        # Call OpenAI API with GPT-4o model
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            messages=[
+        # Ask the configured provider (OpenAI unless LLM_PROVIDER says otherwise)
+        assistant_reply = chat_completion(
+            [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": user_message}
             ],
@@ -815,16 +780,13 @@ def chat_api():
             temperature=0.7
         )
         
-        # Extract the assistant's reply
-        assistant_reply = response.choices[0].message.content
-        
         return jsonify({
             'response': assistant_reply,
             'reply': assistant_reply
         })
         
     except Exception as e:
-        logging.error(f"Error calling OpenAI API: {str(e)}")
+        logging.error(f"Error calling the chat provider: {str(e)}")
         return jsonify({
             'error': 'Something went wrong with the AI assistant. Please try again later.',
             'details': str(e)
@@ -840,123 +802,253 @@ def delete_entry():
         flash('Invalid request', 'danger')
         return redirect(request.referrer or url_for('dashboard'))
     
-    if entry_type == 'diet':
-        entry = Diet.query.get(entry_id)
-    elif entry_type == 'weight':
-        entry = Weight.query.get(entry_id)
-    elif entry_type == 'water':
-        entry = Water.query.get(entry_id)
-    elif entry_type == 'exercise':
-        entry = Exercise.query.get(entry_id)
-    elif entry_type == 'mood':
-        entry = Mood.query.get(entry_id)
-    elif entry_type == 'reminder':
-        entry = Reminder.query.get(entry_id)
-    else:
+    if entry_type not in ENTRY_MODELS:
         flash('Invalid entry type', 'danger')
         return redirect(request.referrer or url_for('dashboard'))
     
-    if not entry or entry.user_id != current_user.id:
+    # The user_id condition in the DELETE doubles as the ownership check
+    counts = bulk_delete_entries(current_user.id, {entry_type: [entry_id]})
+    if not counts.get(entry_type):
         flash('Entry not found or access denied', 'danger')
         return redirect(request.referrer or url_for('dashboard'))
     
-    db.session.delete(entry)
     db.session.commit()
     flash('Entry deleted successfully', 'success')
     return redirect(request.referrer or url_for('dashboard'))
 
-@app.route('/api/export_data')
+@app.route('/api/entries/bulk_delete', methods=['POST'])
 @login_required
-def export_data():
-    # Create a JSON object with all user data
-    user_data = {
-        'profile': {},
-        'diet': [],
-        'weight': [],
-        'water': [],
-        'exercise': [],
-        'mood': [],
-        'reminders': []
-    }
+def bulk_delete_api():
+    """Delete many entries at once, by ids per type or by date range.
+
+    Body: {"ids": {"diet": [1, 2], "water": [7]}}
+      or  {"types": ["diet", "water"], "start_date": "2025-01-01", "end_date": "2025-01-31"}
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    ids_by_type = data.get('ids')
+    
+    if ids_by_type:
+        if not isinstance(ids_by_type, dict) or any(t not in ENTRY_MODELS for t in ids_by_type):
+            return jsonify({'error': 'ids must map entry types to lists of ids'}), 400
+        # No coercion: a string would be read digit by digit, true or 1.9 as 1
+        if any(not isinstance(ids, list) or any(type(i) is not int for i in ids) for ids in ids_by_type.values()):
+            return jsonify({'error': 'ids must be lists of integers'}), 400
+        counts = bulk_delete_entries(current_user.id, ids_by_type)
+    else:
+        entry_types = data.get('types') or list(DATED_ENTRY_TYPES)
+        if not isinstance(entry_types, list) or any(t not in DATED_ENTRY_TYPES for t in entry_types):
+            return jsonify({'error': f"types must be among {', '.join(DATED_ENTRY_TYPES)}"}), 400
+        try:
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'start_date and end_date (YYYY-MM-DD) are required'}), 400
+        if start_date > end_date:
+            return jsonify({'error': 'start_date must not be after end_date'}), 400
+        counts = bulk_delete_entries(current_user.id, entry_types=entry_types,
+                                     start_date=start_date, end_date=end_date)
     
-    # Get profile
-    profile = UserProfile.query.filter_by(user_id=current_user.id).first()
-    if profile:
-        user_data['profile'] = {
-            'name': profile.name,
-            'age': profile.age,
-            'gender': profile.gender,
-            'height': profile.height,
-            'weight_goal': profile.weight_goal,
-            'calorie_goal': profile.calorie_goal,
-            'water_goal': profile.water_goal,
-            'theme': profile.theme,
-            'fitness_goal': profile.fitness_goal
-        }
+    db.session.commit()
+    return jsonify({'deleted': counts, 'total': sum(counts.values())})
+
+@app.route('/api/feed')
+@login_required
+def activity_feed_api():
+    """Paginated timeline of all tracking entries, newest first"""
+    limit = request.args.get('limit', 20, type=int)
+    before = request.args.get('before')
+    entry_types = [t for t in request.args.get('types', '').split(',') if t]
     
-    # Get diet entries
-    diet_entries = Diet.query.filter_by(user_id=current_user.id).all()
-    for entry in diet_entries:
-        user_data['diet'].append({
-            'date': entry.date.strftime('%Y-%m-%d'),
-            'meal_type': entry.meal_type,
-            'food_name': entry.food_name,
-            'calories': entry.calories,
-            'carbs': entry.carbs,
-            'protein': entry.protein,
-            'fat': entry.fat
-        })
+    if any(t not in FEED_TYPES for t in entry_types):
+        return jsonify({'error': f"types must be among {', '.join(FEED_TYPES)}"}), 400
     
-    # Get weight entries
-    weight_entries = Weight.query.filter_by(user_id=current_user.id).all()
-    for entry in weight_entries:
-        user_data['weight'].append({
-            'date': entry.date.strftime('%Y-%m-%d'),
-            'weight': entry.weight,
-            'notes': entry.notes
-        })
+    try:
+        events, next_cursor = get_feed_page(current_user.id, limit, before, entry_types)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    # Get water entries
-    water_entries = Water.query.filter_by(user_id=current_user.id).all()
-    for entry in water_entries:
-        user_data['water'].append({
-            'date': entry.date.strftime('%Y-%m-%d'),
-            'amount': entry.amount
-        })
+    return jsonify({
+        'events': [
+            {
+                'type': event.entry_type,
+                'id': event.entry_id,
+                'title': event.title,
+                'date': event.entry_date.strftime('%Y-%m-%d') if event.entry_date else None,
+                'time': event.occurred_at.isoformat()
+            }
+            for event in events
+        ],
+        'next': next_cursor
+    })
+
+@app.route('/api/reports/summary')
+@login_required
+def report_summary_api():
+    """Totals, averages, goal adherence and weight change per week or month"""
+    period = request.args.get('period', 'week')
+    count = min(max(request.args.get('count', 4, type=int), 1), 52)
     
-    # Get exercise entries
-    exercise_entries = Exercise.query.filter_by(user_id=current_user.id).all()
-    for entry in exercise_entries:
-        user_data['exercise'].append({
-            'date': entry.date.strftime('%Y-%m-%d'),
-            'activity': entry.activity,
-            'duration': entry.duration,
-            'calories_burned': entry.calories_burned,
-            'notes': entry.notes
-        })
+    if period not in PERIOD_TYPES:
+        return jsonify({'error': f"period must be one of {', '.join(PERIOD_TYPES)}"}), 400
     
-    # Get mood entries
-    mood_entries = Mood.query.filter_by(user_id=current_user.id).all()
-    for entry in mood_entries:
-        user_data['mood'].append({
-            'date': entry.date.strftime('%Y-%m-%d'),
-            'mood_level': entry.mood_level,
-            'mood_description': entry.mood_description,
-            'notes': entry.notes
-        })
+    end_date = date.today()
+    start_date = period_start(end_date, period)
+    for _ in range(count - 1):
+        start_date = period_start(start_date - timedelta(days=1), period)
     
-    # Get reminders
-    reminder_entries = Reminder.query.filter_by(user_id=current_user.id).all()
-    for entry in reminder_entries:
-        user_data['reminders'].append({
-            'reminder_type': entry.reminder_type,
-            'time': entry.time.strftime('%H:%M'),
-            'days': entry.days,
-            'message': entry.message,
-            'active': entry.active
-        })
+    summaries = get_period_summaries(current_user.id, period, start_date, end_date)
+    # Daily series are only needed for stitching the reports page
+    return jsonify({
+        'period': period,
+        'summaries': [
+            {key: value for key, value in summary.items() if key not in ('calories', 'water', 'burned')}
+            for summary in summaries
+        ]
+    })
+
+@app.route('/api/admin/cohorts')
+@admin_required
+def admin_cohorts_api():
+    """Precomputed cohort statistics; refreshed by `flask compute-cohorts`"""
+    metric = request.args.get('metric')
     
-    return jsonify(user_data)
+    if metric and metric not in COHORT_METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(COHORT_METRICS)}"}), 400
+    
+    return jsonify({'metrics': get_cohort_stats(metric)})
+
+@app.route('/api/admin/profiles')
+@admin_required
+def admin_profiles_api():
+    """Stored request profiles, newest first"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    return jsonify({
+        'enabled': app.config['PROFILING_ENABLED'],
+        'profiles': list_profiles(limit),
+        'profiled_users': sorted(profiled_users())
+    })
+
+@app.route('/api/admin/profiles/<name>')
+@admin_required
+def admin_profile_download(name):
+    """Collapsed stacks of one profile, for flamegraph.pl or speedscope"""
+    path = profile_path(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='text/plain', download_name=f'{name}.collapsed')
+
+@app.route('/api/admin/profiling/targets', methods=['POST'])
+@admin_required
+def admin_profiling_targets():
+    """Flag or unflag a user's requests for profiling"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    user_id = data.get('user_id')
+    if not isinstance(user_id, int) or not db.session.get(User, user_id):
+        return jsonify({'error': 'user_id must be an existing user id'}), 400
+    
+    return jsonify({'profiled_users': set_profiled_user(user_id, bool(data.get('enabled', True)))})
+
+@app.route('/api/export_data')
+@login_required
+def export_data():
+    # layout=columns returns each entry list as a dict of value lists
+    layout = request.args.get('layout', 'records')
+    if layout not in EXPORT_LAYOUTS:
+        return jsonify({'error': f"layout must be one of {', '.join(EXPORT_LAYOUTS)}"}), 400
+    
+    if request.args.get('async'):
+        job = enqueue_job(current_user.id, 'export', layout=layout)
+        return jsonify({'job_id': job.id, 'status_url': url_for('job_status_api', job_id=job.id)}), 202
+    
+    return jsonify(build_export(current_user.id, layout=layout))
+
+@app.route('/api/series')
+@login_required
+def series_api():
+    """Daily time series in compact form: a start date plus one value per day"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    metrics = [m for m in request.args.get('metrics', 'calories,water,burned').split(',') if m]
+    
+    if not metrics or any(m not in SERIES_METRICS for m in metrics):
+        return jsonify({'error': f"metrics must be among {', '.join(SERIES_METRICS)}"}), 400
+    
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    return jsonify({
+        'start': start_date.strftime('%Y-%m-%d'),
+        'days': days,
+        'series': {metric: compact_series(current_user.id, metric, start_date, end_date) for metric in metrics}
+    })
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def job_status_api(job_id):
+    """Poll the status of a background job"""
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = job_status(job)
+    if job.status == 'done':
+        status['result_url'] = url_for('job_result_api', job_id=job.id)
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result')
+@login_required
+def job_result_api(job_id):
+    """Download the JSON result of a finished job"""
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job or job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'error': 'Result not available'}), 404
+    
+    return send_file(job.result_path, mimetype='application/json',
+                     download_name=f'{job.kind}-{job.id}.json')
+
+@app.route('/api/foods/search')
+@login_required
+def food_search_api():
+    """Autocomplete for diet entry: the user's frequent foods first, then the catalog"""
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    if not query:
+        return jsonify({'results': []})
+    
+    return jsonify({'results': search_foods(current_user.id, query, limit)})
+
+@app.route('/api/foods/recent')
+@login_required
+def recent_foods_api():
+    """The user's most frequently logged foods with their latest nutrition values"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    foods = [
+        {k: v for k, v in food.items() if k != 'normalized'}
+        for food in get_recent_foods(current_user.id, limit)
+    ]
+    return jsonify({'results': foods})
+
+@app.route('/api/live')
+@login_required
+def live_updates_stream():
+    """Server-Sent Events stream of today's totals, pushed after every tracking write"""
+    if not app.config['LIVE_UPDATES_ENABLED']:
+        # 204 tells EventSource not to reconnect; clients keep polling instead
+        return Response(status=204)
+    
+    user_id = current_user.id
+    initial = today_snapshot(user_id)
+    # Give the DB connection back before the long-lived stream starts
+    db.session.close()
+    
+    return Response(
+        event_stream(user_id, initial),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # API endpoints for new features
 @app.route('/api/user-progress')
@@ -965,12 +1057,8 @@ def get_user_progress():
     """API endpoint for loading screen to get user's wellness journey progress"""
     profile = UserProfile.query.filter_by(user_id=current_user.id).first()
     
-    # Get counts of different tracking entries
-    diet_count = Diet.query.filter_by(user_id=current_user.id).count()
-    water_count = Water.query.filter_by(user_id=current_user.id).count()
-    weight_count = Weight.query.filter_by(user_id=current_user.id).count()
-    exercise_count = Exercise.query.filter_by(user_id=current_user.id).count()
-    mood_count = Mood.query.filter_by(user_id=current_user.id).count()
+    # Get counts of different tracking entries from the counters row
+    counts = get_tracking_counts(current_user.id)
     
     # Get the user's current stats for today
     today = date.today()
@@ -992,20 +1080,15 @@ def get_user_progress():
     
     return jsonify({
         'username': current_user.username,
-        'journey_stage': 'beginner' if sum([diet_count, water_count, weight_count, exercise_count, mood_count]) < 50 else 'intermediate',
+        'journey_stage': 'beginner' if sum(counts.values()) < 50 else 'intermediate',
         'stats': {
             'water_progress': water_progress,
             'calorie_progress': calorie_progress,
             'exercise_minutes': exercise_minutes,
             'current_mood': mood_description
         },
-        'tracking_counts': {
-            'diet': diet_count,
-            'water': water_count,
-            'weight': weight_count,
-            'exercise': exercise_count,
-            'mood': mood_count
-        }
+        'tracking_counts': counts,
+        'streaks': {metric: streak['current'] for metric, streak in get_streaks(current_user.id).items()}
     })
 
 @app.route('/api/progress-summary')
@@ -1034,14 +1117,14 @@ def get_progress_summary():
     mood_description = latest_mood.mood_description if latest_mood else "Unknown"
     
     # Get weight progress
-    weight_entries = Weight.query.filter_by(user_id=current_user.id).order_by(Weight.date).all()
-    weight_today = weight_entries[-1].weight if weight_entries else 0
+    weight_history = get_history(current_user.id, 'weight')
+    weight_today = weight_history.last()[1] if weight_history else 0
     weight_goal = profile.weight_goal if profile else 0
     
     # Calculate weight progress if goal exists
     weight_progress = 0
-    if weight_goal > 0 and weight_entries and len(weight_entries) > 1:
-        initial_weight = weight_entries[0].weight
+    if weight_goal and weight_goal > 0 and len(weight_history) > 1:
+        initial_weight = weight_history.first()[1]
         if initial_weight > weight_goal:  # Weight loss goal
             total_to_lose = initial_weight - weight_goal
             lost_so_far = initial_weight - weight_today
@@ -1076,7 +1159,9 @@ def manage_achievements():
             'new_achievement': None
         })
     
-    # For demo purposes, return sample achievements data
+    streaks = get_streaks(current_user.id)
+    
+    # Streak achievements come from the streak index; the rest are still sample data
     sample_achievements = [
         {
             'name': "First Step",
@@ -1090,16 +1175,13 @@ def manage_achievements():
             'name': "Hydration Hero",
             'description': "Reach your daily water goal for 7 consecutive days",
             'icon': "droplet",
-            'unlocked': True,
-            'date': "May 3, 2025",
-            'recent': True
+            **streak_achievement(streaks['water'], 7)
         },
         {
             'name': "Consistency Champion",
             'description': "Log your meals every day for 2 weeks",
             'icon': "calendar",
-            'unlocked': False,
-            'progress': 43
+            **streak_achievement(streaks['meals'], 14)
         },
         {
             'name': "Exercise Expert",
@@ -1119,8 +1201,7 @@ def manage_achievements():
             'name': "Mindfulness Master",
             'description': "Log your mood for 30 consecutive days",
             'icon': "smile",
-            'unlocked': False,
-            'progress': 10
+            **streak_achievement(streaks['mood'], 30)
         }
     ]
     
@@ -1163,11 +1244,14 @@ def get_tooltip_data(metric_id):
 # Google OAuth config
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
-GOOGLE_AUTHORIZE_URL = 'https://accounts.google.com/o/oauth2/v2/auth'
-GOOGLE_TOKEN_URL = 'https://oauth2.googleapis.com/token'
-GOOGLE_USERINFO_URL = 'https://www.googleapis.com/oauth2/v3/userinfo'
+GOOGLE_AUTHORIZE_URL = os.environ.get('GOOGLE_AUTHORIZE_URL', 'https://accounts.google.com/o/oauth2/v2/auth')
+GOOGLE_TOKEN_URL = os.environ.get('GOOGLE_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_USERINFO_URL = os.environ.get('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v3/userinfo')
+# Seconds to wait on each call to Google before giving up
+OAUTH_TIMEOUT = float(os.environ.get('OAUTH_TIMEOUT', 10))
 
 @app.route('/login/google')
+@rate_limit('oauth')
 def google_login():
     google = OAuth2Session(
         GOOGLE_CLIENT_ID,
@@ -1179,6 +1263,7 @@ def google_login():
     return redirect(authorization_url)
 
 @app.route('/login/google/callback')
+@rate_limit('oauth')
 def google_callback():
     google = OAuth2Session(
         GOOGLE_CLIENT_ID,
@@ -1190,10 +1275,11 @@ def google_callback():
         token = google.fetch_token(
             GOOGLE_TOKEN_URL,
             client_secret=GOOGLE_CLIENT_SECRET,
-            authorization_response=request.url
+            authorization_response=request.url,
+            timeout=OAUTH_TIMEOUT
         )
         
-        userinfo = google.get(GOOGLE_USERINFO_URL).json()
+        userinfo = google.get(GOOGLE_USERINFO_URL, timeout=OAUTH_TIMEOUT).json()
         email = userinfo.get('email')
         
         # Check if user exists
@@ -1202,7 +1288,7 @@ def google_callback():
             # Create new user
             username = email.split('@')[0]
             user = User(username=username, email=email)
-            user.set_password(os.urandom(24).hex())  # Random secure password
+            user.set_unusable_password()  # Google-only account, nothing to hash
             db.session.add(user)
             
             # Create user profile
@@ -1214,6 +1300,7 @@ def google_callback():
                 water_goal=2000
             )
             db.session.add(profile)
+            db.session.add(TrackingCounters(user=user))
             db.session.commit()
         
         login_user(user)
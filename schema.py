@@ -0,0 +1,121 @@
+"""Schema changes that db.create_all() does not make on existing tables.
+
+create_all() only creates missing tables, so indexes and nullable columns
+declared on tables that already exist are added by `flask migrate-schema`,
+run once per deploy before the workers start. On PostgreSQL indexes are
+built with CREATE INDEX CONCURRENTLY, which does not block writes.
+Workers refuse to start while any of these changes is pending, instead of
+serving without an index that enforces a constraint.
+"""
+import logging
+
+import click
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+
+
+class PendingSchemaChanges(RuntimeError):
+    pass
+
+
+def pending_schema_changes():
+    """[(table, 'index'|'column', name)] declared in the models but missing in the database"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            pending.append((table, 'table', table.name))
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        pending += [(table, 'column', column.name) for column in table.columns if column.name not in columns]
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        pending += [(table, 'index', index.name) for index in table.indexes if index.name not in indexes]
+    return pending
+
+
+def check_schema():
+    """Raise PendingSchemaChanges unless the database has every declared table, column and index"""
+    pending = pending_schema_changes()
+    if pending:
+        names = ', '.join(f'{kind} {table.name}.{name}' if kind != 'table' else f'table {name}'
+                          for table, kind, name in pending)
+        raise PendingSchemaChanges(f'Database schema is behind the models ({names}); run `flask migrate-schema`')
+
+
+def add_column(table, column):
+    preparer = db.engine.dialect.identifier_preparer
+    if_not_exists = 'IF NOT EXISTS ' if db.engine.dialect.name == 'postgresql' else ''
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {if_not_exists}'
+            f'{preparer.format_column(column)} {column.type.compile(db.engine.dialect)}'
+        ))
+
+
+def create_index(index):
+    """Build one index, without blocking writes on PostgreSQL.
+
+    A unique index over rows that are not unique yet raises IntegrityError;
+    on PostgreSQL the invalid index that leaves behind is dropped again.
+    """
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=db.engine.dialect))
+    concurrently = db.engine.dialect.name == 'postgresql' and not _is_partitioned(index.table.name)
+    if not concurrently:
+        with db.engine.begin() as conn:
+            conn.execute(text(ddl))
+        return
+    # CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        try:
+            conn.execute(text(ddl.replace(' INDEX IF NOT EXISTS ', ' INDEX CONCURRENTLY IF NOT EXISTS ', 1)))
+        except IntegrityError:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {db.engine.dialect.identifier_preparer.quote(index.name)}'))
+            raise
+
+
+def _is_partitioned(table_name):
+    # Partitioned tables do not support CREATE INDEX CONCURRENTLY
+    from archiving import is_partitioned
+    return is_partitioned(table_name)
+
+
+def migrate_schema():
+    """Add the missing nullable columns, then the missing indexes; returns what was applied"""
+    db.create_all()
+    applied = []
+    pending = pending_schema_changes()
+    for table, kind, name in pending:
+        if kind != 'column':
+            continue
+        column = table.c[name]
+        if not column.nullable:
+            raise click.ClickException(f'{table.name}.{name} is NOT NULL and cannot be added automatically')
+        add_column(table, column)
+        applied.append(f'column {table.name}.{name}')
+    for table, kind, name in pending:
+        if kind != 'index':
+            continue
+        index = next(index for index in table.indexes if index.name == name)
+        try:
+            create_index(index)
+        except IntegrityError:
+            raise click.ClickException(
+                f'Unique index {name} cannot be built over duplicate rows; run `flask dedupe-daily-entries` first'
+            )
+        logging.info(f'Created index {name}')
+        applied.append(f'index {table.name}.{name}')
+    return applied
+
+
+@app.cli.command('migrate-schema')
+def migrate_schema_command():
+    """Add indexes and nullable columns declared since the tables were created"""
+    applied = migrate_schema()
+    for change in applied:
+        click.echo(f'Added {change}')
+    if not applied:
+        click.echo('Schema is up to date.')
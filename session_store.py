@@ -0,0 +1,289 @@
+"""Server-side sessions: the cookie only carries a signed session id.
+
+The session id is replaced when a user logs in, so an id planted before
+login is useless afterwards. A stored session expires
+PERMANENT_SESSION_LIFETIME after it was last used: reads push the expiry
+out too, at most once per SESSION_REFRESH_INTERVAL seconds.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask import session as current_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+from itsdangerous import BadSignature, Signer
+
+from cache import LRUCache
+
+
+class MemorySessionBackend:
+    """Per-process LRU store, meant for tests and single-worker development"""
+
+    def __init__(self, maxsize=10000):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, sid):
+        """(data, expiry as a Unix time) or None"""
+        return self._cache.get(sid)
+
+    def set(self, sid, data, ttl):
+        self._cache.set(sid, (data, time.time() + ttl), ttl=ttl)
+
+    def touch(self, sid, ttl):
+        stored = self._cache.get(sid)
+        if stored is not None:
+            self.set(sid, stored[0], ttl)
+
+    def delete(self, sid):
+        self._cache.pop(sid)
+
+
+class SQLiteSessionBackend:
+    """Local SQLite file shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._connect().execute(
+            'SELECT data, expires FROM sessions WHERE sid = ? AND expires > ?', (sid, time.time())
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, sid, data, ttl):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+            (sid, data, time.time() + ttl)
+        )
+        # Sweep expired rows now and then instead of on every write
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute('DELETE FROM sessions WHERE expires <= ?', (time.time(),))
+
+    def touch(self, sid, ttl):
+        self._connect().execute('UPDATE sessions SET expires = ? WHERE sid = ?', (time.time() + ttl, sid))
+
+    def delete(self, sid):
+        self._connect().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+
+class RedisSessionBackend:
+    """Any server speaking the Redis protocol; requires the optional redis package"""
+
+    def __init__(self, url, prefix='session:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('SESSION_BACKEND=redis requires the redis package')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        data, ttl = self._client.pipeline().get(self.prefix + sid).ttl(self.prefix + sid).execute()
+        return (data, time.time() + ttl) if data is not None else None
+
+    def set(self, sid, data, ttl):
+        self._client.setex(self.prefix + sid, int(ttl), data)
+
+    def touch(self, sid, ttl):
+        self._client.expire(self.prefix + sid, int(ttl))
+
+    def delete(self, sid):
+        self._client.delete(self.prefix + sid)
+
+
+class ServerSideSession(SessionMixin):
+    """Session whose data is fetched from the backend on first access.
+
+    Requests that never touch the session (static files, most API calls
+    without a login check) don't pay for the lookup at all.
+    """
+
+    def __init__(self, sid, loader, new=False):
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self._loader = loader
+        self._data = {} if new else None
+        self.expires = None
+        self.replaced_sid = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            self._data, self.expires = self._loader(self.sid) or ({}, None)
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a fresh session id; the old record is deleted on save"""
+        self._load()
+        if not self.new:
+            self.replaced_sid = self.replaced_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def clear(self):
+        if self._load():
+            self._data.clear()
+            self.modified = True
+
+    def pop(self, key, *default):
+        data = self._load()
+        if key in data:
+            self.modified = True
+        return data.pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        data = self._load()
+        if key not in data:
+            data[key] = default
+            self.modified = True
+        return data[key]
+
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend, refresh_interval=3600):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session', key_derivation='hmac')
+
+    def _ttl(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                pass
+            else:
+                return ServerSideSession(sid, self._load)
+        return ServerSideSession(secrets.token_urlsafe(32), self._load, new=True)
+
+    def _load(self, sid):
+        stored = self.backend.get(sid)
+        if stored is None:
+            return None
+        data, expires = stored
+        try:
+            return self.serializer.loads(data), expires
+        except ValueError:
+            return None
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.replaced_sid:
+            self.backend.delete(session.replaced_sid)
+
+        # Nothing changed: no Set-Cookie header, and a backend write only to
+        # extend the expiry of a session in use
+        if not session.modified:
+            ttl = self._ttl(app)
+            if session.expires is not None and session.expires - time.time() < ttl - self.refresh_interval:
+                self.backend.touch(session.sid, ttl)
+            return
+
+        if not session.loaded or not session._data:
+            if not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        self.backend.set(session.sid, self.serializer.dumps(dict(session._data)), self._ttl(app))
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_session_store(app):
+    """Swap Flask's signed-cookie session for the configured server-side store.
+
+    SESSION_BACKEND is one of ``cookie`` (Flask's default, unchanged),
+    ``sqlite``, ``memory`` or ``redis``.
+    """
+    backend_name = app.config.get('SESSION_BACKEND', 'cookie')
+    if backend_name == 'cookie':
+        return
+    if backend_name == 'memory':
+        backend = MemorySessionBackend()
+    elif backend_name == 'sqlite':
+        path = app.config.get('SESSION_SQLITE_PATH') or os.path.join(app.instance_path, 'sessions.sqlite3')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        backend = SQLiteSessionBackend(path)
+    elif backend_name == 'redis':
+        backend = RedisSessionBackend(app.config['SESSION_REDIS_URL'])
+    else:
+        raise RuntimeError(f'Unknown SESSION_BACKEND {backend_name!r}')
+    app.session_interface = ServerSideSessionInterface(backend, app.config.get('SESSION_REFRESH_INTERVAL', 3600))
+    user_logged_in.connect(_regenerate_session_id, app)
+
+
+def _regenerate_session_id(sender, user, **kwargs):
+    # Against session fixation: an id known before login must not carry the login
+    if isinstance(current_session._get_current_object(), ServerSideSession):
+        current_session.regenerate()
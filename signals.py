@@ -0,0 +1,17 @@
+"""Signals sent when tracking entries change.
+
+They are sent before the request commits, so receivers that keep derived
+data (counters, caches, streaks) can write in the same transaction.
+"""
+from blinker import Namespace
+
+_signals = Namespace()
+
+# sender=app, user_id, entry_type, entries (model instances), dates, created (False for in-place updates)
+entries_saved = _signals.signal('entries-saved')
+
+# sender=app, user_id, entry_type, ids, dates (set of affected dates, empty for reminders)
+entries_deleted = _signals.signal('entries-deleted')
+
+# sender=app, user_id, profile
+profile_updated = _signals.signal('profile-updated')
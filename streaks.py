@@ -0,0 +1,174 @@
+"""Goal-adherence streaks kept up to date at write time.
+
+For each (user, metric) a GoalStreak row holds the run of consecutive
+qualifying days ending at the latest qualifying date, plus the longest run
+so far, so "current streak" is a primary-key lookup. Logging on the day
+after the run extends it and logging past it starts a new one without
+looking at history. Changes that can break a run or join two runs
+(backdated entries, edits, deletes inside a run, goal changes) rebuild the
+metric in one ordered pass over its daily totals.
+"""
+from datetime import date, timedelta
+
+import click
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import Diet, Water, Exercise, Mood, UserProfile, GoalStreak
+from read_models import daily_sums
+from signals import entries_saved, entries_deleted, profile_updated
+
+# metric -> (model, column summed per day, whether a day's total qualifies given the goals)
+STREAK_METRICS = {
+    'water': (Water, 'amount', lambda total, goals: total >= goals['water_goal']),
+    'calories': (Diet, 'calories', lambda total, goals: 0 < total <= goals['calorie_goal']),
+    'meals': (Diet, 'calories', lambda total, goals: True),
+    'exercise': (Exercise, 'duration', lambda total, goals: total > 0),
+    'mood': (Mood, 'mood_level', lambda total, goals: True),
+}
+GOAL_METRICS = ('water', 'calories')
+METRICS_BY_ENTRY_TYPE = {}
+for _metric, (_model, _, _) in STREAK_METRICS.items():
+    METRICS_BY_ENTRY_TYPE.setdefault(_model.__tablename__, []).append(_metric)
+
+
+def _goals(user_id):
+    row = db.session.execute(
+        select(UserProfile.calorie_goal, UserProfile.water_goal).where(UserProfile.user_id == user_id)
+    ).first()
+    return {
+        'calorie_goal': (row.calorie_goal if row else None) or 2000,
+        'water_goal': (row.water_goal if row else None) or 2000,
+    }
+
+
+def _qualifying_days(user_id, metric, start_date, end_date, goals):
+    model, column, qualifies = STREAK_METRICS[metric]
+    totals = daily_sums(model, user_id, start_date, end_date, column)
+    return sorted(day for day, (total,) in totals.items() if qualifies(total, goals))
+
+
+def rebuild_streak(streak, goals):
+    """Recompute a streak row from the full history in one ordered pass"""
+    streak.current, streak.current_start, streak.last_date = 0, None, None
+    streak.longest, streak.longest_end = 0, None
+    for day in _qualifying_days(streak.user_id, streak.metric, date.min, date.max, goals):
+        if streak.last_date is not None and day == streak.last_date + timedelta(days=1):
+            streak.current += 1
+        else:
+            streak.current, streak.current_start = 1, day
+        streak.last_date = day
+        if streak.current > streak.longest:
+            streak.longest, streak.longest_end = streak.current, day
+    return streak
+
+
+def update_streak(streak, days, goals):
+    """Fold changed ``days`` into the streak, rebuilding when the change reaches into history"""
+    for day in sorted(days):
+        qualifies = bool(_qualifying_days(streak.user_id, streak.metric, day, day, goals))
+        if streak.last_date is not None and day <= streak.last_date:
+            if qualifies and day >= streak.current_start:
+                continue
+            rebuild_streak(streak, goals)
+            return
+        if not qualifies:
+            continue
+        if streak.last_date is not None and day == streak.last_date + timedelta(days=1):
+            streak.current += 1
+        else:
+            streak.current, streak.current_start = 1, day
+        streak.last_date = day
+        if streak.current > streak.longest:
+            streak.longest, streak.longest_end = streak.current, day
+
+
+def _stored_streaks(user_id, metrics):
+    return db.session.execute(
+        select(GoalStreak).where(GoalStreak.user_id == user_id, GoalStreak.metric.in_(metrics))
+        .with_for_update()
+    ).scalars().all()
+
+
+@entries_saved.connect
+@entries_deleted.connect
+def _on_entries_changed(sender, user_id, entry_type, dates=(), **kwargs):
+    metrics = METRICS_BY_ENTRY_TYPE.get(entry_type)
+    if not metrics or not dates:
+        return
+    # No rows yet means streaks were never built; the first read builds them
+    streaks = _stored_streaks(user_id, metrics)
+    if streaks:
+        goals = _goals(user_id)
+        for streak in streaks:
+            update_streak(streak, dates, goals)
+
+
+@profile_updated.connect
+def _on_profile_updated(sender, user_id, **kwargs):
+    streaks = _stored_streaks(user_id, GOAL_METRICS)
+    if streaks:
+        goals = _goals(user_id)
+        for streak in streaks:
+            rebuild_streak(streak, goals)
+
+
+def current_length(streak, today=None):
+    """The streak as the user sees it: still running if the last qualifying day was today or yesterday"""
+    today = today or date.today()
+    if streak.last_date is None or streak.last_date < today - timedelta(days=1):
+        return 0
+    return streak.current
+
+
+def get_streaks(user_id, today=None):
+    """{metric: {current, longest, last_date, longest_end}}, building missing rows first"""
+    streaks = {streak.metric: streak for streak in db.session.execute(
+        select(GoalStreak).where(GoalStreak.user_id == user_id)
+    ).scalars()}
+    missing = [metric for metric in STREAK_METRICS if metric not in streaks]
+    if missing:
+        goals = _goals(user_id)
+        built = [rebuild_streak(GoalStreak(user_id=user_id, metric=metric), goals) for metric in missing]
+        # Added only once built, so no autoflush inserts them outside the try
+        db.session.add_all(built)
+        streaks.update((streak.metric, streak) for streak in built)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request built them first
+            db.session.rollback()
+            return get_streaks(user_id, today)
+    return {
+        metric: {
+            'current': current_length(streak, today),
+            'longest': streak.longest,
+            'last_date': streak.last_date,
+            'longest_end': streak.longest_end,
+        }
+        for metric, streak in streaks.items()
+    }
+
+
+def streak_achievement(streak, target_days, today=None):
+    """Unlock state of a "<target_days> days in a row" achievement from a get_streaks() entry"""
+    today = today or date.today()
+    if streak['longest'] >= target_days:
+        # The day the longest run reached the target
+        reached = streak['longest_end'] - timedelta(days=streak['longest'] - target_days)
+        return {'unlocked': True, 'date': f'{reached:%B} {reached.day}, {reached.year}', 'recent': today - reached <= timedelta(days=7)}
+    return {'unlocked': False, 'progress': int(streak['current'] * 100 / target_days)}
+
+
+@app.cli.command('rebuild-streaks')
+@click.option('--user-id', type=int, default=None, help='Only this user (default: everyone with streaks).')
+def rebuild_streaks_command(user_id):
+    """Recompute goal-adherence streaks from the entry history"""
+    user_ids = [user_id] if user_id else db.session.execute(
+        select(GoalStreak.user_id).distinct()
+    ).scalars().all()
+    for uid in user_ids:
+        db.session.execute(delete(GoalStreak).where(GoalStreak.user_id == uid))
+        get_streaks(uid)
+    click.echo(f'Rebuilt streaks for {len(user_ids)} users.')
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# app.py reads its configuration at import time
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/test.sqlite3')
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('RATELIMIT_ENABLED', '0')
+os.environ.setdefault('JOB_RESULTS_DIR', tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402,F401  registers the routes and signal receivers
+from app import app as flask_app, db  # noqa: E402
+from models import User, UserProfile  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    name = f'user-{uuid.uuid4().hex[:8]}'
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.add(UserProfile(user=user, calorie_goal=2000, water_goal=2000))
+    db.session.commit()
+    return user
@@ -0,0 +1,36 @@
+import gzip
+import json
+
+from flask import send_file
+
+from app import app
+from compression import _compress_response
+
+
+def _download(tmp_path, headers):
+    path = tmp_path / 'result.json'
+    path.write_text(json.dumps({'rows': [{'calories': n} for n in range(200)]}))
+    with app.test_request_context('/api/jobs/1/result', headers=headers):
+        response = send_file(path, mimetype='application/json', conditional=True)
+        response = _compress_response(response)
+        response.direct_passthrough = False
+        return response, response.get_data(), path.read_bytes()
+
+
+def test_compressed_file_download_drops_byte_ranges(tmp_path):
+    response, body, original = _download(tmp_path, {'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == original
+    assert 'Accept-Ranges' not in response.headers
+    etag, weak = response.get_etag()
+    assert weak and etag.endswith('-gzip')
+
+
+def test_range_requests_get_the_identity_bytes(tmp_path):
+    response, body, original = _download(tmp_path, {'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9'})
+
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert body == original[:10]
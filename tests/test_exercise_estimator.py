@@ -0,0 +1,39 @@
+from datetime import date
+
+from app import db
+from data_version import get_data_version
+from exercise_estimator import backfill_exercise_calories, estimate_for_user
+from models import Exercise, ReportSnapshot, Weight
+from report_snapshots import get_period_summaries
+
+
+def test_backfill_uses_the_weight_as_of_the_exercise_date(user):
+    db.session.add_all([
+        Weight(user_id=user.id, date=date(2025, 1, 1), weight=100.0),
+        Weight(user_id=user.id, date=date(2025, 6, 1), weight=60.0),
+    ])
+    early = Exercise(user_id=user.id, date=date(2025, 3, 1), activity='running', duration=60)
+    before_any = Exercise(user_id=user.id, date=date(2024, 12, 1), activity='running', duration=60)
+    db.session.add_all([early, before_any])
+    db.session.commit()
+
+    backfill_exercise_calories()
+
+    for exercise in (early, before_any):
+        db.session.refresh(exercise)
+        assert exercise.calories_burned == estimate_for_user(user.id, 'running', 60, exercise.date)
+    assert early.calories_burned == 980
+
+
+def test_backfill_drops_derived_data(user):
+    day = date(2025, 3, 3)
+    db.session.add(Exercise(user_id=user.id, date=day, activity='yoga', duration=60))
+    db.session.commit()
+    get_period_summaries(user.id, 'week', day, day, store=True)
+    version = get_data_version(user.id)
+
+    backfill_exercise_calories()
+
+    assert get_data_version(user.id) > version
+    assert ReportSnapshot.query.filter_by(user_id=user.id).count() == 0
+    assert get_period_summaries(user.id, 'week', day, day)[0]['totals']['burned'] == 175
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from app import db
+from food_search import forget_recent_foods, search_foods, seed_food_catalog
+from models import Diet
+
+
+@pytest.fixture(autouse=True)
+def catalog(app):
+    seed_food_catalog()
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_search_never_returns_more_than_the_limit(user, limit):
+    db.session.add_all([
+        Diet(user_id=user.id, date=date(2025, 1, 1), meal_type='lunch', food_name=name, calories=100)
+        for name in ('Apple pie', 'Apple crumble', 'Apple juice')
+    ])
+    db.session.commit()
+    forget_recent_foods(user.id)
+
+    results = search_foods(user.id, 'apple', limit)
+
+    assert len(results) == limit
+    assert results[0]['name'] in ('Apple pie', 'Apple crumble', 'Apple juice')
+    assert any(result.get('source') == 'catalog' for result in results) == (limit > 1)
+
+
+def test_search_without_own_foods_uses_the_catalog(user):
+    results = search_foods(user.id, 'apple', 1)
+
+    assert [result['source'] for result in results] == ['catalog']
@@ -0,0 +1,24 @@
+import threading
+
+from live_updates import Broker, SQLiteBackend
+
+
+def _pollers():
+    return [thread for thread in threading.enumerate() if thread.name == 'live-updates-poller']
+
+
+def test_sqlite_poller_starts_with_the_first_subscription(tmp_path):
+    path = str(tmp_path / 'live.sqlite3')
+    broker = Broker()
+    before = len(_pollers())
+    backend = SQLiteBackend(broker, path, poll_interval=0.01)
+    assert len(_pollers()) == before
+
+    backend.ensure_polling()
+    backend.ensure_polling()
+    assert len(_pollers()) == before + 1
+
+    q = broker.subscribe(7)
+    # Another worker on the same host publishes
+    SQLiteBackend(Broker(), path).publish(7, {'water': 250})
+    assert q.get(timeout=2) == {'water': 250}
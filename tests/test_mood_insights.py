@@ -0,0 +1,58 @@
+import threading
+from datetime import date, timedelta
+
+from app import app, db
+from jobs import run_job
+from models import Job, Mood, MoodStat, Water
+from mood_insights import get_mood_insights, rebuild_mood_stats
+from tracking import notify_saved
+
+
+def _log_water(user_id, day):
+    with app.app_context():
+        water = Water(user_id=user_id, date=day, amount=250)
+        db.session.add(water)
+        notify_saved('water', water)
+        db.session.commit()
+        db.session.remove()
+
+
+def _build_stats(user_id):
+    assert get_mood_insights(user_id) == {}
+    job = Job.query.filter_by(user_id=user_id, kind='mood-stats').one()
+    run_job(job.id)
+    db.session.expire_all()
+    assert job.status == 'done'
+
+
+def test_first_read_queues_the_build_once(user):
+    assert get_mood_insights(user.id) == {}
+    assert get_mood_insights(user.id) == {}
+    job = Job.query.filter_by(user_id=user.id, kind='mood-stats').one()
+    assert MoodStat.query.filter_by(user_id=user.id).count() == 0
+
+    run_job(job.id)
+    db.session.expire_all()
+
+    assert get_mood_insights(user.id)['exercise_minutes']['observations'] == 0
+
+
+def test_concurrent_writes_are_each_counted_once(user):
+    user_id = user.id
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(5)]
+    db.session.add_all(Mood(user_id=user_id, date=day, mood_level=1 + i) for i, day in enumerate(days))
+    db.session.commit()
+    _build_stats(user_id)
+
+    writers = [threading.Thread(target=_log_water, args=(user_id, days[i % 5])) for i in range(20)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    db.session.expire_all()
+    incremental = get_mood_insights(user_id)
+    rebuild_mood_stats(user_id)
+    db.session.commit()
+
+    assert incremental['water_adherence']['observations'] == 5
+    assert incremental == get_mood_insights(user_id)
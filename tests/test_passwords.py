@@ -0,0 +1,27 @@
+import pytest
+
+from passwords import PasswordCheckBusy, hash_password, verify_password
+
+
+def test_verify_password(app):
+    stored = hash_password('correct horse')
+
+    assert verify_password(stored, 'correct horse')
+    assert not verify_password(stored, 'battery staple')
+
+
+def test_verify_password_gives_up_when_every_slot_is_busy(app, monkeypatch):
+    stored = hash_password('correct horse')
+    slots = app.extensions['password_hash_slots']
+    monkeypatch.setitem(app.config, 'PASSWORD_VERIFY_TIMEOUT', 0.05)
+    taken = 0
+    while slots.acquire(blocking=False):
+        taken += 1
+    try:
+        with pytest.raises(PasswordCheckBusy):
+            verify_password(stored, 'correct horse')
+    finally:
+        for _ in range(taken):
+            slots.release()
+
+    assert verify_password(stored, 'correct horse')
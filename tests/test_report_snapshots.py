@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+from app import db
+from jobs import run_job
+from models import Job, ReportSnapshot, Water
+from report_snapshots import get_period_summaries, invalidate_snapshots, period_start
+
+
+def _snapshot_count(user_id, period_type):
+    return ReportSnapshot.query.filter_by(user_id=user_id, period_type=period_type).count()
+
+
+def _backdate_water(user_id, day, amount, today):
+    db.session.add(Water(user_id=user_id, date=day, amount=amount))
+    invalidate_snapshots(user_id, [day], today=today)
+    db.session.commit()
+
+
+def test_backdating_into_a_closed_week_of_the_open_month(user):
+    today = date(2026, 10, 19)  # Monday; October is still open
+    week = (date(2026, 10, 12), date(2026, 10, 18))
+    assert get_period_summaries(user.id, 'week', *week, today=today, store=True)[0]['totals']['water'] == 0
+    assert _snapshot_count(user.id, 'week') == 1
+
+    _backdate_water(user.id, date(2026, 10, 18), 1234, today)
+
+    assert _snapshot_count(user.id, 'week') == 0
+    assert get_period_summaries(user.id, 'week', *week, today=today)[0]['totals']['water'] == 1234
+
+
+def test_backdating_into_a_closed_month_of_the_open_week(user):
+    today = date(2026, 10, 1)  # Thursday; the week from Monday 28 September is still open
+    september = (date(2026, 9, 1), date(2026, 9, 30))
+    get_period_summaries(user.id, 'month', *september, today=today, store=True)
+    assert _snapshot_count(user.id, 'month') == 1
+
+    _backdate_water(user.id, date(2026, 9, 29), 500, today)
+
+    assert _snapshot_count(user.id, 'month') == 0
+    assert get_period_summaries(user.id, 'month', *september, today=today)[0]['totals']['water'] == 500
+
+
+def test_entries_in_open_periods_keep_snapshots(user):
+    today = date(2026, 10, 19)
+    get_period_summaries(user.id, 'week', today - timedelta(days=7), today - timedelta(days=1), today=today, store=True)
+
+    _backdate_water(user.id, today, 250, today)
+
+    assert _snapshot_count(user.id, 'week') == 1
+
+
+def test_reads_queue_missing_snapshots_instead_of_storing_them(user):
+    last_week = period_start(date.today(), 'week') - timedelta(days=7)
+    db.session.add(Water(user_id=user.id, date=last_week, amount=750))
+    db.session.commit()
+
+    for _ in range(2):
+        assert get_period_summaries(user.id, 'week', last_week, date.today())[0]['totals']['water'] == 750
+    assert _snapshot_count(user.id, 'week') == 0
+    job = Job.query.filter_by(user_id=user.id, kind='report-snapshots').one()
+
+    run_job(job.id)
+
+    assert _snapshot_count(user.id, 'week') == 1
+    assert get_period_summaries(user.id, 'week', last_week, date.today())[0]['totals']['water'] == 750
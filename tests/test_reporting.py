@@ -0,0 +1,42 @@
+from datetime import date
+
+from app import db
+from models import Weight
+from reporting import EXPORT_FIELDS, build_export, build_report_data
+
+
+def test_report_weights_cover_the_requested_window(user):
+    end_date = date(2025, 3, 31)
+    db.session.add_all([
+        Weight(user_id=user.id, date=date(2025, 3, 1), weight=80.0),
+        Weight(user_id=user.id, date=date(2025, 3, 2), weight=79.5),
+        Weight(user_id=user.id, date=date(2025, 3, 31), weight=78.0),
+        Weight(user_id=user.id, date=date(2025, 4, 1), weight=77.5),
+    ])
+    db.session.commit()
+
+    report = build_report_data(user.id, days=30, end_date=end_date)
+
+    assert report['start_date'] == date(2025, 3, 2)
+    assert report['dates'] == ['2025-03-02', '2025-03-31']
+    assert report['weights'] == [79.5, 78.0]
+
+
+def test_columns_export_has_every_column_without_entries(user):
+    export = build_export(user.id, layout='columns')
+
+    for key, fields in EXPORT_FIELDS.items():
+        assert export[key] == {field: [] for field in fields}
+
+
+def test_columns_export_matches_records(user):
+    db.session.add(Weight(user_id=user.id, date=date(2025, 3, 1), weight=80.0, notes='morning'))
+    db.session.commit()
+
+    records = build_export(user.id)
+    columns = build_export(user.id, layout='columns')
+
+    assert records['weight'] == [{'date': '2025-03-01', 'weight': 80.0, 'notes': 'morning'}]
+    assert columns['weight'] == {'date': ['2025-03-01'], 'weight': [80.0], 'notes': ['morning']}
+    for key, fields in EXPORT_FIELDS.items():
+        assert all(tuple(record) == fields for record in records[key])
@@ -0,0 +1,66 @@
+import pytest
+
+from app import db
+from models import Water
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post('/login', data={'username': user.username, 'password': 'password'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2], 'ids', 7, {'types': 'diet'}, {'types': 3},
+    {'ids': {'diet': '12'}}, {'ids': {'diet': [True]}}, {'ids': {'diet': [1.9]}},
+    {'ids': {'diet': ['1']}}, {'ids': {'diet': 1}}, {'ids': {'diet': {'1': 2}}}, {'ids': {'food': [1]}},
+])
+def test_bulk_delete_rejects_malformed_bodies(client, body):
+    response = client.post('/api/entries/bulk_delete', json=body)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.fixture
+def profiling(app, tmp_path):
+    from profiling import _abandon_profiling, _finish_profiling, _start_profiling
+    app.config.update(PROFILING_ENABLED=True, PROFILING_TOKEN='s3cret', PROFILING_DIR=str(tmp_path))
+    # init_profiling registers nothing while disabled, which it was at import
+    app.before_request_funcs.setdefault(None, []).append(_start_profiling)
+    app.after_request_funcs.setdefault(None, []).append(_finish_profiling)
+    app.teardown_request_funcs.setdefault(None, []).append(_abandon_profiling)
+    yield
+    app.before_request_funcs[None].remove(_start_profiling)
+    app.after_request_funcs[None].remove(_finish_profiling)
+    app.teardown_request_funcs[None].remove(_abandon_profiling)
+    app.config.update(PROFILING_ENABLED=False, PROFILING_TOKEN=None, PROFILING_DIR=None)
+
+
+@pytest.mark.parametrize('token, profiled', [('s3cret', True), ('wrong', False), ('sécret', False)])
+def test_profiling_token(app, profiling, token, profiled):
+    response = app.test_client().get('/no-such-page', headers={'X-Profile': 'sample', 'X-Profile-Token': token})
+
+    assert ('X-Profile-Id' in response.headers) == profiled
+
+
+@pytest.mark.parametrize('body', [[1], 'user', 3])
+def test_profiling_targets_rejects_malformed_bodies(app, client, user, monkeypatch, body):
+    monkeypatch.setitem(app.config, 'ADMIN_EMAILS', {user.email})
+
+    response = client.post('/api/admin/profiling/targets', json=body)
+
+    assert response.status_code == 400
+
+
+def test_bulk_delete_by_ids(client, user):
+    entries = [Water(user_id=user.id, amount=250) for _ in range(3)]
+    db.session.add_all(entries)
+    db.session.commit()
+
+    response = client.post('/api/entries/bulk_delete', json={'ids': {'water': [entries[0].id, entries[1].id]}})
+
+    assert response.get_json() == {'deleted': {'water': 2}, 'total': 2}
+    assert Water.query.filter_by(user_id=user.id).count() == 1
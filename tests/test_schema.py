@@ -0,0 +1,42 @@
+from datetime import date
+
+import click
+import pytest
+from sqlalchemy import text
+
+from app import db
+from models import Mood
+from schema import PendingSchemaChanges, check_schema, migrate_schema
+from tracking import dedupe_daily_entries
+
+
+def _execute(statement):
+    with db.engine.begin() as conn:
+        conn.execute(text(statement))
+
+
+def test_migrate_adds_missing_indexes_and_columns(app):
+    check_schema()
+    _execute('DROP INDEX ix_job_expires')
+    _execute('ALTER TABLE job DROP COLUMN attempts')
+
+    with pytest.raises(PendingSchemaChanges, match='ix_job_expires'):
+        check_schema()
+    assert set(migrate_schema()) == {'index job.ix_job_expires', 'column job.attempts'}
+    check_schema()
+
+
+def test_migrate_refuses_a_unique_index_over_duplicates(user):
+    _execute('DROP INDEX uq_mood_user_date')
+    day = date(2025, 5, 5)
+    db.session.add_all([Mood(user_id=user.id, date=day, mood_level=level) for level in (2, 4)])
+    db.session.commit()
+
+    with pytest.raises(click.ClickException, match='dedupe-daily-entries'):
+        migrate_schema()
+    with pytest.raises(PendingSchemaChanges):
+        check_schema()
+
+    assert dedupe_daily_entries()['mood'] == 1
+    check_schema()
+    assert [mood.mood_level for mood in Mood.query.filter_by(user_id=user.id)] == [2]
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from session_store import MemorySessionBackend, ServerSideSessionInterface, init_session_store
+
+SESSION_COOKIE = 'session'
+
+
+@pytest.fixture
+def backend(app):
+    previous = app.session_interface
+    app.config['SESSION_BACKEND'] = 'memory'
+    init_session_store(app)
+    yield app.session_interface.backend
+    app.session_interface = previous
+    app.config['SESSION_BACKEND'] = 'cookie'
+
+
+def _sid(client, app):
+    cookie = client.get_cookie(SESSION_COOKIE)
+    return app.session_interface._signer(app).unsign(cookie.value).decode()
+
+
+def test_login_replaces_the_session_id(app, backend, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['theme'] = 'blue'
+    planted = _sid(client, app)
+
+    response = client.post('/login', data={'username': user.username, 'password': 'password'})
+
+    assert response.status_code == 302
+    sid = _sid(client, app)
+    assert sid != planted
+    assert backend.get(planted) is None
+    assert backend.get(sid) is not None
+
+
+def test_reads_extend_the_expiry(app):
+    backend = MemorySessionBackend()
+    interface = ServerSideSessionInterface(backend, refresh_interval=60)
+    ttl = interface._ttl(app)
+    backend.set('sid', interface.serializer.dumps({'_user_id': '1'}), ttl - 120)
+    session = interface.open_session(app, _request_with_cookie(app, interface, 'sid'))
+    assert session['_user_id'] == '1'
+
+    interface.save_session(app, session, app.response_class())
+
+    _, expires = backend.get('sid')
+    assert expires == pytest.approx(time.time() + ttl, abs=5)
+
+
+def _request_with_cookie(app, interface, sid):
+    with app.test_request_context(headers={
+        'Cookie': f'{SESSION_COOKIE}={interface._signer(app).sign(sid).decode()}'
+    }) as context:
+        return context.request
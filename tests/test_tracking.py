@@ -0,0 +1,111 @@
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import func, insert, select
+
+from app import app, db
+from models import ARCHIVE_TABLES, Mood, Water, Weight
+import tracking
+from tracking import bulk_delete_entries, upsert_daily_entries
+from tracking_counters import get_tracking_counts
+
+THREADS = 8
+
+
+def test_concurrent_submits_for_one_day_keep_one_row(user):
+    # Read before the threads start; they must not touch the fixture's session
+    user_id = user.id
+    day = date(2026, 10, 19)
+    barrier = threading.Barrier(THREADS)
+    results = []
+    errors = []
+    lock = threading.Lock()
+
+    def submit(value):
+        # Each thread has its own app context and therefore its own session
+        with app.app_context():
+            try:
+                barrier.wait()
+                [(entry, created)] = upsert_daily_entries('weight', user_id, [{'date': day, 'weight': value}])
+                db.session.commit()
+                with lock:
+                    results.append((value, created))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    values = [70.0 + n for n in range(THREADS)]
+    threads = [threading.Thread(target=submit, args=(value,)) for value in values]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sum(1 for _, created in results if created) == 1
+    entries = Weight.query.filter_by(user_id=user_id, date=day).all()
+    assert len(entries) == 1
+    assert entries[0].weight in values
+
+
+def test_later_submits_for_one_day_win(user):
+    day = date(2026, 10, 19)
+    created = []
+    for level in (2, 4, 5):
+        [(entry, was_created)] = upsert_daily_entries('mood', user.id, [{'date': day, 'mood_level': level}])
+        db.session.commit()
+        created.append(was_created)
+
+    assert created == [True, False, False]
+    entries = Mood.query.filter_by(user_id=user.id, date=day).all()
+    assert [entry.mood_level for entry in entries] == [5]
+
+
+def test_created_does_not_depend_on_the_clock(user, monkeypatch):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime(2026, 10, 19, 12, 0)
+
+    monkeypatch.setattr(tracking, 'datetime', FrozenDatetime)
+    day = date(2026, 10, 19)
+    created = []
+    for value in (80.0, 79.5):
+        [(entry, was_created)] = upsert_daily_entries('weight', user.id, [{'date': day, 'weight': value}])
+        db.session.commit()
+        created.append(was_created)
+
+    assert created == [True, False]
+
+
+def test_later_rows_in_one_batch_win(user):
+    day = date(2026, 10, 19)
+    rows = [{'date': day, 'weight': 80.0}, {'date': day, 'weight': 79.5}]
+    [(entry, created)] = upsert_daily_entries('weight', user.id, rows)
+    db.session.commit()
+
+    assert created
+    assert entry.weight == 79.5
+    assert Weight.query.filter_by(user_id=user.id, date=day).count() == 1
+
+
+def test_range_delete_removes_archived_rows(user):
+    day = date(2020, 1, 15)
+    db.session.add(Water(user_id=user.id, date=day, amount=300))
+    db.session.commit()
+    get_tracking_counts(user.id)
+    archive = ARCHIVE_TABLES['water']
+    # What `flask archive-entries` does, without its horizon
+    db.session.execute(insert(archive).from_select(
+        [column.name for column in Water.__table__.columns], select(Water.__table__).where(Water.user_id == user.id)
+    ))
+    Water.query.filter_by(user_id=user.id).delete()
+    db.session.commit()
+
+    counts = bulk_delete_entries(user.id, entry_types=['water'], start_date=day, end_date=day)
+    db.session.commit()
+
+    assert counts == {'water': 1}
+    assert db.session.execute(select(func.count()).where(archive.c.user_id == user.id)).scalar() == 0
+    assert get_tracking_counts(user.id)['water'] == 0
@@ -0,0 +1,40 @@
+import threading
+from datetime import date
+
+from app import app, db
+from models import TrackingCounters, Water
+from tracking import notify_saved
+from tracking_counters import get_tracking_counts, reconcile_tracking_counters
+
+
+def _save_water(user_id):
+    with app.app_context():
+        entry = Water(user_id=user_id, date=date(2025, 1, 1), amount=100)
+        db.session.add(entry)
+        notify_saved('water', entry)
+        db.session.commit()
+        db.session.remove()
+
+
+def test_reconcile_fixes_drift(user):
+    get_tracking_counts(user.id)
+    db.session.add(Water(user_id=user.id, date=date(2025, 1, 1), amount=100))  # bypasses the signals
+    db.session.commit()
+
+    assert reconcile_tracking_counters() >= 1
+    assert db.session.get(TrackingCounters, user.id).water == 1
+
+
+def test_reconcile_keeps_writes_made_while_it_runs(user):
+    user_id = user.id
+    get_tracking_counts(user_id)
+    writers = [threading.Thread(target=_save_water, args=(user_id,)) for _ in range(20)]
+    for writer in writers:
+        writer.start()
+    for _ in range(5):
+        reconcile_tracking_counters()
+    for writer in writers:
+        writer.join()
+    db.session.expire_all()
+
+    assert db.session.get(TrackingCounters, user_id).water == Water.query.filter_by(user_id=user_id).count() == 20
@@ -0,0 +1,226 @@
+"""Set-based operations over the per-user tracking tables"""
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import delete, select, func, inspect, text, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import app, db
+from models import Diet, Weight, Water, Exercise, Mood, Reminder, ARCHIVE_TABLES
+from schema import create_index
+from signals import entries_saved, entries_deleted, profile_updated
+
+ENTRY_MODELS = {
+    'diet': Diet,
+    'weight': Weight,
+    'water': Water,
+    'exercise': Exercise,
+    'mood': Mood,
+    'reminder': Reminder,
+}
+
+# Types that have a date column and can be deleted by date range
+DATED_ENTRY_TYPES = ('diet', 'weight', 'water', 'exercise', 'mood')
+
+# Keep IN lists well below driver parameter limits
+ID_CHUNK_SIZE = 500
+
+# Types with at most one entry per user and day, written by upsert_daily_entries()
+DAILY_ENTRY_TYPES = ('weight', 'mood')
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _delete(table, conditions):
+    """Run one DELETE and return the (id, date) pairs it removed"""
+    has_date = 'date' in table.c
+    columns = (table.c.id, table.c.date) if has_date else (table.c.id,)
+    if db.engine.dialect.delete_returning:
+        stmt = delete(table).where(*conditions).returning(*columns)
+        rows = db.session.execute(stmt, execution_options={'synchronize_session': False}).all()
+    else:
+        rows = db.session.execute(select(*columns).where(*conditions)).all()
+        if rows:
+            db.session.execute(
+                delete(table).where(*conditions),
+                execution_options={'synchronize_session': False}
+            )
+    return [(row[0], row[1] if has_date else None) for row in rows]
+
+
+def bulk_delete_entries(user_id, ids_by_type=None, entry_types=None, start_date=None, end_date=None):
+    """Delete the user's entries by id or by date range with one DELETE per table.
+
+    ``ids_by_type`` maps entry type to a list of ids. Otherwise every entry
+    of ``entry_types`` (default: all dated types) between ``start_date`` and
+    ``end_date`` inclusive is removed. Archived rows are deleted from the
+    archive tables in the same way. Rows owned by other users are never
+    matched. Returns the number of deleted rows per type; the caller commits.
+    """
+    counts = {}
+    # (entry_type, function from a table's columns to the WHERE conditions)
+    plans = []
+    if ids_by_type:
+        for entry_type, ids in ids_by_type.items():
+            ids = sorted(set(ids))
+            for start in range(0, len(ids), ID_CHUNK_SIZE):
+                chunk = ids[start:start + ID_CHUNK_SIZE]
+                plans.append((entry_type, lambda c, chunk=chunk: [c.user_id == user_id, c.id.in_(chunk)]))
+    else:
+        for entry_type in entry_types or DATED_ENTRY_TYPES:
+            if entry_type not in DATED_ENTRY_TYPES:
+                raise ValueError(f'{entry_type} entries cannot be deleted by date')
+
+            def conditions(c):
+                where = [c.user_id == user_id]
+                if start_date is not None:
+                    where.append(c.date >= start_date)
+                if end_date is not None:
+                    where.append(c.date <= end_date)
+                return where
+            plans.append((entry_type, conditions))
+
+    app = current_app._get_current_object()
+    for entry_type, conditions in plans:
+        table = ENTRY_MODELS[entry_type].__table__
+        removed = []
+        for source in (table, ARCHIVE_TABLES.get(table.name)):
+            if source is not None:
+                removed += _delete(source, conditions(source.c))
+        counts[entry_type] = counts.get(entry_type, 0) + len(removed)
+        if removed:
+            entries_deleted.send(
+                app,
+                user_id=user_id,
+                entry_type=entry_type,
+                ids=[entry_id for entry_id, _ in removed],
+                dates={entry_date for _, entry_date in removed if entry_date is not None}
+            )
+    return counts
+
+
+def _select_then_write(model, user_id, values):
+    existing = {
+        entry.date: entry for entry in db.session.execute(
+            select(model).where(model.user_id == user_id, model.date.in_([row['date'] for row in values]))
+        ).scalars()
+    }
+    results = []
+    for row in values:
+        entry = existing.get(row['date'])
+        if entry is None:
+            entry = model(**row)
+            db.session.add(entry)
+            results.append((entry, True))
+        else:
+            for name, value in row.items():
+                if name != 'created_at':
+                    setattr(entry, name, value)
+            results.append((entry, False))
+    db.session.flush()
+    return results
+
+
+def upsert_daily_entries(entry_type, user_id, rows):
+    """Insert or update a user's one-per-day entries (weight, mood), keyed on date.
+
+    ``rows`` are column dicts including ``date``; a later row for the same
+    date wins. On PostgreSQL and SQLite this is an INSERT ... ON CONFLICT
+    (user_id, date) DO UPDATE, so concurrent submits for one day update the
+    same row instead of racing to insert two; the unique index it relies on
+    is guaranteed by the start-up schema check. Returns [(entry, created)];
+    the caller notifies and commits.
+    """
+    if entry_type not in DAILY_ENTRY_TYPES:
+        raise ValueError(f'{entry_type} entries are not one per day')
+    model = ENTRY_MODELS[entry_type]
+    by_date = {row['date']: row for row in rows}
+    if not by_date:
+        return []
+    now = datetime.utcnow()
+    values = [{**row, 'user_id': user_id, 'created_at': now} for row in by_date.values()]
+
+    dialect = db.engine.dialect.name
+    insert = UPSERT_INSERTS.get(dialect)
+    if insert is None:
+        return _select_then_write(model, user_id, values)
+
+    if dialect == 'postgresql':
+        # xmax is 0 for a row version this statement inserted, not updated
+        created = literal_column('(xmax = 0)')
+    else:
+        # The rows this inserts are the new ones; it also takes SQLite's
+        # write lock, so no other upsert can insert them before the next one
+        stmt = insert(model).values(values).on_conflict_do_nothing(index_elements=['user_id', 'date'])
+        new_dates = set(db.session.execute(stmt.returning(model.date)).scalars())
+        created = model.date.in_(new_dates)
+
+    stmt = insert(model).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'date'],
+        set_={name: stmt.excluded[name] for name in values[0] if name not in ('user_id', 'date', 'created_at')}
+    ).returning(model, created)
+    rows = db.session.execute(stmt, execution_options={'populate_existing': True}).all()
+    return [(entry, bool(was_created)) for entry, was_created in rows]
+
+
+def dedupe_daily_entries():
+    """Delete all but the first entry of each user and day for the daily types, then make them unique.
+
+    The first entry is the one weight() and mood() used to update. Deletes go
+    through bulk_delete_entries so counters, streaks and caches follow.
+    Returns {entry_type: rows removed}.
+    """
+    removed = {}
+    for entry_type in DAILY_ENTRY_TYPES:
+        model = ENTRY_MODELS[entry_type]
+        ranked = select(
+            model.id, model.user_id,
+            func.row_number().over(partition_by=(model.user_id, model.date), order_by=model.id).label('position')
+        ).subquery()
+        duplicates = db.session.execute(
+            select(ranked.c.user_id, ranked.c.id).where(ranked.c.position > 1).order_by(ranked.c.user_id)
+        ).all()
+        by_user = {}
+        for user_id, entry_id in duplicates:
+            by_user.setdefault(user_id, []).append(entry_id)
+        removed[entry_type] = 0
+        for user_id, ids in by_user.items():
+            removed[entry_type] += bulk_delete_entries(user_id, {entry_type: ids}).get(entry_type, 0)
+            db.session.commit()
+
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                create_index(index)
+        # The unique index replaces the plain one on the same columns
+        with db.engine.begin() as conn:
+            conn.execute(text(f'DROP INDEX IF EXISTS ix_{model.__tablename__}_user_date'))
+    return removed
+
+
+@app.cli.command('dedupe-daily-entries')
+def dedupe_daily_entries_command():
+    """Remove duplicate weight and mood entries per day and add the unique indexes"""
+    for entry_type, count in dedupe_daily_entries().items():
+        click.echo(f'{entry_type}: removed {count} duplicate entries')
+
+
+def notify_saved(entry_type, *entries, created=True):
+    """Announce new or changed entries to receivers before the commit"""
+    if not entries:
+        return
+    entries_saved.send(
+        current_app._get_current_object(),
+        user_id=entries[0].user_id,
+        entry_type=entry_type,
+        entries=list(entries),
+        dates={entry.date for entry in entries if getattr(entry, 'date', None) is not None},
+        created=created
+    )
+
+
+def notify_profile_updated(profile):
+    profile_updated.send(current_app._get_current_object(), user_id=profile.user_id, profile=profile)
@@ -0,0 +1,136 @@
+"""Per-user tracking counters that replace COUNT(*) over the entry tables"""
+import logging
+
+import click
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import TrackingCounters, Diet, Water, Weight, Exercise, Mood, ARCHIVE_TABLES
+from signals import entries_saved, entries_deleted
+
+COUNTED_MODELS = {
+    'diet': Diet,
+    'water': Water,
+    'weight': Weight,
+    'exercise': Exercise,
+    'mood': Mood,
+}
+
+
+def counted_tables(model):
+    """The entry table plus its archive, whose rows still count as the user's entries"""
+    archive = ARCHIVE_TABLES.get(model.__tablename__)
+    return [model.__table__] if archive is None else [model.__table__, archive]
+
+
+def _adjust(user_id, entry_type, delta):
+    column = getattr(TrackingCounters, entry_type)
+    # No row yet means the counters were never initialised; the first read
+    # counts everything, including this change.
+    db.session.execute(
+        update(TrackingCounters).where(TrackingCounters.user_id == user_id).values({column: column + delta}),
+        execution_options={'synchronize_session': False}
+    )
+
+
+@entries_saved.connect
+def _on_entries_saved(sender, user_id, entry_type, entries, created, **kwargs):
+    if created and entry_type in COUNTED_MODELS:
+        _adjust(user_id, entry_type, len(entries))
+
+
+@entries_deleted.connect
+def _on_entries_deleted(sender, user_id, entry_type, ids, **kwargs):
+    if entry_type in COUNTED_MODELS:
+        _adjust(user_id, entry_type, -len(ids))
+
+
+def count_entries(user_id):
+    """Exact counts straight from the entry tables, in one statement"""
+    row = db.session.execute(select(*[
+        sum(
+            select(func.count()).select_from(table).where(table.c.user_id == user_id).scalar_subquery()
+            for table in counted_tables(model)
+        ).label(entry_type)
+        for entry_type, model in COUNTED_MODELS.items()
+    ])).one()
+    return row._asdict()
+
+
+def get_tracking_counts(user_id):
+    """Entry counts per type from the user's counters row"""
+    counters = db.session.get(TrackingCounters, user_id)
+    if counters is not None:
+        return counters.as_dict()
+
+    counts = count_entries(user_id)
+    db.session.add(TrackingCounters(user_id=user_id, **counts))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request initialised the row first
+        db.session.rollback()
+    return counts
+
+
+def reconcile_tracking_counters(chunk_size=1000):
+    """Compare every counters row with real counts and fix any drift.
+
+    Users are processed in primary key chunks with one grouped count per
+    table per chunk. The chunk's counters rows are locked before counting,
+    so a write that commits meanwhile waits and then adjusts the corrected
+    value instead of being overwritten by it. Returns the number of
+    corrected rows.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        user_ids = db.session.execute(
+            select(TrackingCounters.user_id).where(TrackingCounters.user_id > last_id)
+            .order_by(TrackingCounters.user_id).limit(chunk_size)
+        ).scalars().all()
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        # FOR UPDATE row locks; SQLite has none, so the no-op UPDATE before
+        # it takes the database write lock there (and row locks everywhere)
+        db.session.execute(
+            update(TrackingCounters).where(TrackingCounters.user_id.in_(user_ids))
+            .values(user_id=TrackingCounters.user_id),
+            execution_options={'synchronize_session': False}
+        )
+        counters_rows = db.session.execute(
+            select(TrackingCounters).where(TrackingCounters.user_id.in_(user_ids))
+            .order_by(TrackingCounters.user_id).with_for_update()
+        ).scalars().all()
+
+        actual = {user_id: dict.fromkeys(COUNTED_MODELS, 0) for user_id in user_ids}
+        for entry_type, model in COUNTED_MODELS.items():
+            for table in counted_tables(model):
+                rows = db.session.execute(
+                    select(table.c.user_id, func.count()).where(table.c.user_id.in_(user_ids))
+                    .group_by(table.c.user_id)
+                )
+                for user_id, count in rows:
+                    actual[user_id][entry_type] += count
+
+        for counters in counters_rows:
+            expected = actual[counters.user_id]
+            if counters.as_dict() != expected:
+                logging.warning(f"Tracking counters drifted for user {counters.user_id}: "
+                                f"{counters.as_dict()} != {expected}")
+                for entry_type, count in expected.items():
+                    setattr(counters, entry_type, count)
+                fixed += 1
+        db.session.commit()
+    return fixed
+
+
+@app.cli.command('reconcile-tracking-counters')
+@click.option('--chunk-size', default=1000, show_default=True, help='Users per batch.')
+def reconcile_tracking_counters_command(chunk_size):
+    """Verify per-user tracking counters against the entry and archive tables"""
+    fixed = reconcile_tracking_counters(chunk_size)
+    click.echo(f'Corrected {fixed} counters rows.')